@@ -5,15 +5,15 @@ from rmsutils import formatIsoDate
 
 
 class PeerConnection(ABC):
-    rmId: str
-    room_id: str
-    peer_id: str
+    rmId: int
+    room_id: int
+    peer_id: int
     ts_joined: float
     ts_connected: float
     ts_leave: float
     rmsConnections: list[RMSConnection]
 
-    def __init__(self, rmsConnections: list[RMSConnection], rmId: str):
+    def __init__(self, rmsConnections: list[RMSConnection], rmId: int):
         self.room_id = rmsConnections[0].room_id
         self.peer_id = rmsConnections[0].peer_id
         self.ts_joined = min(map(lambda conn: conn.ts_joined, rmsConnections))
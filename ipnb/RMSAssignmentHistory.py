@@ -0,0 +1,103 @@
+import logging
+import math
+from abc import ABC
+
+from RMSRestarter import *
+
+_logger = logging.getLogger("RMSAssignmentHistory")
+
+
+# queries over the assignments kept by a simulation with keepHistory=True: where a meeting was, what was on a node and
+# how loaded the nodes were at any ts before the end of the simulation. answers are the state right after the changes
+# at ts. built once after the simulation, every query is a binary search
+class RMSAssignmentHistory(ABC):
+    assignments: RoomMeetingAssignments
+    # the history is known for the ts before it
+    untilTs: float
+    nodes: list[int]
+
+    # changes of the node of each meeting, grouped by meeting id and ordered by ts within a meeting
+    rmChangeOffsets: np.ndarray
+    rmChangeTs: np.ndarray
+    rmChangeNodes: np.ndarray
+
+    # peer connections and meetings while they were on the node
+    nodePeerConnections: dict[int, RMSIntervalIndex]
+    nodeMeetings: dict[int, RMSIntervalIndex]
+
+    def __init__(self, assignments: RoomMeetingAssignments, untilTs: float = float('inf')):
+        assert isinstance(assignments, RoomMeetingAssignments), "the history is kept when simulating with keepHistory=True"
+        self.assignments = assignments
+        self.untilTs = untilTs
+        self.nodes = sorted(assignments.nodeHistory)
+
+        changeCounts = [0 if tsToNode is None else len(tsToNode) for tsToNode in assignments.roomMeetingToNode]
+        self.rmChangeOffsets = np.concatenate([[0], np.cumsum(changeCounts, dtype=np.int64)])
+        self.rmChangeTs = np.fromiter((ts for tsToNode in assignments.roomMeetingToNode for ts in (tsToNode or {})),
+                                      dtype=np.float64, count=self.rmChangeOffsets[-1])
+        self.rmChangeNodes = np.fromiter((node for tsToNode in assignments.roomMeetingToNode for node in (tsToNode or {}).values()),
+                                         dtype=np.int64, count=self.rmChangeOffsets[-1])
+
+        # intervals of a node are closed: a meeting is on the node up to the ts before the one it left at
+        pcIntervals = {node: ([], []) for node in self.nodes}
+        rmIntervals = {node: ([], []) for node in self.nodes}
+        for rmId, tsToNode in enumerate(assignments.roomMeetingToNode):
+            if tsToNode is None:
+                continue
+            rm = assignments.roomMeetingById(rmId)
+            changes = list(tsToNode.items())
+            for i, (segmentStart, node) in enumerate(changes):
+                if node < 0:
+                    continue
+                segmentEnd = math.nextafter(changes[i + 1][0], -math.inf) if i + 1 < len(changes) else math.inf
+                rmIntervals[node][0].append(segmentStart)
+                rmIntervals[node][1].append(segmentEnd)
+                for pc in rm.peerConnections:
+                    begin = max(pc.ts_joined, segmentStart)
+                    end = min(pc.ts_leave, segmentEnd)
+                    if begin <= end:
+                        pcIntervals[node][0].append(begin)
+                        pcIntervals[node][1].append(end)
+        self.nodePeerConnections = {node: RMSIntervalIndex(*intervals) for node, intervals in pcIntervals.items()}
+        self.nodeMeetings = {node: RMSIntervalIndex(*intervals) for node, intervals in rmIntervals.items()}
+        _logger.info(f"Indexed {self.rmChangeOffsets[-1]} assignments of {len(changeCounts)} meetings to {len(self.nodes)} nodes")
+
+    @staticmethod
+    def ofRestarter(restarter: RMSRestarter):
+        return RMSAssignmentHistory(restarter.assignments, restarter.simulatedUntilTs)
+
+    def assertKnown(self, ts: float):
+        assert ts < self.untilTs, f"the simulation stopped at {formatIsoDate(self.untilTs)}, {formatIsoDate(ts)} is not simulated"
+
+    # node of the meeting at ts, -1 when it was not on a node
+    def meetingNodeAt(self, rmId: int, ts: float) -> int:
+        self.assertKnown(ts)
+        if rmId + 1 >= len(self.rmChangeOffsets):
+            return -1
+        begin, end = self.rmChangeOffsets[rmId], self.rmChangeOffsets[rmId + 1]
+        change = begin + np.searchsorted(self.rmChangeTs[begin:end], ts, side='right') - 1
+        return int(self.rmChangeNodes[change]) if change >= begin else -1
+
+    # meetings on the node at ts in the order of their assignment
+    def nodeMeetingsAt(self, nodeId: int, ts: float) -> list[RoomMeeting]:
+        self.assertKnown(ts)
+        return self.assignments.getNodeMeetingsAt(nodeId, ts)
+
+    # number of peer connections active at ts in the meetings on the node
+    def nodePeerConnectionsAt(self, nodeId: int, ts: float) -> int:
+        self.assertKnown(ts)
+        return self.nodePeerConnections[nodeId].count(ts) if nodeId in self.nodePeerConnections else 0
+
+    def nodeMeetingsCountAt(self, nodeId: int, ts: float) -> int:
+        self.assertKnown(ts)
+        return self.nodeMeetings[nodeId].count(ts) if nodeId in self.nodeMeetings else 0
+
+    # active peer connections of every node at ts, indexed by node
+    def loadAt(self, ts: float, numNodes: int = None) -> np.ndarray:
+        self.assertKnown(ts)
+        numNodes = (self.nodes[-1] + 1 if len(self.nodes) > 0 else 0) if numNodes is None else numNodes
+        load = np.zeros(numNodes, dtype=np.int64)
+        for node, index in self.nodePeerConnections.items():
+            if node < numNodes:
+                load[node] = index.count(ts)
+        return load
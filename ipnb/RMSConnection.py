@@ -1,14 +1,19 @@
 import json
 from abc import ABC
+
+import numpy as np
+import pandas as pd
+
 from rmsexceptions import *
 from rmsutils import *
 
 
 class RMSConnection(ABC):
-    room_id: str
-    peer_id: str
-    msid: str
-    rsid: str
+    # ids are codes of RMSIdDictionary when loaded by rmsops
+    room_id: int
+    peer_id: int
+    msid: int
+    rsid: int
     ts_joined: float
     ts_connected: float
     ts_leave: float
@@ -37,6 +42,19 @@ class RMSConnection(ABC):
         else:
             self.ts_leave = parseIsoDate(ts_leave_str)
 
+    # builds a connection out of already parsed timestamps. see rmsops.parseRMSConnectionTimestamps
+    @staticmethod
+    def fromEpochs(room_id, peer_id, msid, rsid, ts_joined: float, ts_connected: float, ts_leave: float):
+        conn = RMSConnection.__new__(RMSConnection)
+        conn.room_id = room_id
+        conn.peer_id = peer_id
+        conn.msid = msid
+        conn.rsid = rsid
+        conn.ts_joined = ts_joined
+        conn.ts_connected = ts_connected
+        conn.ts_leave = ts_leave
+        return conn
+
 
 # methods to work with RMS domain
 def splitRMSCByOverlaps(rmsc: list[RMSConnection], meetingOnTheSameBridgeIdleTimeoutSec) -> list[list[RMSConnection]]:
@@ -65,3 +83,52 @@ def splitRMSCByOverlaps(rmsc: list[RMSConnection], meetingOnTheSameBridgeIdleTim
         result_meeting_buckets.append(cur_meeting_bucket)
 
     return result_meeting_buckets
+
+
+# vectorized splitRMSCByOverlaps over many groups at once.
+# rows must be sorted by group and then stably by ts_joined, groupStarts marks the first row of every group.
+# returns flags of the rows that start a new bucket; buckets are the same as splitRMSCByOverlaps gives per group
+def splitSortedByOverlaps(groupStarts: np.ndarray, ts_joined: np.ndarray, ts_leave: np.ndarray,
+                          meetingOnTheSameBridgeIdleTimeoutSec) -> np.ndarray:
+    if len(ts_joined) == 0:
+        return np.zeros(0, dtype=bool)
+    groupIds = np.cumsum(groupStarts) - 1
+
+    # leaves of the earlier buckets of a group are always more than a timeout away from a later bucket,
+    # so the running max over the whole group is as good as the running max over the current bucket
+    runningMaxLeave = pd.Series(ts_leave).groupby(groupIds).cummax().to_numpy()
+    prevMaxLeave = np.empty_like(runningMaxLeave)
+    prevMaxLeave[0] = ts_leave[0]
+    prevMaxLeave[1:] = runningMaxLeave[:-1]
+    bucketStarts = groupStarts | (ts_joined - prevMaxLeave >= meetingOnTheSameBridgeIdleTimeoutSec)
+
+    # the second overlap condition can only fail for connections that leave way before they join.
+    # rare groups that have them are split the slow way
+    suspicious = ts_joined - ts_leave >= meetingOnTheSameBridgeIdleTimeoutSec
+    if suspicious.any():
+        groupBoundaries = np.append(np.flatnonzero(groupStarts), len(ts_joined))
+        for groupId in np.unique(groupIds[suspicious]):
+            begin, end = groupBoundaries[groupId], groupBoundaries[groupId + 1]
+            bucketStarts[begin:end] = _splitByOverlapsScalar(
+                ts_joined[begin:end].tolist(), ts_leave[begin:end].tolist(), meetingOnTheSameBridgeIdleTimeoutSec
+            )
+    return bucketStarts
+
+
+# same loop as splitRMSCByOverlaps over already sorted timestamps. returns bucket start flags
+def _splitByOverlapsScalar(ts_joined: list[float], ts_leave: list[float], meetingOnTheSameBridgeIdleTimeoutSec) -> np.ndarray:
+    bucketStarts = np.zeros(len(ts_joined), dtype=bool)
+    bucketStarts[0] = True
+    cur_start = ts_joined[0]
+    cur_end = ts_leave[0]
+    for i in range(0, len(ts_joined)):
+        same_session: bool = ts_joined[i] - cur_end < meetingOnTheSameBridgeIdleTimeoutSec and \
+                             cur_start - ts_leave[i] < meetingOnTheSameBridgeIdleTimeoutSec
+        if same_session:
+            cur_start = min(cur_start, ts_joined[i])
+            cur_end = max(cur_end, ts_leave[i])
+        else:
+            bucketStarts[i] = True
+            cur_start = ts_joined[i]
+            cur_end = ts_leave[i]
+    return bucketStarts
@@ -0,0 +1,84 @@
+from abc import ABC
+
+import numpy as np
+import pandas as pd
+
+
+# encodes ids into dense integer codes in the order of first appearance
+class IdCodeTable(ABC):
+    values: list
+    # built lazily: decoding a loaded store does not need it
+    codes: dict | None
+
+    def __init__(self, values: list = None):
+        self.values = [] if values is None else list(values)
+        self.codes = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def codesDict(self) -> dict:
+        if self.codes is None:
+            self.codes = {value: code for code, value in enumerate(self.values)}
+        return self.codes
+
+    def encode(self, value) -> int:
+        codes = self.codesDict()
+        code = codes.get(value)
+        if code is None:
+            code = len(self.values)
+            codes[value] = code
+            self.values.append(value)
+        return code
+
+    # vectorized encode: only the distinct values of the batch go through the dict
+    def encodeMany(self, values: np.ndarray) -> np.ndarray:
+        localCodes, uniques = pd.factorize(values, use_na_sentinel=False)
+        globalCodes = np.array([self.encode(v) for v in uniques], dtype=np.int32)
+        return globalCodes[localCodes]
+
+    def decode(self, code: int):
+        return self.values[code]
+
+    def lookup(self) -> np.ndarray:
+        return np.array(self.values, dtype=object)
+
+
+# one lookup table for all the id columns of the calls data.
+# the model only carries integer codes; strings are decoded for output only
+class RMSIdDictionary(ABC):
+    rooms: IdCodeTable
+    peers: IdCodeTable
+    msids: IdCodeTable
+    rsids: IdCodeTable
+
+    def __init__(self, rooms: IdCodeTable = None, peers: IdCodeTable = None,
+                 msids: IdCodeTable = None, rsids: IdCodeTable = None):
+        self.rooms = IdCodeTable() if rooms is None else rooms
+        self.peers = IdCodeTable() if peers is None else peers
+        self.msids = IdCodeTable() if msids is None else msids
+        self.rsids = IdCodeTable() if rsids is None else rsids
+
+    def tables(self) -> list[IdCodeTable]:
+        return [self.rooms, self.peers, self.msids, self.rsids]
+
+    # codes of room_id, peer_id, msid and rsid columns for the selected rows of the calls frame
+    def encodeCalls(self, calls, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        return (
+            self.rooms.encodeMany(calls['room_id'].to_numpy()[rows]),
+            self.peers.encodeMany(calls['peer_id'].to_numpy()[rows]),
+            self.msids.encodeMany(calls['msid'].to_numpy()[rows]),
+            self.rsids.encodeMany(calls['rsid'].to_numpy()[rows])
+        )
+
+    def roomId(self, code: int):
+        return self.rooms.decode(code)
+
+    def peerId(self, code: int):
+        return self.peers.decode(code)
+
+    def msid(self, code: int):
+        return self.msids.decode(code)
+
+    def rsid(self, code: int):
+        return self.rsids.decode(code)
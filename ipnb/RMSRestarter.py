@@ -1,13 +1,20 @@
 from datetime import datetime, timedelta
+import copy
+import hashlib
+import heapq
+import os
+import pickle
 import sys
-from abc import ABC
+from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from enum import Enum
-from typing import Callable
+from array import array
+from enum import Enum, IntEnum
+from typing import Any, Callable
 
 from rmsops import *
 from RoomMeetingAssignments import *
 from policies import *
+from RMSTracer import *
 
 _logger = logging.getLogger("RMSRestarter")
 
@@ -40,75 +47,403 @@ class RMSRollout(ABC):
         self.finishTs = ts
 
 
+# an event with its own action. lists of them are traversed as they are, which is handy for tests
 @dataclass
 class RMSRestarterEvent:
     ts: float
     action: Callable[[], None]
 
 
-class RMSFinishGraceEvent (RMSRestarterEvent):
-    nodeId: int
-    rollout: RMSRollout
-
-    def __init__(self, ts: float, action: Callable[[], None], nodeId: int, rollout: RMSRollout):
-        super().__init__(ts, action)
-        self.nodeId = nodeId
-        self.rollout = rollout
-
+# order of the kinds is the order of the lists of the simulation:
+# of the events with the same ts meetings start first, then pcs connect, ..., then pcs leave and meetings finish
+class RMSEventKind(IntEnum):
+    MEETING_START = 0
+    PC_CONNECT = 1
+    ROLLOUT_START = 2
+    GRACE_FINISH = 3
+    NODE_STARTUP = 4
+    PC_LEAVE = 5
+    MEETING_FINISH = 6
+
+
+# events of one kind as columns. an event is the position in the list: the handler of the kind gets it and reads
+# whatever it needs from the sorted meetings or from the columns. plain arrays are cheap to keep and to pickle
+class RMSEventList(ABC):
+    kind: RMSEventKind
+    ts: array
+    # node of grace finish and node startup events
+    nodes: array
+
+    def __init__(self, kind: RMSEventKind, ts: Iterable[float] = ()):
+        self.kind = kind
+        self.ts = array('d', np.asarray(ts, dtype=np.float64).tobytes())
+        # the columns stay in step when events are appended to a list built from ts
+        self.nodes = array('i', [-1]) * len(self.ts)
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, ts: float, node: int = -1):
+        self.ts.append(ts)
+        self.nodes.append(node)
+
+
+# events that are not known in advance and can be moved after they are scheduled.
+# the traverser passes the record returned by pop() to the handler of the kind
+class RMSEventQueue(ABC):
+    kind: RMSEventKind
+
+    @abstractmethod
+    def headTs(self) -> float | None:
+        pass
+
+    @abstractmethod
+    def pop(self):
+        pass
+
+
+# at most one grace finish event per node. moving an event pushes a new heap entry and makes the old one stale,
+# so both schedule and reschedule are O(log n). of the events with the same ts the one scheduled earlier goes first
+class RMSGraceScheduler(RMSEventQueue):
+    # (ts, sequence number, node)
+    heap: list[tuple[float, int, int]]
+    # node -> sequence number of its live heap entry
+    nodeSeq: dict[int, int]
+    # node -> index of the rollout in RMSRestarter.rollouts
+    nodeRollout: dict[int, int]
+    seq: int
+
+    def __init__(self):
+        self.kind = RMSEventKind.GRACE_FINISH
+        self.heap = []
+        self.nodeSeq = {}
+        self.nodeRollout = {}
+        self.seq = 0
+
+    def __len__(self):
+        return len(self.nodeSeq)
+
+    def isScheduled(self, nodeId: int) -> bool:
+        return nodeId in self.nodeSeq
+
+    def schedule(self, nodeId: int, ts: float, rollout: int):
+        assert nodeId not in self.nodeSeq, f"bug found: grace of node {nodeId} is already scheduled"
+        self.nodeRollout[nodeId] = rollout
+        self.push(nodeId, ts)
+
+    # returns False when the grace of the node has already finished or was never started
+    def reschedule(self, nodeId: int, ts: float) -> bool:
+        if nodeId not in self.nodeSeq:
+            return False
+        self.push(nodeId, ts)
+        return True
 
+    def push(self, nodeId: int, ts: float):
+        self.seq += 1
+        self.nodeSeq[nodeId] = self.seq
+        heapq.heappush(self.heap, (ts, self.seq, nodeId))
+
+    def headTs(self) -> float | None:
+        heap = self.heap
+        while len(heap) > 0:
+            ts, seq, nodeId = heap[0]
+            if self.nodeSeq.get(nodeId) == seq:
+                return ts
+            heapq.heappop(heap)
+        return None
+
+    # (ts, node, rollout) of the earliest event
+    def pop(self) -> tuple[float, int, int]:
+        assert self.headTs() is not None, "no grace events to pop"
+        ts, _, nodeId = heapq.heappop(self.heap)
+        del self.nodeSeq[nodeId]
+        return ts, nodeId, self.nodeRollout.pop(nodeId)
+
+
+# ts column of a list of RMSRestarterEvent
+class _RestarterEventsTs(Sequence):
+    events: list[RMSRestarterEvent]
+
+    def __init__(self, events: list[RMSRestarterEvent]):
+        self.events = events
+
+    def __len__(self):
+        return len(self.events)
+
+    def __getitem__(self, i):
+        return self.events[i].ts
+
+
+# position in a sequence of events that does not change during the traversal.
+# the position is what the handler of the kind gets
+class RMSEventCursor(ABC):
+    kind: RMSEventKind | None
+    position: int
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    @abstractmethod
+    def headTs(self) -> float | None:
+        pass
+
+    # moves to the next event and returns its ts
+    def advance(self) -> float | None:
+        self.position += 1
+        return self.headTs()
+
+
+# events of one kind of the sorted meetings. they are not materialized: timestamps are read by chunks
+# of the sorted indexes, so only the events around the cursor exist at a time
+class RMSSortedMeetingsCursor(RMSEventCursor):
+    sortedMeetings: 'RMSSortedMeetings'
+    numEvents: int
+    chunk: list[float]
+    chunkStart: int
+    chunkSize: int
+
+    def __init__(self, kind: RMSEventKind, sortedMeetings: 'RMSSortedMeetings', chunkSize: int = 4096):
+        self.kind = kind
+        self.sortedMeetings = sortedMeetings
+        self.numEvents = sortedMeetings.numEvents(kind)
+        self.position = 0
+        self.chunk = []
+        self.chunkStart = 0
+        self.chunkSize = chunkSize
+
+    def __len__(self):
+        return self.numEvents
+
+    def advance(self) -> float | None:
+        self.position += 1
+        inChunk = self.position - self.chunkStart
+        if inChunk < len(self.chunk):
+            return self.chunk[inChunk]
+        return self.headTs()
+
+    def headTs(self) -> float | None:
+        inChunk = self.position - self.chunkStart
+        if inChunk < len(self.chunk):
+            return self.chunk[inChunk]
+        if self.position >= self.numEvents:
+            return None
+        self.chunkStart = self.position
+        self.chunk = self.sortedMeetings.eventTs(self.kind, self.position, min(self.position + self.chunkSize, self.numEvents))
+        return self.chunk[0]
+
+
+# cursor over a list that is known not to change during the traversal
+class _StaticListCursor(RMSEventCursor):
+    ts: Sequence[float]
+
+    def __init__(self, kind: RMSEventKind | None, ts: Sequence[float]):
+        self.kind = kind
+        self.ts = ts
+        self.position = 0
+
+    def __len__(self):
+        return len(self.ts)
+
+    def headTs(self) -> float | None:
+        return self.ts[self.position] if self.position < len(self.ts) else None
+
+    def advance(self) -> float | None:
+        self.position += 1
+        return self.ts[self.position] if self.position < len(self.ts) else None
+
+
+# merges sources of events by ts. of the events with the same ts the one from the source with the smallest index goes first.
+# sources are:
+#  - RMSEventCursor: the position of the event is passed to the handler of the cursor's kind
+#  - RMSEventList: the position of the event in the list is passed to the handler of its kind
+#  - RMSEventQueue: a record popped from the queue is passed to the handler of its kind as it is
+#  - list of RMSRestarterEvent: the event runs its own action
+# actions may add events to the lists or change events that were not traversed yet. cursors and lists that are known
+# not to change (staticLists) are merged with a heap. the other lists and queues are short in practice
+# and their first events are checked before every event
 class MultiListTimestampTraverser:
-    restartEventLists: list[list[RMSRestarterEvent]]
+    restartEventLists: list[RMSEventCursor | RMSEventList | RMSEventQueue | list[RMSRestarterEvent]]
     restartEventListIndexes: list[int]
+    staticLists: set[int]
+    handlers: dict[RMSEventKind, Callable[[Any], None]]
+    cursors: list[RMSEventCursor | None]
+    eventsProcessed: int
+    # set by a handler when the rest of the events do not matter
+    stopped: bool
     lastReportedRealTs: datetime | None
 
-    def __init__(self, restartEventLists: list[list[RMSRestarterEvent]]):
+    def __init__(self, restartEventLists: list[RMSEventCursor | RMSEventList | RMSEventQueue | list[RMSRestarterEvent]],
+                 staticLists: Iterable[int] = (), handlers: dict[RMSEventKind, Callable[[Any], None]] = None):
         self.restartEventLists = restartEventLists
         self.restartEventListIndexes = [0] * len(restartEventLists)
+        self.staticLists = set(staticLists)
+        self.handlers = {} if handlers is None else handlers
+        self.cursors = [self.sourceCursor(i) for i in range(0, len(restartEventLists))]
+        self.eventsProcessed = 0
+        self.stopped = False
         self.lastReportedRealTs = None
 
+    def sourceCursor(self, i: int) -> RMSEventCursor | None:
+        source = self.restartEventLists[i]
+        if isinstance(source, RMSEventCursor):
+            return source
+        if i not in self.staticLists:
+            return None
+        if isinstance(source, RMSEventList):
+            return _StaticListCursor(source.kind, source.ts)
+        return _StaticListCursor(None, _RestarterEventsTs(source))
+
     def lastTsReached(self):
         for i in range(0, len(self.restartEventListIndexes)):
-            if self.restartEventListIndexes[i] < len(self.restartEventLists[i]):
+            eventList = self.restartEventLists[i]
+            if self.cursors[i] is not None:
+                if self.cursors[i].headTs() is not None:
+                    return False
+            elif isinstance(eventList, RMSEventQueue):
+                if eventList.headTs() is not None:
+                    return False
+            elif self.restartEventListIndexes[i] < len(eventList):
                 return False
         return True
 
-    def traverse(self):
-        totalEvents = sum(map(lambda l: len(l), self.restartEventLists))
+    def sourceHandler(self, i: int) -> Callable[[Any], None]:
+        source = self.restartEventLists[i]
+        kind = self.cursors[i].kind if self.cursors[i] is not None else getattr(source, 'kind', None)
+        if kind is not None:
+            return self.handlers[kind]
+        return lambda position: source[position].action()
+
+    # stops the traversal after the current event
+    def stop(self):
+        self.stopped = True
+
+    # handles the events before untilTs. the next call continues from the first event that was not handled
+    def traverse(self, untilTs: float | None = None):
+        indexes = self.restartEventListIndexes
+        sources = self.restartEventLists
+        cursors = self.cursors
+        totalEvents = sum(map(lambda l: len(l), sources))
         _logger.info(f"Started traversal of events. Total number of events is {totalEvents}")
-        eventsCnt = 0
-        while not self.lastTsReached():
+        handlers = [self.sourceHandler(i) for i in range(0, len(sources))]
+
+        # (ts, source index) of the current event of every cursor
+        heap: list[tuple[float, int]] = [(cursors[i].headTs(), i) for i in range(0, len(sources))
+                                         if cursors[i] is not None and cursors[i].headTs() is not None]
+        heapq.heapify(heap)
+        dynamicLists = [(i, l.ts if isinstance(l, RMSEventList) else _RestarterEventsTs(l)) for i, l in enumerate(sources)
+                        if cursors[i] is None and not isinstance(l, RMSEventQueue)]
+        queues = [(i, l) for i, l in enumerate(sources) if cursors[i] is None and isinstance(l, RMSEventQueue)]
+
+        eventsCnt = self.eventsProcessed
+        while not self.stopped:
             minTs: float | None = None
-            minIndex: int | None = None
-            for i in range(0, len(self.restartEventLists)):
-                # no more events of this type for now
-                currentList = self.restartEventLists[i]
-                currentListIndex = self.restartEventListIndexes[i]
-                currentListSize = len(currentList)
-                if currentListIndex >= currentListSize:
+            minIndex: int = -1
+            if len(heap) > 0:
+                minTs, minIndex = heap[0]
+            fromHeap = True
+            for i, currentList in dynamicLists:
+                currentListIndex = indexes[i]
+                if currentListIndex >= len(currentList):
                     continue
-                eventTs = currentList[currentListIndex].ts
-                if minTs is None or eventTs < minTs:
+                eventTs = currentList[currentListIndex]
+                if minTs is None or eventTs < minTs or (eventTs == minTs and i < minIndex):
+                    minTs = eventTs
+                    minIndex = i
+                    fromHeap = False
+            fromQueue = False
+            for i, queue in queues:
+                eventTs = queue.headTs()
+                if eventTs is not None and (minTs is None or eventTs < minTs or (eventTs == minTs and i < minIndex)):
                     minTs = eventTs
                     minIndex = i
+                    fromQueue = True
+            if minTs is None or (untilTs is not None and minTs >= untilTs):
+                break
+
+            # checking the clock is expensive compared to an event. do it once in a while
+            if eventsCnt & _PROGRESS_CHECK_MASK == 0 and \
+                    (self.lastReportedRealTs is None or (datetime.now() - self.lastReportedRealTs).total_seconds() > 5):
+                self.lastReportedRealTs = datetime.now()
+                _logger.info(f"Events processed: {int(float(eventsCnt)/float(max(totalEvents, 1))*100.0)}%. Date: {formatIsoDate(minTs)}. Current event: {eventsCnt}")
 
             # do the action that is next on the timescale and shift the pointer
-            if minIndex is not None:
-                if self.lastReportedRealTs is None or (datetime.now() - self.lastReportedRealTs).total_seconds() > 5:
-                    self.lastReportedRealTs = datetime.now()
-                    _logger.info(f"Events processed: {int(float(eventsCnt)/float(totalEvents)*100.0)}%. Date: {formatIsoDate(self.restartEventLists[minIndex][self.restartEventListIndexes[minIndex]].ts)}. Current event: {eventsCnt}")
-                self.restartEventLists[minIndex][self.restartEventListIndexes[minIndex]].action()
-                self.restartEventListIndexes[minIndex] += 1
-                eventsCnt += 1
-        _logger.info(f"Finished traversal of events")
+            eventsCnt += 1
+            if fromQueue:
+                handlers[minIndex](sources[minIndex].pop())
+            elif fromHeap:
+                cursor = cursors[minIndex]
+                handlers[minIndex](cursor.position)
+                nextTs = cursor.advance()
+                if nextTs is not None:
+                    heapq.heapreplace(heap, (nextTs, minIndex))
+                else:
+                    heapq.heappop(heap)
+            else:
+                handlers[minIndex](indexes[minIndex])
+                indexes[minIndex] += 1
+        _logger.info(f"Finished traversal of {eventsCnt - self.eventsProcessed} events" +
+                     ("" if untilTs is None else f" before {formatIsoDate(untilTs)}"))
+        self.eventsProcessed = eventsCnt
+
+
+_PROGRESS_CHECK_MASK = (1 << 14) - 1
+
+
+# intervals kept as sorted arrays of their begins and of their ends. the number of intervals containing ts is the
+# number of begins up to ts minus the number of ends before it, two binary searches
+class RMSIntervalIndex(ABC):
+    begins: np.ndarray
+    ends: np.ndarray
+    # intervals are [begin, end] when set, [begin, end) otherwise
+    inclusiveEnd: bool
+
+    def __init__(self, begins: np.ndarray, ends: np.ndarray, inclusiveEnd: bool = True):
+        self.begins = np.sort(np.asarray(begins, dtype=np.float64))
+        self.ends = np.sort(np.asarray(ends, dtype=np.float64))
+        self.inclusiveEnd = inclusiveEnd
+
+    def __len__(self):
+        return len(self.begins)
+
+    # number of intervals containing ts. ts may be an array of timestamps
+    def count(self, ts: float | np.ndarray) -> int | np.ndarray:
+        started = np.searchsorted(self.begins, ts, side='right')
+        ended = np.searchsorted(self.ends, ts, side='left' if self.inclusiveEnd else 'right')
+        if np.ndim(ts) == 0:
+            return int(started - ended)
+        return started - ended
+
+    # intervals in buckets of stepSec: an interval is in the buckets from the one of its begin up to the one before the
+    # bucket of its end. count() of the start of a bucket is the number of intervals in the bucket
+    @staticmethod
+    def floored(begins: np.ndarray, ends: np.ndarray, stepSec: int):
+        return RMSIntervalIndex(_floorTs(begins, stepSec), _floorTs(ends, stepSec), inclusiveEnd=False)
+
+
+# same as flooring int(ts) to a multiple of stepSec
+def _floorTs(ts: np.ndarray, stepSec: int) -> np.ndarray:
+    return np.trunc(np.trunc(np.asarray(ts, dtype=np.float64)) / stepSec) * stepSec
 
 
 class RMSSortedMeetings(ABC):
-    meetingByStartTs: list[RoomMeeting]
-    meetingByFinishTs: list[RoomMeeting]
-    pcByConnectTs: list[PeerConnection]
-    pcByLeaveTs: list[PeerConnection]
+    meetingByStartTs: Sequence[RoomMeeting]
+    meetingByFinishTs: Sequence[RoomMeeting]
+    pcByConnectTs: Sequence[PeerConnection]
+    pcByLeaveTs: Sequence[PeerConnection]
+
+    # set when the meetings are in a store
+    store: RoomMeetingStore | None
+    # indexes built from the meetings by their readers. kept here so that all simulations of the meetings share them
+    derivedIndexes: dict[Any, Any]
+
+    def __init__(self, roomMeetings: list[RoomMeeting] | RoomMeetingStore):
+        self.store = None
+        self.derivedIndexes = {}
+        if isinstance(roomMeetings, RoomMeetingStore):
+            self.initFromStore(roomMeetings)
+            return
 
-    def __init__(self, roomMeetings: list[RoomMeeting]):
         self.meetingByStartTs = roomMeetings.copy()
         self.meetingByStartTs.sort(key=lambda k: k.ts_start)
 
@@ -123,9 +458,63 @@ class RMSSortedMeetings(ABC):
         self.pcByConnectTs.sort(key=lambda k: k.ts_joined)
         self.pcByLeaveTs.sort(key=lambda k: k.ts_leave)
 
+    # same order as for the list of meetings: stable sort of meetings and of their peer connections in store order
+    def initFromStore(self, store: RoomMeetingStore):
+        self.store = store
+        self.meetingByStartTs = store.meetingSequence(np.argsort(store.rm_ts_start, kind='stable'))
+        self.meetingByFinishTs = store.meetingSequence(np.argsort(store.rm_ts_finish, kind='stable'))
+        self.pcByConnectTs = store.peerConnectionSequence(np.argsort(store.pc_ts_joined, kind='stable'))
+        self.pcByLeaveTs = store.peerConnectionSequence(np.argsort(store.pc_ts_leave, kind='stable'))
+
+    def derivedIndex(self, key, build: Callable[[], Any]):
+        if key not in self.derivedIndexes:
+            self.derivedIndexes[key] = build()
+        return self.derivedIndexes[key]
+
+    # ts_joined and ts_leave of all peer connections
+    def peerConnectionSpans(self) -> tuple[np.ndarray, np.ndarray]:
+        if self.store is not None:
+            return self.store.pc_ts_joined, self.store.pc_ts_leave
+        return np.array([pc.ts_joined for pc in self.pcByConnectTs]), np.array([pc.ts_leave for pc in self.pcByConnectTs])
+
+    # ts_start and ts_finish of all meetings
+    def meetingSpans(self) -> tuple[np.ndarray, np.ndarray]:
+        if self.store is not None:
+            return self.store.rm_ts_start, self.store.rm_ts_finish
+        return np.array([rm.ts_start for rm in self.meetingByStartTs]), np.array([rm.ts_finish for rm in self.meetingByStartTs])
+
+    # peer connections active at a ts: ts_joined <= ts <= ts_leave
+    def peerConnectionIntervals(self) -> RMSIntervalIndex:
+        return self.derivedIndex('peerConnectionIntervals', lambda: RMSIntervalIndex(*self.peerConnectionSpans()))
+
+    # meetings active at a ts: ts_start <= ts <= ts_finish
+    def meetingIntervals(self) -> RMSIntervalIndex:
+        return self.derivedIndex('meetingIntervals', lambda: RMSIntervalIndex(*self.meetingSpans()))
+
+    def numEvents(self, kind: RMSEventKind) -> int:
+        return len(getattr(self, _SORTED_EVENTS[kind][0]))
+
+    # ts of the events [begin, end) of the kind in the sorted order. no views are created for a store
+    def eventTs(self, kind: RMSEventKind, begin: int, end: int) -> list[float]:
+        sequenceName, fieldName, storeColumnName = _SORTED_EVENTS[kind]
+        sequence = getattr(self, sequenceName)
+        if self.store is not None:
+            return getattr(self.store, storeColumnName)[sequence.indexes[begin:end]].tolist()
+        return [getattr(item, fieldName) for item in sequence[begin:end]]
+
+
+# sorted sequence, field of its items and store column with the ts of the events of the kind
+_SORTED_EVENTS = {
+    RMSEventKind.MEETING_START: ('meetingByStartTs', 'ts_start', 'rm_ts_start'),
+    RMSEventKind.PC_CONNECT: ('pcByConnectTs', 'ts_joined', 'pc_ts_joined'),
+    RMSEventKind.PC_LEAVE: ('pcByLeaveTs', 'ts_leave', 'pc_ts_leave'),
+    RMSEventKind.MEETING_FINISH: ('meetingByFinishTs', 'ts_finish', 'rm_ts_finish'),
+}
+
 
 class RMSRestarter(ABC):
-    assignments: RoomMeetingAssignments
+    # RoomMeetingAssignments when the history is kept
+    assignments: LiveRoomMeetingAssignments
 
     # when downtimes are planned to start (i.e. new version is being rolled out)
     # each new downtime will cancel previous rollout
@@ -134,22 +523,31 @@ class RMSRestarter(ABC):
     nodeRestartsInSec: int
     shardsConfig: ShardsConfig
     newNodePolicy: NewNodePolicy
-    meetings: list[RoomMeeting]
+    meetings: list[RoomMeeting] | RoomMeetingStore
 
     # events to finish maintenance are generated when maintenance of a node is started
-    finishGraceEvents: list[RMSFinishGraceEvent]
-    #nodeId -> index in finishMaintenanceEvents
-    nodesInGraceIndex: dict[int, int]
+    finishGraceEvents: RMSGraceScheduler
 
-    nodesStartupEvents: list[RMSRestarterEvent]
+    nodesStartupEvents: RMSEventList
     sortedMeetings: RMSSortedMeetings
 
     nextNodeToRollout: int
 
     rollouts: list[RMSRollout]
 
-    def __init__(self, meetings: list[RoomMeeting], startRolloutAt: list[float], disruptionBudget: int, nodeRestartsInSec: int,
-                 shardsConfig: ShardsConfig, policy: NewNodePolicy):
+    # created by the first simulation call and kept to resume the simulation
+    traverser: MultiListTimestampTraverser | None
+    # events before this ts are simulated
+    simulatedUntilTs: float | None
+    # None when tracing is off. hot paths only check it for None
+    tracer: RMSTracer | None
+    # when not set, the simulation stops once the last rollout finishes: later events do not change the rollouts
+    fullSimulation: bool
+
+    # sortedMeetings of the same meetings may be passed to share them between restarters
+    def __init__(self, meetings: list[RoomMeeting] | RoomMeetingStore, startRolloutAt: list[float], disruptionBudget: int, nodeRestartsInSec: int,
+                 shardsConfig: ShardsConfig, policy: NewNodePolicy, sortedMeetings: RMSSortedMeetings = None,
+                 tracer: RMSTracer = None, fullSimulation: bool = False, keepHistory: bool = False):
         self.meetings = meetings
         self.startRolloutAt = startRolloutAt
         self.disruptionBudget = disruptionBudget
@@ -157,35 +555,35 @@ class RMSRestarter(ABC):
         self.shardsConfig = shardsConfig
         self.newNodePolicy = policy
 
-        self.sortedMeetings = RMSSortedMeetings(self.meetings)
-        self.assignments = RoomMeetingAssignments()
-        self.finishGraceEvents = []
-        self.nodesInGraceIndex = {}
-        self.nodesStartupEvents = []
+        self.sortedMeetings = RMSSortedMeetings(self.meetings) if sortedMeetings is None else sortedMeetings
+        numRoomMeetings = len(self.sortedMeetings.meetingByStartTs)
+        self.assignments = RoomMeetingAssignments(numRoomMeetings) if keepHistory else LiveRoomMeetingAssignments(numRoomMeetings)
+        self.finishGraceEvents = RMSGraceScheduler()
+        self.nodesStartupEvents = RMSEventList(RMSEventKind.NODE_STARTUP)
         self.rollouts = []
+        self.traverser = None
+        self.simulatedUntilTs = float('-inf')
+        self.tracer = tracer
+        self.fullSimulation = fullSimulation
 
     def meetingStarted(self, rm: RoomMeeting):
         node = self.newNodePolicy.pickNodeForRoom(rm.ts_start, self.assignments)
         self.assignments.assignRoomMeeting(rm, node, rm.ts_start)
-        _logger.debug(f"{formatIsoDate(rm.ts_start)}: meeting started  {rm.id} on node {node}")
+        if self.tracer is not None:
+            self.tracer.record(rm.ts_start, RMSTraceKind.MEETING_ASSIGNED, node, rm.id)
 
     def meetingFinished(self, rm: RoomMeeting):
         currentNode = self.assignments.getCurrentNode(rm, rm.ts_finish)
         self.assignments.releaseRoomMeeting(rm, rm.ts_finish)
-        _logger.debug(f"{formatIsoDate(rm.ts_finish)}: meeting finished {rm.id} on node {currentNode}")
+        if self.tracer is not None:
+            self.tracer.record(rm.ts_finish, RMSTraceKind.MEETING_RELEASED, currentNode, rm.id)
         self.tryFinishMaintenanceIfNoMoreMeetings(currentNode, rm.ts_finish)
 
-    def scheduleFinishGrace(self, nodeId: int, graceFinishesTs: float, rollout: RMSRollout):
-        self.finishGraceEvents.append(RMSFinishGraceEvent(
-            graceFinishesTs,
-            lambda: self.nodeGraceFinished(nodeId, graceFinishesTs, rollout),
-            nodeId,
-            rollout
-        ))
-        self.nodesInGraceIndex[nodeId] = len(self.finishGraceEvents) - 1
+    def scheduleFinishGrace(self, nodeId: int, graceFinishesTs: float, rolloutIndex: int):
+        self.finishGraceEvents.schedule(nodeId, graceFinishesTs, rolloutIndex)
 
     # check if there are no more meetings on the node and schedule restart now if applicable
-    # this method will sink the event to the current ts in the list of fininsh grace events.
+    # this method will move the grace finish event of the node to the current ts.
     # It will be picked up by the next loop
     def tryFinishMaintenanceIfNoMoreMeetings(self, nodeId: int, ts: float):
         # node was not in grace
@@ -196,62 +594,23 @@ class RMSRestarter(ABC):
         if self.assignments.nodeHasMeetings(nodeId, ts):
             return
 
-        finishGraceEventIndex = self.nodesInGraceIndex[nodeId]
-        graceFinishEvent = self.finishGraceEvents[finishGraceEventIndex]
-        assert graceFinishEvent.nodeId == nodeId, \
-            f"bug found: node id in maintenance finish index node {nodeId} " \
-            f"does't correspond to the actual node ID in the event node {graceFinishEvent.nodeId}"
-
-        newFinishGraceEventIndexIndex: int = finishGraceEventIndex
-        for i in range(finishGraceEventIndex-1, -1, -1):
-            # shift all events that should start after our new maintenance time to +1
-            _logger.debug(f"trying index {i}")
-            if self.finishGraceEvents[i].ts > ts:
-                evt = self.finishGraceEvents[i]
-                newIndex = i+1
-                _logger.debug(f"shifting event from {i} to {newIndex} because {formatIsoDate(self.finishGraceEvents[i].ts)} is larger than {formatIsoDate(ts)}")
-                self.finishGraceEvents[newIndex] = evt
-                self.nodesInGraceIndex[evt.nodeId] = newIndex
-                newFinishGraceEventIndexIndex = i
-            else:
-                break
-
-        _logger.debug(f"maintenance of node {nodeId} shifted from {finishGraceEventIndex}:{formatIsoDate(graceFinishEvent.ts)} "
-              f"to {newFinishGraceEventIndexIndex}:{formatIsoDate(ts)} because there were no meetings")
-        # register the new event in the correct index and with a correct ts
-        assert nodeId == graceFinishEvent.nodeId, f"bug found: nodeId {nodeId} does not correspoint to event node id {graceFinishEvent.nodeId}"
-        # reinit the event because we can't change lambda
-        graceFinishEvent = RMSFinishGraceEvent(
-            ts,
-            lambda: self.nodeGraceFinished(nodeId, ts, graceFinishEvent.rollout),
-            nodeId,
-            graceFinishEvent.rollout
-        )
-        self.finishGraceEvents[newFinishGraceEventIndexIndex] = graceFinishEvent
-        self.nodesInGraceIndex[nodeId] = newFinishGraceEventIndexIndex
-
-        if newFinishGraceEventIndexIndex > 0:
-            assert self.finishGraceEvents[newFinishGraceEventIndexIndex-1].ts <= self.finishGraceEvents[newFinishGraceEventIndexIndex].ts
-
-        if newFinishGraceEventIndexIndex < len(self.finishGraceEvents)-1:
-            if self.finishGraceEvents[newFinishGraceEventIndexIndex+1].ts < self.finishGraceEvents[newFinishGraceEventIndexIndex].ts:
-                raise RuntimeError(f"Index: {newFinishGraceEventIndexIndex}. {formatIsoDate(self.finishGraceEvents[newFinishGraceEventIndexIndex+1].ts)} < {formatIsoDate(self.finishGraceEvents[newFinishGraceEventIndexIndex].ts)}")
+        # the grace of the node may have already finished while the node is starting up
+        if self.finishGraceEvents.reschedule(nodeId, ts) and self.tracer is not None:
+            self.tracer.record(ts, RMSTraceKind.GRACE_SHIFTED, nodeId)
 
     def returnNodeToDuty(self, nodeId: int, ts: float):
-        _logger.debug(f"{formatIsoDate(ts)}: returning node {nodeId} to duty")
+        if self.tracer is not None:
+            self.tracer.record(ts, RMSTraceKind.NODE_RETURNED, nodeId)
 
         self.assignments.endNodeMaintenance(nodeId, ts)
-        if nodeId in self.nodesInGraceIndex:
-            self.nodesInGraceIndex.pop(nodeId)
 
         self.disruptNodes(ts)
 
     def scheduleNodeStartup(self, nodeId: int, startupStarts: float):
-        _logger.debug(f"{formatIsoDate(startupStarts)}: started startup of node {nodeId}")
+        if self.tracer is not None:
+            self.tracer.record(startupStarts, RMSTraceKind.NODE_STARTUP_STARTED, nodeId)
         startupFinishes = startupStarts + self.nodeRestartsInSec
-        self.nodesStartupEvents.append(
-            RMSRestarterEvent(startupFinishes, lambda: self.returnNodeToDuty(nodeId, startupFinishes))
-        )
+        self.nodesStartupEvents.append(startupFinishes, nodeId)
 
     def nodeGraceStarted(self, nodeId: int, ts: float):
         gracePeriod: float
@@ -260,10 +619,12 @@ class RMSRestarter(ABC):
             # if node has active meetings, it needs to wait for grace period, and then it will restart
             gracePeriod = float(self.newNodePolicy.gracePeriod(ts, self.assignments))
             downtimeFinishes = ts + gracePeriod
-            self.scheduleFinishGrace(nodeId, downtimeFinishes, self.rollouts[-1])
-            _logger.debug(f"{formatIsoDate(ts)}: started grace period of node {nodeId}")
+            self.scheduleFinishGrace(nodeId, downtimeFinishes, len(self.rollouts) - 1)
+            if self.tracer is not None:
+                self.tracer.record(ts, RMSTraceKind.GRACE_STARTED, nodeId, rollout=len(self.rollouts) - 1)
         else:
-            _logger.debug(f"{formatIsoDate(ts)}: grace not needed for node {nodeId}")
+            if self.tracer is not None:
+                self.tracer.record(ts, RMSTraceKind.GRACE_SKIPPED, nodeId, rollout=len(self.rollouts) - 1)
             self.scheduleNodeStartup(nodeId, ts)
 
         self.assignments.startNodeMaintenance(nodeId, ts)
@@ -272,37 +633,49 @@ class RMSRestarter(ABC):
         # this happens when rollout of the last node finishes
         if self.nextNodeToRollout == self.shardsConfig.numNodesGlobal() and len(self.assignments.nodesMaintenance) == 0:
             self.rollouts[-1].finish(ts)
+            if self.tracer is not None:
+                self.tracer.record(ts, RMSTraceKind.ROLLOUT_FINISHED, rollout=len(self.rollouts) - 1)
+            # all nodes are back, so there are no grace or startup events left
+            if not self.fullSimulation and len(self.rollouts) == len(self.startRolloutAt):
+                _logger.info(f"{formatIsoDate(ts)}: the last rollout finished. Stopping the simulation")
+                self.traverser.stop()
 
         while len(self.assignments.getNodesInMaintenance(ts)) < self.disruptionBudget and \
                 self.nextNodeToRollout < self.shardsConfig.numNodesGlobal():
             self.nodeGraceStarted(self.nextNodeToRollout, ts)
             self.nextNodeToRollout += 1
 
-    def nodeGraceFinished(self, nodeId: int, ts: float, rollout: RMSRollout):
-        meetingsLeft = self.assignments.getNodeMeetings(nodeId, ts)
-        _logger.debug(f"{formatIsoDate(ts)}: finished grace period of node {nodeId}. active meetings: {meetingsLeft}")
+    def nodeGraceFinished(self, nodeId: int, ts: float, rolloutIndex: int):
+        rollout = self.rollouts[rolloutIndex]
+        meetingsLeft = list(self.assignments.getNodeMeetings(nodeId, ts))
+        if self.tracer is not None:
+            self.tracer.record(ts, RMSTraceKind.GRACE_FINISHED, nodeId, rollout=rolloutIndex)
         for rm in meetingsLeft:
             newNodeId = self.newNodePolicy.pickNodeForRoom(ts, self.assignments)
             self.newNodePolicy.nodeOfRoomMeetingChanged(ts, nodeId, newNodeId, rm.id)
             self.assignments.assignRoomMeeting(rm, newNodeId, ts)
             rollout.downtime(ts, rm)
-            _logger.debug(f"{formatIsoDate(ts)}: reassigning room meeting {rm.id} from node {nodeId} to node {newNodeId}")
+            if self.tracer is not None:
+                self.tracer.record(ts, RMSTraceKind.MEETING_REASSIGNED, newNodeId, rm.id, rolloutIndex)
 
         self.scheduleNodeStartup(nodeId, ts)
 
     def startRollout(self, ts: float):
         # todo start multiple rollouts. register new downtime report for each
         # todo downtime reports should account for all graces started during the downtime. Even if grace finishes during another downtime
-        _logger.debug(f"{formatIsoDate(ts)}: starting rollout. ")
         if len(self.rollouts) > 0:
             self.rollouts[-1].finish(ts)
+            if self.tracer is not None:
+                self.tracer.record(ts, RMSTraceKind.ROLLOUT_FINISHED, rollout=len(self.rollouts) - 1)
         self.rollouts.append(RMSRollout(startTs=ts))
+        if self.tracer is not None:
+            self.tracer.record(ts, RMSTraceKind.ROLLOUT_STARTED, rollout=len(self.rollouts) - 1)
 
         self.nextNodeToRollout = 0
         self.disruptNodes(ts)
 
     @staticmethod
-    def lastTsReached(restartEventLists: list[list[RMSRestarterEvent]], restartEventListIndexes: list[int]):
+    def lastTsReached(restartEventLists: list[RMSEventList], restartEventListIndexes: list[int]):
         assert len(restartEventLists) == len(restartEventListIndexes), "length of both lists expected to be equal"
         for i in range(0, len(restartEventListIndexes)):
             if restartEventListIndexes[i] < len(restartEventLists[i]):
@@ -323,7 +696,24 @@ class RMSRestarter(ABC):
             pc.rmId
         )
 
-    def calculateRestarts(self) -> list[RMSRollout]:
+    # handlers get the position of the event in its list
+    def eventHandlers(self) -> dict[RMSEventKind, Callable[[int], None]]:
+        sortedMeetings = self.sortedMeetings
+        return {
+            RMSEventKind.MEETING_START: lambda i: self.meetingStarted(sortedMeetings.meetingByStartTs[i]),
+            RMSEventKind.PC_CONNECT: lambda i: self.registerPeerConnectionJoined(sortedMeetings.pcByConnectTs[i]),
+            RMSEventKind.ROLLOUT_START: lambda i: self.startRollout(self.startRolloutAt[i]),
+            RMSEventKind.GRACE_FINISH: self.graceFinishEventReached,
+            RMSEventKind.NODE_STARTUP: lambda i: self.returnNodeToDuty(self.nodesStartupEvents.nodes[i], self.nodesStartupEvents.ts[i]),
+            RMSEventKind.PC_LEAVE: lambda i: self.registerPeerConnectionLeft(sortedMeetings.pcByLeaveTs[i]),
+            RMSEventKind.MEETING_FINISH: lambda i: self.meetingFinished(sortedMeetings.meetingByFinishTs[i]),
+        }
+
+    def graceFinishEventReached(self, event: tuple[float, int, int]):
+        ts, nodeId, rollout = event
+        self.nodeGraceFinished(nodeId, ts, rollout)
+
+    def createTraverser(self) -> MultiListTimestampTraverser:
         # order meetings by start date and by end date
         # iterate meeting starts, meeting finishes and node maintenances by ts: assign and unassign meetings
         # (complexity: 2*M*log(M) to sort + 2*M*DISR_BUDGET to merge lists by ts with maintenances )
@@ -331,51 +721,139 @@ class RMSRestarter(ABC):
         # when maintenance starts, close nodes for maintenance
         # when maintenance ends, assign all their unfinished meetings to a new node and calculate downtime by number of participants
 
-        _logger.info(f"Preparing start events: {len(self.sortedMeetings.meetingByStartTs)}")
-        meetingStartEvents: list[RMSRestarterEvent] = list(map(
-            lambda meeting: RMSRestarterEvent(meeting.ts_start, lambda: self.meetingStarted(meeting)),
-            self.sortedMeetings.meetingByStartTs
-        ))
-        _logger.info(f"Preparing finish events: {len(self.sortedMeetings.meetingByStartTs)}")
-        meetingFinishEvents: list[RMSRestarterEvent] = list(map(
-            lambda meeting: RMSRestarterEvent(meeting.ts_finish, lambda: self.meetingFinished(meeting)),
-            self.sortedMeetings.meetingByFinishTs
-        ))
-
-        _logger.info(f"Preparing rollout events: {len(self.startRolloutAt)}")
-        startRolloutEvents: list[RMSRestarterEvent] = list(map(
-            lambda rolloutTs: RMSRestarterEvent(rolloutTs, lambda: self.startRollout(rolloutTs)),
-            self.startRolloutAt
-        ))
-
-        _logger.info(f"Preparing pcConnect events: {len(self.sortedMeetings.pcByConnectTs)}")
-        pcConnectEvents: list[RMSRestarterEvent] = list(map(
-            lambda pc: RMSRestarterEvent(pc.ts_joined, lambda: self.registerPeerConnectionJoined(pc)),
-            self.sortedMeetings.pcByConnectTs
-        ))
-
-        _logger.info(f"Preparing pcLeave events: {len(self.sortedMeetings.pcByLeaveTs)}")
-        pcLeaveEvents: list[RMSRestarterEvent] = list(map(
-            lambda pc: RMSRestarterEvent(pc.ts_leave, lambda: self.registerPeerConnectionLeft(pc)),
-            self.sortedMeetings.pcByLeaveTs
-        ))
-
-        _logger.info(f"Meeting dates range: {formatIsoDate(self.sortedMeetings.meetingByStartTs[0].ts_start)} - {formatIsoDate(self.sortedMeetings.meetingByFinishTs[-1].ts_finish)}")
-
-        restartEventLists: list[list[RMSRestarterEvent]] = [
-            meetingStartEvents,
-            pcConnectEvents,  # first meetings should start, then they should end,
+        sortedMeetings = self.sortedMeetings
+        restartEventLists: list[RMSEventCursor | RMSEventList | RMSEventQueue] = [
+            RMSSortedMeetingsCursor(RMSEventKind.MEETING_START, sortedMeetings),
+            RMSSortedMeetingsCursor(RMSEventKind.PC_CONNECT, sortedMeetings),  # first meetings should start, then they should end,
 
             # everything else in between connects and disconnects
-            startRolloutEvents,
+            RMSEventList(RMSEventKind.ROLLOUT_START, self.startRolloutAt),
             self.finishGraceEvents,
             self.nodesStartupEvents,
 
-            pcLeaveEvents,  # first pcs need to leave then room can be unassigned
-            meetingFinishEvents,
+            RMSSortedMeetingsCursor(RMSEventKind.PC_LEAVE, sortedMeetings),  # first pcs need to leave then room can be unassigned
+            RMSSortedMeetingsCursor(RMSEventKind.MEETING_FINISH, sortedMeetings),
         ]
+        assert [eventList.kind for eventList in restartEventLists] == list(RMSEventKind), "lists are expected in the order of kinds"
+
+        _logger.info(f"Meeting dates range: {formatIsoDate(sortedMeetings.meetingByStartTs[0].ts_start)} - {formatIsoDate(sortedMeetings.meetingByFinishTs[-1].ts_finish)}")
+
+        # only grace finish and node startup events are added and moved during the traversal
+        return MultiListTimestampTraverser(restartEventLists, staticLists=[2])
+
+    # simulates the events before untilTs, or all of them. may be called again with a later ts to continue
+    def simulateUntil(self, untilTs: float | None = None):
+        if self.traverser is None:
+            self.traverser = self.createTraverser()
+        # handlers are bound to this restarter. they are not kept in the traverser, so copies do not call them
+        self.traverser.handlers = self.eventHandlers()
+        self.traverser.traverse(untilTs)
+        self.traverser.handlers = {}
+        if self.traverser.stopped:
+            # the events at the ts of the stop after the one that finished the last rollout were not handled
+            self.simulatedUntilTs = self.rollouts[-1].finishTs
+        else:
+            self.simulatedUntilTs = float('inf') if untilTs is None else max(self.simulatedUntilTs, untilTs)
 
-        traverser = MultiListTimestampTraverser(restartEventLists)
-        traverser.traverse()
-
+    def calculateRestarts(self) -> list[RMSRollout]:
+        self.simulateUntil()
         return self.rollouts
+
+    # copy of the simulation state. meetings are only read by the simulation and are shared with the copy
+    def copy(self):
+        # the trace file belongs to this restarter. copies are not traced
+        memo = {id(self.meetings): self.meetings, id(self.sortedMeetings): self.sortedMeetings,
+                id(self.shardsConfig): self.shardsConfig, id(self.tracer): None}
+        if not isinstance(self.meetings, RoomMeetingStore):
+            for rm in self.meetings:
+                memo[id(rm)] = rm
+        return copy.deepcopy(self, memo)
+
+    # simulates the meetings up to the first rollout. nothing before it depends on the rollout parameters,
+    # so every variant of the parameters can be forked from the checkpoint instead of simulating from the first meeting.
+    # the random generator of the policy is a part of the copied state
+    def checkpoint(self):
+        rolloutTs = min(self.startRolloutAt)
+        assert self.simulatedUntilTs <= rolloutTs, \
+            f"simulation is already past the rollout at {formatIsoDate(rolloutTs)}"
+        self.simulateUntil(rolloutTs)
+        return RMSRestarterCheckpoint(self.copy())
+
+
+@dataclass
+class RMSRestarterCheckpoint:
+    restarter: RMSRestarter
+
+    # a restarter that continues from the checkpoint with its own rollout parameters
+    def fork(self, gracePeriodSec: int | None = None, disruptionBudget: int | None = None) -> RMSRestarter:
+        restarter = self.restarter.copy()
+        if gracePeriodSec is not None:
+            restarter.newNodePolicy.gracePeriodSec = gracePeriodSec
+        if disruptionBudget is not None:
+            restarter.disruptionBudget = disruptionBudget
+        return restarter
+
+    # the meetings are not saved with the checkpoint, load it with the meetings it was taken on
+    def save(self, fname: str):
+        assert self.restarter.tracer is None, "traced simulations are not saved"
+        with open(fname, 'wb') as f:
+            _CheckpointPickler(f, self.restarter).dump(self.restarter)
+
+    @staticmethod
+    def load(fname: str, meetings: RoomMeetingStore, sortedMeetings: RMSSortedMeetings = None):
+        sortedMeetings = RMSSortedMeetings(meetings) if sortedMeetings is None else sortedMeetings
+        with open(fname, 'rb') as f:
+            return RMSRestarterCheckpoint(_CheckpointUnpickler(f, meetings, sortedMeetings).load())
+
+
+# the store and its sorted meetings are written as references and replaced by the ones passed to load
+class _CheckpointPickler(pickle.Pickler):
+    references: dict[int, str]
+
+    def __init__(self, f, restarter: RMSRestarter):
+        super().__init__(f, pickle.HIGHEST_PROTOCOL)
+        assert isinstance(restarter.meetings, RoomMeetingStore), "only checkpoints of meetings in a store are saved"
+        self.references = {id(restarter.meetings): 'meetings', id(restarter.sortedMeetings): 'sortedMeetings'}
+
+    def persistent_id(self, obj):
+        return self.references.get(id(obj))
+
+
+class _CheckpointUnpickler(pickle.Unpickler):
+    references: dict[str, Any]
+
+    def __init__(self, f, meetings: RoomMeetingStore, sortedMeetings: RMSSortedMeetings):
+        super().__init__(f)
+        self.references = {'meetings': meetings, 'sortedMeetings': sortedMeetings}
+
+    def persistent_load(self, pid):
+        return self.references[pid]
+
+
+CHECKPOINT_FORMAT_VERSION = 2
+
+
+# checkpoints of the same meetings, policy, seed and restart dates are the same
+def checkpointCacheKey(meetings: RoomMeetingStore, policyStr: str, seed: int, startRolloutAt: list[float],
+                       nodeRestartsInSec: int, shardsConfig: ShardsConfig, fullSimulation: bool) -> str:
+    return hashlib.sha256(f"{meetings.digest()}|policy:{policyStr}|seed:{seed}|restarts:{startRolloutAt}"
+                          f"|nodeRestarts:{nodeRestartsInSec}|shards:{shardsConfig.shards}|full:{fullSimulation}"
+                          f"|v:{CHECKPOINT_FORMAT_VERSION}".encode()).hexdigest()
+
+
+def checkpointFileName(fname: str, cacheKey: str) -> str:
+    return f"{fname}.{cacheKey[0:16]}.checkpoint.pkl"
+
+
+# loads the checkpoint of the restarter from the file next to fname, simulating and saving it on a miss
+def loadCachedCheckpoint(fname: str, cacheKey: str, restarter: RMSRestarter) -> RMSRestarterCheckpoint:
+    checkpointFile = checkpointFileName(fname, cacheKey)
+    if os.path.exists(checkpointFile):
+        _logger.info(f"Loading the simulation at the restart date from {checkpointFile}")
+        return RMSRestarterCheckpoint.load(checkpointFile, restarter.meetings, restarter.sortedMeetings)
+
+    _logger.info(f"No checkpoint {checkpointFile} found. Simulating up to the restart date")
+    checkpoint = restarter.checkpoint()
+    checkpoint.save(checkpointFile)
+    _logger.info(f"Saved the simulation at the restart date to {checkpointFile}")
+    return checkpoint
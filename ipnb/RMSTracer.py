@@ -0,0 +1,110 @@
+import struct
+from abc import ABC
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any
+
+import numpy as np
+
+from rmsutils import *
+
+
+class RMSTraceKind(IntEnum):
+    MEETING_ASSIGNED = 0
+    MEETING_RELEASED = 1
+    ROLLOUT_STARTED = 2
+    ROLLOUT_FINISHED = 3
+    GRACE_STARTED = 4
+    GRACE_SKIPPED = 5
+    GRACE_SHIFTED = 6
+    GRACE_FINISHED = 7
+    MEETING_REASSIGNED = 8
+    NODE_STARTUP_STARTED = 9
+    NODE_RETURNED = 10
+
+
+_TRACE_MAGIC = b'RMSTRACE'
+_TRACE_VERSION = 1
+_TRACE_HEADER = struct.Struct('<8sI')
+# ts, kind, node, meeting, rollout. -1 when the record is not about a node, a meeting or a rollout
+_TRACE_RECORD = struct.Struct('<dBiii')
+TRACE_DTYPE = np.dtype([('ts', '<f8'), ('kind', 'u1'), ('node', '<i4'), ('meeting', '<i4'), ('rollout', '<i4')])
+_TRACE_FLUSH_BYTES = 1 << 20
+
+
+# binary trace of the simulation: fixed size records instead of formatted log lines.
+# the simulation keeps None instead of a tracer when tracing is off, so a disabled trace costs a check for None
+class RMSTracer(ABC):
+    fname: str
+    file: Any
+    buffer: bytearray
+    numRecords: int
+
+    def __init__(self, fname: str):
+        self.fname = fname
+        self.file = open(fname, 'wb')
+        self.file.write(_TRACE_HEADER.pack(_TRACE_MAGIC, _TRACE_VERSION))
+        self.buffer = bytearray()
+        self.numRecords = 0
+
+    def record(self, ts: float, kind: RMSTraceKind, node: int = -1, meeting: int = -1, rollout: int = -1):
+        self.buffer += _TRACE_RECORD.pack(ts, kind, node, meeting, rollout)
+        self.numRecords += 1
+        if len(self.buffer) >= _TRACE_FLUSH_BYTES:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    @staticmethod
+    def read(fname: str) -> np.ndarray:
+        with open(fname, 'rb') as f:
+            magic, version = _TRACE_HEADER.unpack(f.read(_TRACE_HEADER.size))
+            assert magic == _TRACE_MAGIC, f"{fname} is not a trace"
+            assert version == _TRACE_VERSION, f"{fname} has trace version {version}, expected {_TRACE_VERSION}"
+            return np.fromfile(f, dtype=TRACE_DTYPE)
+
+
+def formatTraceRecord(record) -> str:
+    fields = [formatIsoDate(float(record['ts'])), RMSTraceKind(int(record['kind'])).name]
+    for name in ['node', 'meeting', 'rollout']:
+        if record[name] >= 0:
+            fields.append(f"{name} {record[name]}")
+    return " ".join(fields)
+
+
+# assignments and nodes in maintenance right after the records with ts up to the given one.
+# built from the trace alone, without simulating the events before ts
+@dataclass
+class RMSTraceState:
+    ts: float
+    meetingNodes: dict[int, int]
+    nodesInMaintenance: set[int]
+
+    @staticmethod
+    def at(records: np.ndarray, ts: float):
+        records = records[:np.searchsorted(records['ts'], ts, side='right')]
+
+        meetingRecords = records[np.isin(records['kind'], _MEETING_KINDS)]
+        meetings, lastRecords = _lastRecordByKey(meetingRecords, 'meeting')
+        live = lastRecords['kind'] != RMSTraceKind.MEETING_RELEASED
+        meetingNodes = dict(zip(meetings[live].tolist(), lastRecords['node'][live].tolist()))
+
+        nodeRecords = records[np.isin(records['kind'], _MAINTENANCE_KINDS)]
+        nodes, lastRecords = _lastRecordByKey(nodeRecords, 'node')
+        nodesInMaintenance = set(nodes[lastRecords['kind'] != RMSTraceKind.NODE_RETURNED].tolist())
+        return RMSTraceState(ts, meetingNodes, nodesInMaintenance)
+
+
+_MEETING_KINDS = [RMSTraceKind.MEETING_ASSIGNED, RMSTraceKind.MEETING_REASSIGNED, RMSTraceKind.MEETING_RELEASED]
+_MAINTENANCE_KINDS = [RMSTraceKind.GRACE_STARTED, RMSTraceKind.GRACE_SKIPPED, RMSTraceKind.NODE_RETURNED]
+
+
+def _lastRecordByKey(records: np.ndarray, key: str) -> tuple[np.ndarray, np.ndarray]:
+    keys, lastFromEnd = np.unique(records[key][::-1], return_index=True)
+    return keys, records[len(records) - 1 - lastFromEnd]
@@ -1,5 +1,4 @@
 import json
-import uuid
 from abc import ABC
 from collections import defaultdict
 
@@ -10,18 +9,19 @@ from rmsutils import *
 
 #a set of peer connections that were meeting at the same time
 class RoomMeeting(ABC):
-    room_id: str
+    room_id: int
     ts_start: float
     ts_finish: float
     peerConnections: list[PeerConnection]
-    id: str
+    # dense number of the meeting, used as an index into per meeting arrays
+    id: int
     meetingOnTheSameBridgeIdleTimeoutSec: int
 
-    def __init__(self, rmsConnections: list[RMSConnection], meetingOnTheSameBridgeIdleTimeoutSec: int):
+    def __init__(self, rmsConnections: list[RMSConnection], meetingOnTheSameBridgeIdleTimeoutSec: int, id: int):
         self.room_id = rmsConnections[0].room_id
         self.ts_start = min(map(lambda conn: conn.ts_joined, rmsConnections))
         self.ts_finish = max(map(lambda conn: conn.ts_leave, rmsConnections))
-        self.id = str(uuid.uuid4())
+        self.id = id
         self.meetingOnTheSameBridgeIdleTimeoutSec = meetingOnTheSameBridgeIdleTimeoutSec
 
         rmsByPeer = defaultdict(list)
@@ -33,5 +33,10 @@ class RoomMeeting(ABC):
             for bucket in connsBuckets:
                 self.peerConnections.append(PeerConnection(bucket, self.id))
 
+    def renumber(self, id: int):
+        self.id = id
+        for pc in self.peerConnections:
+            pc.rmId = id
+
     def __str__(self):
         return json.dumps(self, indent=4)
@@ -1,7 +1,10 @@
+import bisect
+import copy
 import logging
 from abc import ABC
+from array import array
 from collections import defaultdict
-from typing import Iterable
+from typing import Collection, Iterable
 
 from rmsutils import *
 
@@ -42,79 +45,146 @@ class ShardsConfig(ABC):
         return range(firstNode, lastNode)
 
 
-class RoomMeetingAssignments(ABC):
+# changes of the meetings of a node: meeting ids in the order they were added or removed, with a snapshot of the
+# meetings every SNAPSHOT_EVERY changes. the state at any ts is the snapshot before it plus the following changes
+class NodeMeetingsHistory(ABC):
+    SNAPSHOT_EVERY = 64
+
+    ts: array
+    # removals are stored as -1 - rmId
+    changes: array
+    # number of changes before each snapshot
+    snapshotPositions: list[int]
+    snapshots: list[tuple[int, ...]]
+
+    def __init__(self):
+        self.ts = array('d')
+        self.changes = array('i')
+        self.snapshotPositions = [0]
+        self.snapshots = [()]
+
+    def copy(self):
+        result = NodeMeetingsHistory()
+        result.ts = array('d', self.ts)
+        result.changes = array('i', self.changes)
+        result.snapshotPositions = self.snapshotPositions.copy()
+        result.snapshots = self.snapshots.copy()
+        return result
+
+    def __len__(self):
+        return len(self.ts)
+
+    def record(self, ts: float, rmId: int, added: bool, currentMeetingIds: Iterable[int]):
+        self.ts.append(ts)
+        self.changes.append(rmId if added else -1 - rmId)
+        if len(self.ts) % self.SNAPSHOT_EVERY == 0:
+            self.snapshotPositions.append(len(self.ts))
+            self.snapshots.append(tuple(currentMeetingIds))
+
+    # ids of the meetings on the node right after the changes with ts up to the given one, in the order of assignment
+    def meetingIdsAt(self, ts: float) -> list[int]:
+        end = bisect.bisect_right(self.ts, ts)
+        snapshot = bisect.bisect_right(self.snapshotPositions, end) - 1
+        meetingIds = dict.fromkeys(self.snapshots[snapshot])
+        for change in self.changes[self.snapshotPositions[snapshot]:end]:
+            if change >= 0:
+                meetingIds[change] = None
+            else:
+                del meetingIds[-1 - change]
+        return list(meetingIds)
+
+    # every ts the node changed at, with the ids of its meetings after the changes at that ts
+    def states(self) -> dict[float, list[int]]:
+        result = {}
+        meetingIds = {}
+        for ts, change in zip(self.ts, self.changes):
+            if change >= 0:
+                meetingIds[change] = None
+            else:
+                del meetingIds[-1 - change]
+            result[ts] = list(meetingIds)
+        return result
+
+
+# current assignments only: the meetings of each node and the node of each meeting. memory does not grow with the
+# number of events, use it when the history is not read after the simulation
+class LiveRoomMeetingAssignments(ABC):
     lastTs: float
-    nodeToRoomMeeting: dict[int, dict[float, list[RoomMeeting]]]
-    roomMeetingToNode: dict[str, dict[float, int]]
+    # meetings of each node by id. dicts keep the order of assignment and remove a meeting in constant time
+    nodeMeetings: dict[int, dict[int, RoomMeeting]]
 
-    lastNodeDates: dict[int, float]
-    lastRMDates: dict[str, float]
+    # per room meeting state is kept in lists indexed by room meeting id
+    lastRMDates: list[float | None]
+    rmCurrentNode: list[int]
 
-    roomMeetingDict: dict[str, RoomMeeting]
+    lastNodeDates: dict[int, float]
 
     nodesMaintenance: set[int]
 
-    def __init__(self):
+    def __init__(self, numRoomMeetings: int = 0):
         self.lastTs = 0
-        self.nodeToRoomMeeting = defaultdict(lambda: defaultdict(list))
-        self.roomMeetingToNode = defaultdict(lambda: defaultdict(int))
+        self.nodeMeetings = defaultdict(dict)
+        self.lastRMDates = [None] * numRoomMeetings
+        self.rmCurrentNode = [-1] * numRoomMeetings
         self.lastNodeDates = {}
-        self.lastRMDates = {}
-        self.roomMeetingDict = {}
         self.nodesMaintenance = set()
 
+    def ensureRoomMeetingSlot(self, rmId: int):
+        if rmId >= len(self.lastRMDates):
+            ensureListIndex(self.lastRMDates, rmId, None)
+            ensureListIndex(self.rmCurrentNode, rmId, -1)
+
     def __str__(self):
-        nodeToRoomMeetingResult = defaultdict(lambda: defaultdict(list))
-        for node, tsToMeetings in self.nodeToRoomMeeting.items():
-            for ts, rms in tsToMeetings.items():
-                nodeToRoomMeetingResult[node][formatIsoDate(ts)] = []
-                for rm in rms:
-                    nodeToRoomMeetingResult[node][formatIsoDate(ts)].append(rm.id)
-        roomMeetingToNodeResult = defaultdict(lambda: defaultdict(int))
-        for rmId, tsToNode in self.roomMeetingToNode.items():
-            for ts, node in tsToNode.items():
-                roomMeetingToNodeResult[rmId][formatIsoDate(ts)] = node
-        lastNodeDatesResult = {}
-        for node, ts in self.lastNodeDates.items():
-            lastNodeDatesResult[node] = formatIsoDate(ts)
-        lastRMDatesResult = {}
-        for rm, ts in self.lastRMDates.items():
-            lastRMDatesResult[rm] = formatIsoDate(ts)
+        nodeMeetingsResult = {}
+        for node, meetings in self.nodeMeetings.items():
+            nodeMeetingsResult[node] = list(meetings)
+        roomMeetingNodeResult = {}
+        for rmId, node in enumerate(self.rmCurrentNode):
+            if node >= 0:
+                roomMeetingNodeResult[rmId] = node
         return json.dumps({
-            "nodeToRoomMeeting": nodeToRoomMeetingResult,
-            "roomMeetingToNode": roomMeetingToNodeResult,
-            "lastNodeDates": lastNodeDatesResult,
-            "lastRMDates": lastRMDatesResult
+            "nodeMeetings": nodeMeetingsResult,
+            "roomMeetingNode": roomMeetingNodeResult,
+            "nodesMaintenance": sorted(self.nodesMaintenance)
         }, indent=2)
 
+    # meetings are only read by the simulation, so copies share them
+    def __deepcopy__(self, memo):
+        result = copy.copy(self)
+        memo[id(self)] = result
+        result.nodeMeetings = defaultdict(dict)
+        for node, meetings in self.nodeMeetings.items():
+            result.nodeMeetings[node] = meetings.copy()
+        result.lastRMDates = self.lastRMDates.copy()
+        result.rmCurrentNode = self.rmCurrentNode.copy()
+        result.lastNodeDates = self.lastNodeDates.copy()
+        result.nodesMaintenance = self.nodesMaintenance.copy()
+        return result
+
     def assertTS(self, ts: float):
         assert ts >= self.lastTs, f"ts {formatIsoDate(ts)} is less than last ts {formatIsoDate(self.lastTs)}"
         self.lastTs = ts
 
-    def roomMeetingById(self, id: str):
-        return self.roomMeetingDict[id]
-
     def getCurrentNode(self, rm: RoomMeeting, ts: float) -> int:
         return self.getCurrentNodeByRmId(rm.id, ts)
 
-    def getCurrentNodeByRmId(self, rmId: str, ts: float) -> int:
-        if rmId in self.lastRMDates:
+    def getCurrentNodeByRmId(self, rmId: int, ts: float) -> int:
+        if rmId < len(self.lastRMDates) and self.lastRMDates[rmId] is not None:
             lastRMDate = self.lastRMDates[rmId]
             assert lastRMDate <= ts, f"Room Meeting was last accessed at {formatIsoDate(lastRMDate)}. Can not access it at {ts}"
-            return self.roomMeetingToNode[rmId][lastRMDate]
+            return self.rmCurrentNode[rmId]
         return -1
 
     def nodeHasMeetings(self, nodeId: int, ts: float) -> bool:
         return len(self.getNodeMeetings(nodeId, ts)) > 0
 
-    def getNodeMeetings(self, nodeId: int, ts: float) -> list[RoomMeeting]:
-        mappings = self.nodeToRoomMeeting[nodeId]
-        if len(mappings) == 0:
-            return []
-        lastMappedTs = list(mappings)[-1]
-        assert ts >= lastMappedTs, f"requested timestamp {formatIsoDate(ts)} is before the last mapped ts {formatIsoDate(lastMappedTs)}"
-        _logger.debug(f"mapping: {formatIsoDate(lastMappedTs)}: meetings on node {nodeId}: {mappings[lastMappedTs]}")
-        return mappings[lastMappedTs]
+    # current meetings of the node in the order of assignment. the view changes with the assignments, copy it to
+    # change the assignments while iterating over it
+    def getNodeMeetings(self, nodeId: int, ts: float) -> Collection[RoomMeeting]:
+        if nodeId in self.lastNodeDates:
+            lastMappedTs = self.lastNodeDates[nodeId]
+            assert ts >= lastMappedTs, f"requested timestamp {formatIsoDate(ts)} is before the last mapped ts {formatIsoDate(lastMappedTs)}"
+        return self.nodeMeetings[nodeId].values() if nodeId in self.nodeMeetings else ()
 
     def assignRoomMeeting(self, rm: RoomMeeting, node: int, ts: float):
         curNode: int = self.getCurrentNode(rm, ts)
@@ -123,46 +193,40 @@ class RoomMeetingAssignments(ABC):
 
         self.releaseRoomMeeting(rm, ts)
 
-        self.roomMeetingDict[rm.id] = rm
+        self.ensureRoomMeetingSlot(rm.id)
         if node in self.lastNodeDates:
             lastTs = self.lastNodeDates[node]
             assert lastTs <= ts, f"can not assign ts {ts}. TS {lastTs} is already assigned to node {node}"
-            newNodeRoomMeetingsBeforeAssignment = self.nodeToRoomMeeting[node][lastTs]
-            newNodeRoomMeetingsAfterAssignment = newNodeRoomMeetingsBeforeAssignment.copy()
-            newNodeRoomMeetingsAfterAssignment.append(rm)
-            self.nodeToRoomMeeting[node][ts] = newNodeRoomMeetingsAfterAssignment
-        else:
-            self.nodeToRoomMeeting[node][ts].append(rm)
-
-        self.roomMeetingToNode[rm.id][ts] = node
+        self.nodeMeetings[node][rm.id] = rm
+        self.rmCurrentNode[rm.id] = node
         self.lastNodeDates[node] = ts
         self.lastRMDates[rm.id] = ts
+        self.meetingAssigned(rm, node, ts)
 
     def releaseRoomMeeting(self, rm: RoomMeeting, ts: float):
-        if rm.id in self.lastRMDates:
+        if rm.id < len(self.lastRMDates) and self.lastRMDates[rm.id] is not None:
             lastNodeAssignmentTs = self.lastRMDates[rm.id]
             assert lastNodeAssignmentTs <= ts, f"can not assign ts {ts}. TS {lastNodeAssignmentTs} is already assigned to room {rm.id}"
 
-            prevNodeIdx = self.roomMeetingToNode[rm.id][lastNodeAssignmentTs]
+            prevNodeIdx = self.rmCurrentNode[rm.id]
 
             if prevNodeIdx in self.lastNodeDates:
                 prevNodeLastStateTs = self.lastNodeDates[prevNodeIdx]
                 assert prevNodeLastStateTs <= ts, f"can not assign ts {ts}. TS {prevNodeLastStateTs} is already assigned to node {prevNodeIdx}"
 
-                prevNodeLastStateRMs = self.nodeToRoomMeeting[prevNodeIdx][prevNodeLastStateTs]
-
-                prevNodeNewStateRMs: list[RoomMeeting] = prevNodeLastStateRMs.copy()
-                try:
-                    prevNodeNewStateRMs = list(filter(lambda x: x.id != rm.id, prevNodeNewStateRMs))
-                except ValueError:
-                    raise Exception(
-                        f'Failed to remove {rm.id} by node {prevNodeIdx} ts {formatIsoDate(prevNodeLastStateTs)} and contents {prevNodeNewStateRMs}. It probably have not been assigned to the node')
-
                 # if room meeting has been removed from the room, add record about it
-                if prevNodeLastStateRMs != prevNodeNewStateRMs:
-                    self.nodeToRoomMeeting[prevNodeIdx][ts] = prevNodeNewStateRMs
+                if self.nodeMeetings[prevNodeIdx].pop(rm.id, None) is not None:
                     self.lastNodeDates[prevNodeIdx] = ts
                     self.lastRMDates[rm.id] = ts
+                    self.rmCurrentNode[rm.id] = -1
+                    self.meetingReleased(rm, prevNodeIdx, ts)
+
+    # called after the meeting is added to or removed from the node. live assignments keep no history
+    def meetingAssigned(self, rm: RoomMeeting, node: int, ts: float):
+        pass
+
+    def meetingReleased(self, rm: RoomMeeting, node: int, ts: float):
+        pass
 
     def getNodesInMaintenance(self, ts: float) -> set[int]:
         self.assertTS(ts)
@@ -179,23 +243,82 @@ class RoomMeetingAssignments(ABC):
         self.assertTS(ts)
         self.nodesMaintenance.discard(node)
 
-    def getActiveNodesToPeerConnectionsNum(self, ts: float, nodes: Iterable[int]) -> dict[int, int]:
-        result = {}
-        for node in nodes:
-            if self.isNodeInMaintenance(node, ts):
-                continue
-            tsMapping = self.nodeToRoomMeeting[node]
-            if node not in self.lastNodeDates:
-                result[node] = 0
-                continue
-
-            nodeTs = self.lastNodeDates[node]
-            assert nodeTs <= ts, f"trying to operate on node last accessed at {formatIsoDate(nodeTs)} with an earlier date {formatIsoDate(ts)}"
-            cnt = 0
-            for rm in tsMapping[nodeTs]:
-                for pc in rm.peerConnections:
-                    if pc.ts_joined <= ts <= pc.ts_leave:
-                        cnt += 1
-            result[node] = cnt
+
+# assignments with their history: the node of every meeting and the meetings of every node at any ts
+class RoomMeetingAssignments(LiveRoomMeetingAssignments):
+    nodeHistory: dict[int, NodeMeetingsHistory]
+    # node of the meeting from each ts it changed at. -1 from the ts it was released
+    roomMeetingToNode: list[dict[float, int] | None]
+    # every meeting ever assigned, to answer the history queries with meetings
+    roomMeetingDict: list[RoomMeeting | None]
+
+    def __init__(self, numRoomMeetings: int = 0):
+        super().__init__(numRoomMeetings)
+        self.nodeHistory = defaultdict(NodeMeetingsHistory)
+        self.roomMeetingToNode = [None] * numRoomMeetings
+        self.roomMeetingDict = [None] * numRoomMeetings
+
+    def ensureRoomMeetingSlot(self, rmId: int):
+        if rmId >= len(self.lastRMDates):
+            ensureListIndex(self.roomMeetingToNode, rmId, None)
+            ensureListIndex(self.roomMeetingDict, rmId, None)
+        super().ensureRoomMeetingSlot(rmId)
+
+    def __str__(self):
+        nodeToRoomMeetingResult = defaultdict(dict)
+        for node, history in self.nodeHistory.items():
+            for ts, rmIds in history.states().items():
+                nodeToRoomMeetingResult[node][formatIsoDate(ts)] = rmIds
+        roomMeetingToNodeResult = defaultdict(lambda: defaultdict(int))
+        for rmId, tsToNode in enumerate(self.roomMeetingToNode):
+            for ts, node in (tsToNode or {}).items():
+                roomMeetingToNodeResult[rmId][formatIsoDate(ts)] = node
+        lastNodeDatesResult = {}
+        for node, ts in self.lastNodeDates.items():
+            lastNodeDatesResult[node] = formatIsoDate(ts)
+        lastRMDatesResult = {}
+        for rm, ts in enumerate(self.lastRMDates):
+            if ts is not None:
+                lastRMDatesResult[rm] = formatIsoDate(ts)
+        return json.dumps({
+            "nodeToRoomMeeting": nodeToRoomMeetingResult,
+            "roomMeetingToNode": roomMeetingToNodeResult,
+            "lastNodeDates": lastNodeDatesResult,
+            "lastRMDates": lastRMDatesResult
+        }, indent=2)
+
+    def __deepcopy__(self, memo):
+        result = super().__deepcopy__(memo)
+        result.nodeHistory = defaultdict(NodeMeetingsHistory)
+        for node, history in self.nodeHistory.items():
+            result.nodeHistory[node] = history.copy()
+        result.roomMeetingToNode = [None if tsToNode is None else tsToNode.copy() for tsToNode in self.roomMeetingToNode]
+        result.roomMeetingDict = self.roomMeetingDict.copy()
         return result
 
+    def roomMeetingById(self, id: int):
+        return self.roomMeetingDict[id]
+
+    def meetingAssigned(self, rm: RoomMeeting, node: int, ts: float):
+        self.roomMeetingDict[rm.id] = rm
+        self.nodeHistory[node].record(ts, rm.id, True, self.nodeMeetings[node])
+        if self.roomMeetingToNode[rm.id] is None:
+            self.roomMeetingToNode[rm.id] = {}
+        self.roomMeetingToNode[rm.id][ts] = node
+
+    def meetingReleased(self, rm: RoomMeeting, node: int, ts: float):
+        self.nodeHistory[node].record(ts, rm.id, False, self.nodeMeetings[node])
+        # a reassignment at the same ts replaces it
+        self.roomMeetingToNode[rm.id][ts] = -1
+
+    # meetings of the node right after the changes with ts up to the given one
+    def getNodeMeetingsAt(self, nodeId: int, ts: float) -> list[RoomMeeting]:
+        if nodeId not in self.nodeHistory:
+            return []
+        return [self.roomMeetingDict[rmId] for rmId in self.nodeHistory[nodeId].meetingIdsAt(ts)]
+
+    # every ts the node changed at, with its meetings after the changes at that ts
+    def getNodeMeetingsHistory(self, nodeId: int) -> dict[float, list[RoomMeeting]]:
+        if nodeId not in self.nodeHistory:
+            return {}
+        return {ts: [self.roomMeetingDict[rmId] for rmId in rmIds] for ts, rmIds in self.nodeHistory[nodeId].states().items()}
@@ -0,0 +1,473 @@
+import hashlib
+from abc import ABC
+from array import array
+from collections.abc import Sequence
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+
+from RoomMeeting import *
+from RMSIdDictionary import *
+
+
+# struct-of-arrays representation of room meetings.
+# connections are laid out grouped by peer connection, peer connections are grouped by room meeting.
+# xxxOffsets arrays map a parent to the [offsets[i], offsets[i+1]) range of its children
+class RoomMeetingStore(ABC):
+    meetingOnTheSameBridgeIdleTimeoutSec: int
+
+    # decodes integer room/peer/msid/rsid codes back into ids
+    ids: RMSIdDictionary
+
+    conn_msid: np.ndarray
+    conn_rsid: np.ndarray
+    conn_ts_joined: np.ndarray
+    conn_ts_connected: np.ndarray
+    conn_ts_leave: np.ndarray
+
+    pc_peer: np.ndarray
+    pc_rm: np.ndarray
+    pc_ts_joined: np.ndarray
+    pc_ts_connected: np.ndarray
+    pc_ts_leave: np.ndarray
+    pcConnOffsets: np.ndarray
+
+    rm_room: np.ndarray
+    rm_ts_start: np.ndarray
+    rm_ts_finish: np.ndarray
+    rmPcOffsets: np.ndarray
+
+    def __init__(self,
+                 meetingOnTheSameBridgeIdleTimeoutSec: int,
+                 ids: RMSIdDictionary,
+                 rm_room: np.ndarray, rmPcOffsets: np.ndarray,
+                 pc_peer: np.ndarray, pcConnOffsets: np.ndarray,
+                 conn_msid: np.ndarray, conn_rsid: np.ndarray,
+                 conn_ts_joined: np.ndarray, conn_ts_connected: np.ndarray, conn_ts_leave: np.ndarray):
+        self.meetingOnTheSameBridgeIdleTimeoutSec = meetingOnTheSameBridgeIdleTimeoutSec
+        self.ids = ids
+
+        self.conn_msid = np.asarray(conn_msid, dtype=np.int32)
+        self.conn_rsid = np.asarray(conn_rsid, dtype=np.int32)
+        self.conn_ts_joined = np.asarray(conn_ts_joined, dtype=np.float64)
+        self.conn_ts_connected = np.asarray(conn_ts_connected, dtype=np.float64)
+        self.conn_ts_leave = np.asarray(conn_ts_leave, dtype=np.float64)
+
+        self.pc_peer = np.asarray(pc_peer, dtype=np.int32)
+        self.pcConnOffsets = np.asarray(pcConnOffsets, dtype=np.int64)
+        self.rm_room = np.asarray(rm_room, dtype=np.int32)
+        self.rmPcOffsets = np.asarray(rmPcOffsets, dtype=np.int64)
+
+        assert len(self.pcConnOffsets) == len(self.pc_peer) + 1, "every peer connection needs an offset into connections"
+        assert len(self.rmPcOffsets) == len(self.rm_room) + 1, "every room meeting needs an offset into peer connections"
+
+        self.pc_rm = np.repeat(np.arange(self.numRoomMeetings(), dtype=np.int64), np.diff(self.rmPcOffsets))
+        self.pc_ts_joined = _reduceGroups(np.minimum, self.conn_ts_joined, self.pcConnOffsets)
+        self.pc_ts_connected = _reduceGroups(np.minimum, self.conn_ts_connected, self.pcConnOffsets)
+        self.pc_ts_leave = _reduceGroups(np.maximum, self.conn_ts_leave, self.pcConnOffsets)
+        self.rm_ts_start = _reduceGroups(np.minimum, self.pc_ts_joined, self.rmPcOffsets)
+        self.rm_ts_finish = _reduceGroups(np.maximum, self.pc_ts_leave, self.rmPcOffsets)
+
+    def numRoomMeetings(self) -> int:
+        return len(self.rm_room)
+
+    def numPeerConnections(self) -> int:
+        return len(self.pc_peer)
+
+    def numConnections(self) -> int:
+        return len(self.conn_ts_joined)
+
+    def meeting(self, rmIdx: int) -> RoomMeeting:
+        return StoredRoomMeeting(self, rmIdx)
+
+    def peerConnection(self, pcIdx: int) -> PeerConnection:
+        return StoredPeerConnection(self, pcIdx)
+
+    # meetings in the order given by indexes. views are created on access only
+    def meetingSequence(self, indexes: np.ndarray) -> Sequence[RoomMeeting]:
+        return StoredSequence(indexes, self.meeting)
+
+    def peerConnectionSequence(self, indexes: np.ndarray) -> Sequence[PeerConnection]:
+        return StoredSequence(indexes, self.peerConnection)
+
+    def meetings(self) -> Sequence[RoomMeeting]:
+        return self.meetingSequence(np.arange(self.numRoomMeetings()))
+
+    def nbytes(self) -> int:
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+    def savedArrays(self) -> dict[str, np.ndarray]:
+        arrays = {name: value for name, value in vars(self).items()
+                  if isinstance(value, np.ndarray) and value.dtype != object and name not in _DERIVED_ARRAYS}
+        for name, table in zip(_LOOKUP_TABLES, self.ids.tables()):
+            arrays[name], arrays[name + 'Offsets'] = _packStrings(table.values)
+        arrays['meetingOnTheSameBridgeIdleTimeoutSec'] = np.array(self.meetingOnTheSameBridgeIdleTimeoutSec)
+        arrays['formatVersion'] = np.array(STORE_FORMAT_VERSION)
+        return arrays
+
+    def save(self, fname: str):
+        with open(fname, 'wb') as f:
+            np.savez(f, **self.savedArrays())
+
+    # hash of the content. the same for a store and the store saved and loaded back
+    def digest(self) -> str:
+        digest = hashlib.sha256()
+        for name, value in sorted(self.savedArrays().items()):
+            digest.update(f"|{name}:{value.dtype.str}:{value.shape}|".encode())
+            digest.update(np.ascontiguousarray(value).tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def load(fname: str):
+        with np.load(fname) as data:
+            assert int(data['formatVersion']) == STORE_FORMAT_VERSION, f"unsupported store format {int(data['formatVersion'])} in {fname}"
+            tables = [IdCodeTable(_unpackStrings(data[name], data[name + 'Offsets'])) for name in _LOOKUP_TABLES]
+            return RoomMeetingStore(
+                int(data['meetingOnTheSameBridgeIdleTimeoutSec']),
+                RMSIdDictionary(*tables),
+                data['rm_room'], data['rmPcOffsets'],
+                data['pc_peer'], data['pcConnOffsets'],
+                data['conn_msid'], data['conn_rsid'],
+                data['conn_ts_joined'], data['conn_ts_connected'], data['conn_ts_leave']
+            )
+
+    # a store of the given meetings with their peer connections and connections. meetings are renumbered in the given order
+    def select(self, rmIndexes: np.ndarray):
+        rmIndexes = np.asarray(rmIndexes, dtype=np.int64)
+        pcIndexes, rmPcOffsets = _gatherGroups(self.rmPcOffsets, rmIndexes)
+        connIndexes, pcConnOffsets = _gatherGroups(self.pcConnOffsets, pcIndexes)
+        return RoomMeetingStore(
+            self.meetingOnTheSameBridgeIdleTimeoutSec,
+            self.ids,
+            self.rm_room[rmIndexes], rmPcOffsets,
+            self.pc_peer[pcIndexes], pcConnOffsets,
+            self.conn_msid[connIndexes], self.conn_rsid[connIndexes],
+            self.conn_ts_joined[connIndexes], self.conn_ts_connected[connIndexes], self.conn_ts_leave[connIndexes]
+        )
+
+    # room meetings of the store and of the new connections, as if they were all split at once.
+    # a meeting of a room is only split again when it finishes less than the idle timeout before the first new connection
+    # of the room, later meetings of the room can not merge with earlier ones. rooms with connections that leave
+    # more than a timeout before they join are split again as a whole. meetings are ordered by room code and start
+    def appendConnections(self, room: np.ndarray, peer: np.ndarray, msid: np.ndarray, rsid: np.ndarray,
+                          ts_joined: np.ndarray, ts_connected: np.ndarray, ts_leave: np.ndarray):
+        timeout = self.meetingOnTheSameBridgeIdleTimeoutSec
+        connPc = np.repeat(np.arange(self.numPeerConnections(), dtype=np.int64), np.diff(self.pcConnOffsets))
+        connRoom = self.rm_room[self.pc_rm[connPc]]
+
+        firstNewJoined = np.full(len(self.ids.rooms), np.inf)
+        np.minimum.at(firstNewJoined, room, ts_joined)
+        firstNewJoined[room[ts_joined - ts_leave >= timeout]] = -np.inf
+        firstNewJoined[connRoom[self.conn_ts_joined - self.conn_ts_leave >= timeout]] = -np.inf
+        resplit = self.rm_ts_finish > firstNewJoined[self.rm_room] - timeout
+
+        # connections of the meetings to split again go first and keep the store order, like earlier rows of a file
+        pcIndexes, _ = _gatherGroups(self.rmPcOffsets, np.flatnonzero(resplit))
+        connIndexes, _ = _gatherGroups(self.pcConnOffsets, pcIndexes)
+        resplitStore = RoomMeetingStore.fromConnections(
+            timeout,
+            self.ids,
+            np.concatenate([connRoom[connIndexes], room]),
+            np.concatenate([self.pc_peer[connPc[connIndexes]], peer]),
+            np.concatenate([self.conn_msid[connIndexes], msid]),
+            np.concatenate([self.conn_rsid[connIndexes], rsid]),
+            np.concatenate([self.conn_ts_joined[connIndexes], ts_joined]),
+            np.concatenate([self.conn_ts_connected[connIndexes], ts_connected]),
+            np.concatenate([self.conn_ts_leave[connIndexes], ts_leave])
+        )
+        merged = RoomMeetingStore.concatenate([self.select(np.flatnonzero(~resplit)), resplitStore], timeout, self.ids)
+        return merged.select(np.lexsort((merged.rm_ts_start, merged.rm_room)))
+
+    # splits connections into room meetings and peer connections like splitRoomMeetings and RoomMeeting do,
+    # but for the whole dataset at once. ids are codes of the ids dictionary, rows are in the original order
+    @staticmethod
+    def fromConnections(meetingOnTheSameBridgeIdleTimeoutSec: int, ids: RMSIdDictionary,
+                        room: np.ndarray, peer: np.ndarray, msid: np.ndarray, rsid: np.ndarray,
+                        ts_joined: np.ndarray, ts_connected: np.ndarray, ts_leave: np.ndarray):
+        numRows = len(room)
+        position = np.arange(numRows)
+
+        # codes are given in the order of first appearance, so sorting by code keeps the order of rooms of splitRoomMeetings
+        byRoom = np.lexsort((ts_joined, room))
+        meetingStarts = splitSortedByOverlaps(
+            _changes(room[byRoom]), ts_joined[byRoom], ts_leave[byRoom], meetingOnTheSameBridgeIdleTimeoutSec
+        )
+        meetingIds = np.cumsum(meetingStarts) - 1
+        peerByRoom = peer[byRoom]
+
+        # RoomMeeting takes peers in the order of their first connection to the meeting
+        byMeetingPeer = np.lexsort((position, peerByRoom, meetingIds))
+        meetingPeerStarts = _changes(meetingIds[byMeetingPeer], peerByRoom[byMeetingPeer])
+        firstPeerPosition = np.empty(numRows, dtype=np.int64)
+        firstPeerPosition[byMeetingPeer] = byMeetingPeer[meetingPeerStarts][np.cumsum(meetingPeerStarts) - 1]
+
+        bySession = np.lexsort((position, firstPeerPosition, meetingIds))
+        rows = byRoom[bySession]
+        pcStarts = splitSortedByOverlaps(
+            _changes(meetingIds[bySession], firstPeerPosition[bySession]), ts_joined[rows], ts_leave[rows],
+            meetingOnTheSameBridgeIdleTimeoutSec
+        )
+        pcStartRows = np.flatnonzero(pcStarts)
+        pcIds = np.cumsum(pcStarts) - 1
+        meetingStartRows = np.flatnonzero(_changes(meetingIds[bySession]))
+
+        return RoomMeetingStore(
+            meetingOnTheSameBridgeIdleTimeoutSec,
+            ids,
+            room[rows[meetingStartRows]], np.append(pcIds[meetingStartRows], len(pcStartRows)),
+            peer[rows[pcStartRows]], np.append(pcStartRows, numRows),
+            msid[rows], rsid[rows],
+            ts_joined[rows], ts_connected[rows], ts_leave[rows]
+        )
+
+    # joins stores that share the ids dictionary one after another. meeting indexes of the later stores are shifted
+    @staticmethod
+    def concatenate(stores: list, meetingOnTheSameBridgeIdleTimeoutSec: int, ids: RMSIdDictionary):
+        assert len(stores) > 0, "nothing to concatenate"
+
+        def column(name: str) -> np.ndarray:
+            return np.concatenate([getattr(store, name) for store in stores])
+
+        return RoomMeetingStore(
+            meetingOnTheSameBridgeIdleTimeoutSec,
+            ids,
+            column('rm_room'), _concatenateOffsets([store.rmPcOffsets for store in stores]),
+            column('pc_peer'), _concatenateOffsets([store.pcConnOffsets for store in stores]),
+            column('conn_msid'), column('conn_rsid'),
+            column('conn_ts_joined'), column('conn_ts_connected'), column('conn_ts_leave')
+        )
+
+    # flattens room meetings into a store. meetings are consumed one by one, so a generator can be passed
+    # to avoid holding all the objects at the same time.
+    # when ids are given, the meetings are expected to carry codes of that dictionary, otherwise raw ids are encoded
+    @staticmethod
+    def fromRoomMeetings(roomMeetings: Iterable[RoomMeeting], meetingOnTheSameBridgeIdleTimeoutSec: int,
+                         ids: RMSIdDictionary = None):
+        builder = RoomMeetingStoreBuilder(meetingOnTheSameBridgeIdleTimeoutSec, ids)
+        for rm in roomMeetings:
+            builder.addRoomMeeting(rm)
+        return builder.build()
+
+
+STORE_FORMAT_VERSION = 1
+# array names of the rooms, peers, msids and rsids tables of the ids dictionary
+_LOOKUP_TABLES = ['roomIds', 'peerIds', 'msids', 'rsids']
+# recalculated from connections on load
+_DERIVED_ARRAYS = {'pc_rm', 'pc_ts_joined', 'pc_ts_connected', 'pc_ts_leave', 'rm_ts_start', 'rm_ts_finish'}
+
+
+# lookup tables are stored as one utf-8 blob with offsets, so loading them does not need pickle
+def _packStrings(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    encoded = [str(v).encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.array([len(e) for e in encoded], dtype=np.int64), out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+
+def _unpackStrings(blob: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    data = blob.tobytes()
+    bounds = offsets.tolist()
+    return np.array([data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(len(bounds) - 1)], dtype=object)
+
+
+# flags of the rows where any of the sorted keys differs from the previous row
+def _changes(*keys: np.ndarray) -> np.ndarray:
+    result = np.zeros(len(keys[0]), dtype=bool)
+    if len(result) == 0:
+        return result
+    result[0] = True
+    for key in keys:
+        result[1:] |= key[1:] != key[:-1]
+    return result
+
+
+def _concatenateOffsets(offsetsList: list[np.ndarray]) -> np.ndarray:
+    result = [np.zeros(1, dtype=np.int64)]
+    base = 0
+    for offsets in offsetsList:
+        result.append(offsets[1:] + base)
+        base += offsets[-1]
+    return np.concatenate(result)
+
+
+# indexes of the children of the given groups and the offsets of those groups among the gathered children
+def _gatherGroups(offsets: np.ndarray, groups: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    starts = offsets[groups]
+    lengths = offsets[groups + 1] - starts
+    newOffsets = np.zeros(len(groups) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=newOffsets[1:])
+    indexes = np.arange(newOffsets[-1], dtype=np.int64) + np.repeat(starts - newOffsets[:-1], lengths)
+    return indexes, newOffsets
+
+
+def _reduceGroups(ufunc: np.ufunc, values: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    if len(offsets) <= 1:
+        return np.empty(0, dtype=values.dtype)
+    assert (np.diff(offsets) > 0).all(), "empty groups are not allowed"
+    return ufunc.reduceat(values, offsets[:-1])
+
+
+class RoomMeetingStoreBuilder(ABC):
+    meetingOnTheSameBridgeIdleTimeoutSec: int
+    ids: RMSIdDictionary
+    preEncoded: bool
+
+    def __init__(self, meetingOnTheSameBridgeIdleTimeoutSec: int, ids: RMSIdDictionary = None):
+        self.meetingOnTheSameBridgeIdleTimeoutSec = meetingOnTheSameBridgeIdleTimeoutSec
+        self.preEncoded = ids is not None
+        self.ids = RMSIdDictionary() if ids is None else ids
+
+        self.rm_room = array('i')
+        self.rmPcOffsets = array('q', [0])
+        self.pc_peer = array('i')
+        self.pcConnOffsets = array('q', [0])
+        self.conn_msid = array('i')
+        self.conn_rsid = array('i')
+        self.conn_ts_joined = array('d')
+        self.conn_ts_connected = array('d')
+        self.conn_ts_leave = array('d')
+
+    def code(self, table: IdCodeTable, value) -> int:
+        return value if self.preEncoded else table.encode(value)
+
+    def addRoomMeeting(self, rm: RoomMeeting):
+        self.rm_room.append(self.code(self.ids.rooms, rm.room_id))
+        for pc in rm.peerConnections:
+            self.pc_peer.append(self.code(self.ids.peers, pc.peer_id))
+            for conn in pc.rmsConnections:
+                self.conn_msid.append(self.code(self.ids.msids, conn.msid))
+                self.conn_rsid.append(self.code(self.ids.rsids, conn.rsid))
+                self.conn_ts_joined.append(conn.ts_joined)
+                self.conn_ts_connected.append(conn.ts_connected)
+                self.conn_ts_leave.append(conn.ts_leave)
+            self.pcConnOffsets.append(len(self.conn_ts_joined))
+        self.rmPcOffsets.append(len(self.pc_peer))
+
+    def build(self) -> RoomMeetingStore:
+        return RoomMeetingStore(
+            self.meetingOnTheSameBridgeIdleTimeoutSec,
+            self.ids,
+            np.frombuffer(self.rm_room, dtype=np.int32), np.frombuffer(self.rmPcOffsets, dtype=np.int64),
+            np.frombuffer(self.pc_peer, dtype=np.int32), np.frombuffer(self.pcConnOffsets, dtype=np.int64),
+            np.frombuffer(self.conn_msid, dtype=np.int32), np.frombuffer(self.conn_rsid, dtype=np.int32),
+            np.frombuffer(self.conn_ts_joined, dtype=np.float64),
+            np.frombuffer(self.conn_ts_connected, dtype=np.float64),
+            np.frombuffer(self.conn_ts_leave, dtype=np.float64)
+        )
+
+
+# read-only views over a single row of the store. they are cheap to create and are not kept by the store.
+# id of a meeting is its index in the store. room_id, peer_id, msid and rsid are int codes: store.ids is the
+# RMSIdDictionary that decodes them, e.g. store.ids.roomId(rm.room_id)
+class StoredPeerConnection(PeerConnection):
+    store: RoomMeetingStore
+    index: int
+
+    def __init__(self, store: RoomMeetingStore, index: int):
+        self.store = store
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, StoredPeerConnection) and other.store is self.store and other.index == self.index
+
+    def __hash__(self):
+        return hash(self.index)
+
+    @property
+    def rmId(self) -> int:
+        return int(self.store.pc_rm[self.index])
+
+    @property
+    def room_id(self) -> int:
+        return int(self.store.rm_room[self.store.pc_rm[self.index]])
+
+    @property
+    def peer_id(self) -> int:
+        return int(self.store.pc_peer[self.index])
+
+    @property
+    def ts_joined(self) -> float:
+        return self.store.pc_ts_joined[self.index].item()
+
+    @property
+    def ts_connected(self) -> float:
+        return self.store.pc_ts_connected[self.index].item()
+
+    @property
+    def ts_leave(self) -> float:
+        return self.store.pc_ts_leave[self.index].item()
+
+    @property
+    def rmsConnections(self) -> list[RMSConnection]:
+        s = self.store
+        room_id = self.room_id
+        peer_id = self.peer_id
+        return [
+            RMSConnection.fromEpochs(room_id, peer_id, int(s.conn_msid[c]), int(s.conn_rsid[c]),
+                                     s.conn_ts_joined[c].item(), s.conn_ts_connected[c].item(), s.conn_ts_leave[c].item())
+            for c in range(s.pcConnOffsets[self.index], s.pcConnOffsets[self.index + 1])
+        ]
+
+
+class StoredRoomMeeting(RoomMeeting):
+    store: RoomMeetingStore
+    index: int
+
+    def __init__(self, store: RoomMeetingStore, index: int):
+        self.store = store
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, StoredRoomMeeting) and other.store is self.store and other.index == self.index
+
+    def __hash__(self):
+        return hash(self.index)
+
+    @property
+    def id(self) -> int:
+        return self.index
+
+    @property
+    def room_id(self) -> int:
+        return int(self.store.rm_room[self.index])
+
+    @property
+    def ts_start(self) -> float:
+        return self.store.rm_ts_start[self.index].item()
+
+    @property
+    def ts_finish(self) -> float:
+        return self.store.rm_ts_finish[self.index].item()
+
+    @property
+    def meetingOnTheSameBridgeIdleTimeoutSec(self) -> int:
+        return self.store.meetingOnTheSameBridgeIdleTimeoutSec
+
+    @property
+    def peerConnections(self) -> list[PeerConnection]:
+        return [StoredPeerConnection(self.store, pcIdx)
+                for pcIdx in range(self.store.rmPcOffsets[self.index], self.store.rmPcOffsets[self.index + 1])]
+
+    def __str__(self):
+        return f"room_id: {self.store.ids.roomId(self.room_id)}; ts_start: {formatIsoDate(self.ts_start)}; ts_finish: {formatIsoDate(self.ts_finish)}; id: {self.id}"
+
+
+class StoredSequence(Sequence):
+    indexes: np.ndarray
+
+    def __init__(self, indexes: np.ndarray, viewFactory):
+        self.indexes = indexes
+        self.viewFactory = viewFactory
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return StoredSequence(self.indexes[i], self.viewFactory)
+        return self.viewFactory(int(self.indexes[i]))
+
+    def __iter__(self) -> Iterator:
+        for idx in self.indexes.tolist():
+            yield self.viewFactory(idx)
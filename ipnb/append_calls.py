@@ -0,0 +1,29 @@
+import argparse
+
+from rmsops import *
+from rmsconfig import *
+
+root = setupRootLogger()
+
+# adds daily calls exports to a store of room meetings that calc_downtime.py reads with --store
+parser = argparse.ArgumentParser()
+parser.add_argument("-s", "--store", required=True, help="store file to extend. created when it does not exist")
+parser.add_argument("calls", nargs="+", help="calls files to append, in the order of dates")
+args = parser.parse_args()
+
+store: RoomMeetingStore
+if os.path.exists(args.store):
+    store = RoomMeetingStore.load(args.store)
+    assert store.meetingOnTheSameBridgeIdleTimeoutSec == MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT, \
+        f"{args.store} was built with idle timeout {store.meetingOnTheSameBridgeIdleTimeoutSec}"
+    root.info(f"Loaded {store.numRoomMeetings()} room meetings from {args.store}")
+else:
+    store = RoomMeetingStore.fromConnections(MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT, RMSIdDictionary(),
+                                             *RMSConnectionColumns().columns())
+    root.info(f"Creating {args.store}")
+
+for fname in args.calls:
+    store = appendCallsToStore(store, fname)
+
+saveRoomMeetingStore(store, args.store)
+root.info(f"Saved {store.numRoomMeetings()} room meetings to {args.store}")
@@ -0,0 +1,53 @@
+import argparse
+import random
+import time
+
+from RMSRestarter import *
+
+
+# the traversal MultiListTimestampTraverser used to do: scan of all the lists for every event
+def traverseByLinearScan(restartEventLists: list[list[RMSRestarterEvent]]):
+    indexes = [0] * len(restartEventLists)
+    while True:
+        minTs: float | None = None
+        minIndex: int | None = None
+        for i in range(0, len(restartEventLists)):
+            if indexes[i] >= len(restartEventLists[i]):
+                continue
+            eventTs = restartEventLists[i][indexes[i]].ts
+            if minTs is None or eventTs < minTs:
+                minTs = eventTs
+                minIndex = i
+        if minIndex is None:
+            return
+        datetime.now()
+        restartEventLists[minIndex][indexes[minIndex]].action()
+        indexes[minIndex] += 1
+
+
+def eventLists(numEvents: int, seed: int) -> list[list[RMSRestarterEvent]]:
+    rnd = random.Random(seed)
+    # same layout as in RMSRestarter.calculateRestarts. grace and startup lists are short
+    sizes = [numEvents, numEvents, 1, numEvents // 1000, numEvents // 1000, numEvents, numEvents]
+    noop = lambda: None
+    return [[RMSRestarterEvent(ts, noop) for ts in sorted(rnd.uniform(0, 604800) for _ in range(0, size))] for size in sizes]
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-n", "--num-events", type=int, default=200000, help="number of events in every meeting and pc list")
+args = parser.parse_args()
+
+lists = eventLists(args.num_events, 1)
+totalEvents = sum(len(l) for l in lists)
+
+started = time.perf_counter()
+traverseByLinearScan(lists)
+linearSec = time.perf_counter() - started
+
+started = time.perf_counter()
+MultiListTimestampTraverser(lists, staticLists=[0, 1, 2, 5, 6]).traverse()
+heapSec = time.perf_counter() - started
+
+print(f"events: {totalEvents}")
+print(f"linear scan: {totalEvents / linearSec:.0f} events/sec")
+print(f"heap merge: {totalEvents / heapSec:.0f} events/sec ({linearSec / heapSec:.1f}x)")
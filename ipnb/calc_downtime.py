@@ -7,42 +7,39 @@ from RoomMeetingAssignments import *
 from PeerConnection import *
 
 from rmsops import *
+from rmsconfig import *
 
-root = logging.getLogger()
-root.setLevel(logging.INFO)
-
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-root.addHandler(handler)
-
-# MAX_NUM_ROWS_FOR_DRYRUN = 50000
-MAX_NUM_ROWS_FOR_DRYRUN = 5000000000000
-shardsConfig = ShardsConfig([10]*3)
-
-MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT = 60
-ROLLOUT_DT_DURATION = 15
-PEER_IDLE_TIMEOUT_SEC = 60
-NODE_RESTARTS_IN_SEC = 120
+root = setupRootLogger()
 
 DEFAULT_GRACE_PERIOD_SEC = 60
 DEFAULT_DISRUPTION_BUDGET = 3
 
-#to reproduce bugs
-seed = random.randrange(0,10000000)
-# seed = 3558944
-random.seed(seed)
-root.info(f"Using random seed {seed}")
-
-
 parser = argparse.ArgumentParser()
 parser.add_argument("-r", "--restart-date")
 parser.add_argument("-p", "--policy")
 parser.add_argument("--dt-calc-model")
 parser.add_argument("-d", "--disruption-budget", type=int)
 parser.add_argument("-g", "--grace-period-sec", type=int)
+parser.add_argument("--store", help="read room meetings from a store built by append_calls.py instead of the calls file")
+parser.add_argument("--no-cache", action="store_true", help="always parse the calls file, do not use or write the meetings cache")
+parser.add_argument("--workers", type=int, default=1, help="number of processes used to build room meetings")
+parser.add_argument("--window", action="store_true",
+                    help="simulate only from the restart date on. the simulation up to it is saved next to the meetings once "
+                         "and later runs with the same meetings, policy and seed fork from it. results equal the full run. needs --seed")
+parser.add_argument("--trace", help="write a binary trace of the simulation to the file. print it with dump_trace.py")
+parser.add_argument("--replay", help="pick the nodes recorded by --trace of a run with the same parameters instead of running the policy")
+parser.add_argument("--seed", type=int, help="seed of the random generator of the policy. pass the logged seed to reproduce a run")
 args = parser.parse_args()
+if args.window and args.seed is None:
+    parser.error("--window reuses the simulation of the same seed, pass it with --seed")
+if args.window and (args.trace is not None or args.replay is not None):
+    parser.error("--trace and --replay need the simulation before the restart date and can not be used with --window")
+
+#to reproduce bugs
+seed = random.randrange(0,10000000)
+if args.seed is not None:
+    seed = args.seed
+root.info(f"Using random seed {seed}")
 
 restartDateStr = '2023-10-02 13:00:00,000'
 if args.restart_date is not None and len(args.restart_date) > 0:
@@ -64,17 +61,11 @@ policyStr = 'RandomIslandLeastLoadedNewNodePolicy'
 if args.policy is not None and len(args.policy) > 0:
     policyStr = args.policy
 policy: NewNodePolicy
-match policyStr:
-    case 'RandomNewNodePolicy':
-        policy = RandomNewNodePolicy(gracePeriodSec, shardsConfig)
-    case 'RoundRobinNewNodePolicy':
-        policy = RoundRobinNewNodePolicy(gracePeriodSec, shardsConfig)
-    case 'LeastLoadedNewNodePolicy':
-        policy = LeastLoadedNewNodePolicy(gracePeriodSec, shardsConfig)
-    case 'RandomIslandLeastLoadedNewNodePolicy':
-        policy = RandomIslandLeastLoadedNewNodePolicy(gracePeriodSec, shardsConfig)
-    case _:
-        raise f"unknown policy {policyStr}"
+if args.replay is not None:
+    policy = ReplayNewNodePolicy(gracePeriodSec, shardsConfig, RMSTracer.read(args.replay))
+    root.info(f"Replaying the picks of {args.replay}")
+else:
+    policy = createNewNodePolicy(policyStr, gracePeriodSec, shardsConfig, random.Random(seed))
 root.info(f"Policy: {policyStr}")
 
 dtModelStr = 'IntegratingDTClacModel'
@@ -82,25 +73,31 @@ if args.dt_calc_model is not None and len(args.dt_calc_model) > 0:
     dtModelStr = args.dt_calc_model
 root.info(f"DT Calc Model: {dtModelStr}")
 
-calls = pd.read_csv('calls_data_week.tsv', header=0, names=['msid','peer_id', 'room_id', 'rsid', 'ts_connected', 'ts_joined', 'ts_leave', 'ts_offer'], delimiter='\t', nrows=MAX_NUM_ROWS_FOR_DRYRUN)
-root.info(f"Loaded {len(calls)} events")
-roomMeetings: list[RoomMeeting] = loadRoomMeetings(calls, MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT)
-
-restarter = RMSRestarter(roomMeetings, [restartDate], disruptionBudget, NODE_RESTARTS_IN_SEC, shardsConfig, policy)
+roomMeetings: RoomMeetingStore
+if args.store is not None:
+    roomMeetings = RoomMeetingStore.load(args.store)
+elif args.no_cache:
+    roomMeetings = loadRoomMeetingStoreChunked(CALLS_FILE, MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT, MAX_NUM_ROWS_FOR_DRYRUN,
+                                               numWorkers=args.workers)
+else:
+    roomMeetings = loadCachedRoomMeetingStore(CALLS_FILE, MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT, MAX_NUM_ROWS_FOR_DRYRUN,
+                                              numWorkers=args.workers)
+
+tracer = RMSTracer(args.trace) if args.trace is not None else None
+fullSimulation = dtCalcModelClass(dtModelStr).requiresFullSimulation
+restarter = RMSRestarter(roomMeetings, [restartDate], disruptionBudget, NODE_RESTARTS_IN_SEC, shardsConfig, policy, tracer=tracer,
+                         fullSimulation=fullSimulation)
+if args.window:
+    # the policy and the assignments at the restart date are the ones of the full run with the same seed
+    checkpointKey = checkpointCacheKey(roomMeetings, policyStr, seed, [restartDate], NODE_RESTARTS_IN_SEC, shardsConfig, fullSimulation)
+    checkpointBase = args.store if args.store is not None else CALLS_FILE
+    restarter = loadCachedCheckpoint(checkpointBase, checkpointKey, restarter).fork(gracePeriodSec, disruptionBudget)
 restartResult: list[RMSRollout] = restarter.calculateRestarts()
+if tracer is not None:
+    tracer.close()
+    root.info(f"Saved {tracer.numRecords} trace records to {args.trace}")
 
-dtmodel: DTCalcModel
-match dtModelStr:
-    case 'IntegratingDTClacModel':
-        dtmodel = IntegratingDTClacModel(restarter.assignments, restartResult, restarter.sortedMeetings, PEER_IDLE_TIMEOUT_SEC, ROLLOUT_DT_DURATION)
-    case 'DTOverRolloutPeriod':
-        dtmodel = DTOverRolloutPeriod(restarter.assignments, restartResult, restarter.sortedMeetings, PEER_IDLE_TIMEOUT_SEC, ROLLOUT_DT_DURATION)
-    case 'DTOverTheWholeWeek':
-        dtmodel = DTOverTheWholeWeek(restarter.assignments, restartResult, restarter.sortedMeetings, PEER_IDLE_TIMEOUT_SEC, ROLLOUT_DT_DURATION)
-    case 'TotalDTCalcModel':
-        dtmodel = TotalDTCalcModel(restarter.assignments, restartResult, restarter.sortedMeetings, PEER_IDLE_TIMEOUT_SEC, ROLLOUT_DT_DURATION)
-    case _:
-        raise f"unknown dt calculation model {dtModelStr}"
+dtmodel = createDTCalcModel(dtModelStr, restarter.assignments, restartResult, restarter.sortedMeetings, PEER_IDLE_TIMEOUT_SEC, ROLLOUT_DT_DURATION)
 
 chart = dtmodel.totalDowntime()
 chart.populateRolloutParameters(
@@ -100,13 +100,94 @@ class RMSDowntimeChart(ABC):
             return jsons.loads(jsonstr, cls=RMSDowntimeChart)
 
 
+# spread of the charts of the same scenario simulated with different random seeds.
+# buckets missing in a chart had no downtime in that run
+@dataclass
+class RMSDowntimeBands(ABC):
+    dates: list[float]
+    datetimes: list[datetime]
+    dtsMean: list[float]
+    dtsStd: list[float]
+    dtsP5: list[float]
+    dtsP50: list[float]
+    dtsP95: list[float]
+
+    seeds: list[int]
+    totalDTs: list[float]
+    totalDTMean: float
+    totalDTStd: float
+    totalDTP5: float
+    totalDTP50: float
+    totalDTP95: float
+
+    policyStr: str
+    dtModelStr: str
+    gracePeriodSec: int
+    disruptionBudget: int
+    restartDateStr: str
+
+    def __init__(self, charts: list[RMSDowntimeChart] = None, seeds: list[int] = None):
+        self.dates = []
+        self.datetimes = []
+        self.dtsMean = []
+        self.dtsStd = []
+        self.dtsP5 = []
+        self.dtsP50 = []
+        self.dtsP95 = []
+        self.seeds = [] if seeds is None else seeds
+        self.totalDTs = []
+
+        if charts is None:
+            return
+
+        self.dates = sorted(set(date for chart in charts for date in chart.dates))
+        self.datetimes = [datetime.fromtimestamp(date) for date in self.dates]
+        dateIndexes = {date: i for i, date in enumerate(self.dates)}
+        # a row per run
+        dts = np.zeros((len(charts), len(self.dates)))
+        for run, chart in enumerate(charts):
+            for date, dt in zip(chart.dates, chart.dts):
+                dts[run, dateIndexes[date]] = dt
+        self.dtsMean = dts.mean(axis=0).tolist()
+        self.dtsStd = dts.std(axis=0).tolist()
+        self.dtsP5, self.dtsP50, self.dtsP95 = np.percentile(dts, [5, 50, 95], axis=0).tolist()
+
+        self.totalDTs = [chart.totalDT for chart in charts]
+        self.totalDTMean = float(np.mean(self.totalDTs))
+        self.totalDTStd = float(np.std(self.totalDTs))
+        self.totalDTP5, self.totalDTP50, self.totalDTP95 = np.percentile(self.totalDTs, [5, 50, 95]).tolist()
+
+        first = charts[0]
+        self.policyStr = first.policyStr
+        self.dtModelStr = first.dtModelStr
+        self.gracePeriodSec = first.gracePeriodSec
+        self.disruptionBudget = first.disruptionBudget
+        self.restartDateStr = first.restartDateStr
+
+    def serialize(self, fname: str = None):
+        if fname is None:
+            fname = f"bands_{self.policyStr}.dtmodel_{self.dtModelStr}.grace_{self.gracePeriodSec}.disr_{self.disruptionBudget}.at_{self.restartDateStr[0:19].replace(' ' , 'T')}.json"
+        jsonStr = jsons.dumps(self)
+        with open(fname, "w") as text_file:
+            text_file.write(jsonStr)
+
+    def parse(fname: str):
+        with open(fname, "r") as text_file:
+            jsonstr = text_file.read()
+            return jsons.loads(jsonstr, cls=RMSDowntimeBands)
+
+
 class DTCalcModel(ABC):
-    assignments: RoomMeetingAssignments
+    # models that read the assignments after the last rollout finished need the simulation of all the meetings.
+    # the others only read the rollouts, and the simulation stops when the last one finishes
+    requiresFullSimulation: bool = False
+
+    assignments: LiveRoomMeetingAssignments
     rollouts: list[RMSRollout]
     sortedMeetings: RMSSortedMeetings
     reconnectDowntimeSec: int
 
-    def __init__(self, assignments: RoomMeetingAssignments, rollouts: list[RMSRollout],
+    def __init__(self, assignments: LiveRoomMeetingAssignments, rollouts: list[RMSRollout],
                  sortedMeetings: RMSSortedMeetings, reconnectDowntimeSec: int):
         self.assignments = assignments
         self.rollouts = rollouts
@@ -120,20 +201,18 @@ class DTCalcModel(ABC):
 
 class TotalRMandPCGraphingModel(DTCalcModel):
     peerIdleTimeoutSec: int
-    pcBuckets: dict[float, list[PeerConnection]]
-    rmBuckets: dict[float, list[RoomMeeting]]
+    # peer connections and meetings in the buckets of peerIdleTimeoutSec
+    pcBucketIndex: RMSIntervalIndex
+    rmBucketIndex: RMSIntervalIndex
 
     def __init__(self,
-                 assignments: RoomMeetingAssignments,
+                 assignments: LiveRoomMeetingAssignments,
                  rollouts: list[RMSRollout],
                  sortedMeetings: RMSSortedMeetings,
                  peerIdleTimeoutSec: int,
                  reconnectDowntimeSec: int):
         super().__init__(assignments, rollouts, sortedMeetings, reconnectDowntimeSec)
         self.peerIdleTimeoutSec = peerIdleTimeoutSec
-
-        self.pcBuckets = defaultdict(list)
-        self.rmBuckets = defaultdict(list)
         self.indexPCsAndRMs()
 
     def floorTime(self, toFloor: float, freqSec: int) -> float:
@@ -141,27 +220,21 @@ class TotalRMandPCGraphingModel(DTCalcModel):
         epochSeconds = int(epochSeconds / freqSec) * freqSec
         return float(epochSeconds)
 
-    def addToFlooredBuckets(self, beginTs: float, endTs: float, buckets: dict[float, any], toAdd: any):
-        rm_start_floor = self.floorTime(beginTs, self.peerIdleTimeoutSec)
-        rm_finish_floor = self.floorTime(endTs, self.peerIdleTimeoutSec)
-        ts = rm_start_floor
-        leave_timestamp_sec = rm_finish_floor
-        while ts < leave_timestamp_sec:
-            buckets[ts].append(toAdd)
-            ts += self.peerIdleTimeoutSec
-
+    # the buckets only depend on the meetings. models of all simulations of the same sorted meetings share them
     def indexPCsAndRMs(self):
-        _logger.info("Starting calculation of total downtime via integrating model")
-        for rm in self.sortedMeetings.meetingByStartTs:
-            self.addToFlooredBuckets(rm.ts_start, rm.ts_finish, self.rmBuckets, rm)
-            for pc in rm.peerConnections:
-                self.addToFlooredBuckets(pc.ts_joined, pc.ts_leave, self.pcBuckets, pc)
+        self.pcBucketIndex, self.rmBucketIndex = self.sortedMeetings.derivedIndex(('bucketIndexes', self.peerIdleTimeoutSec),
+                                                                                  self.buildBucketIndexes)
+
+    def buildBucketIndexes(self) -> tuple[RMSIntervalIndex, RMSIntervalIndex]:
+        pcBucketIndex = RMSIntervalIndex.floored(*self.sortedMeetings.peerConnectionSpans(), self.peerIdleTimeoutSec)
+        rmBucketIndex = RMSIntervalIndex.floored(*self.sortedMeetings.meetingSpans(), self.peerIdleTimeoutSec)
         _logger.info("Finished indexing of active users by time buckets")
+        return pcBucketIndex, rmBucketIndex
 
     def addDTDelta(self, dtIncrements: dict[float, RMSDowntimeDT], ts: float, deltaDT: float, rmInterrupted: int, pcInterrupted: int):
         ts_floor = self.floorTime(ts, self.peerIdleTimeoutSec)
-        num_pc = len(self.pcBuckets[ts_floor])
-        num_rm = len(self.rmBuckets[ts_floor])
+        num_pc = self.pcBucketIndex.count(ts_floor)
+        num_rm = self.rmBucketIndex.count(ts_floor)
 
         theDt = dtIncrements[ts_floor]
         theDt.ts = ts_floor
@@ -177,7 +250,7 @@ class IntegratingDTClacModel(TotalRMandPCGraphingModel):
     peerIdleTimeoutSec: int
 
     def __init__(self,
-                 assignments: RoomMeetingAssignments,
+                 assignments: LiveRoomMeetingAssignments,
                  rollouts: list[RMSRollout],
                  sortedMeetings: RMSSortedMeetings,
                  peerIdleTimeoutSec: int,
@@ -189,7 +262,7 @@ class IntegratingDTClacModel(TotalRMandPCGraphingModel):
         for rollout in self.rollouts:
             for dt in rollout.downtimes:
                 ts_floor = self.floorTime(dt.ts, self.peerIdleTimeoutSec)
-                num_pc = len(self.pcBuckets[ts_floor])
+                num_pc = self.pcBucketIndex.count(ts_floor)
                 dtDelta = float(len(dt.rm.peerConnections)) * float(self.reconnectDowntimeSec) / float(num_pc)
 
                 self.addDTDelta(
@@ -206,7 +279,7 @@ class IntegratingDTClacModel(TotalRMandPCGraphingModel):
 
 class DTOverTimePeriod(TotalRMandPCGraphingModel):
     def __init__(self,
-                 assignments: RoomMeetingAssignments,
+                 assignments: LiveRoomMeetingAssignments,
                  rollouts: list[RMSRollout],
                  sortedMeetings: RMSSortedMeetings,
                  peerIdleTimeoutSec: int,
@@ -214,16 +287,14 @@ class DTOverTimePeriod(TotalRMandPCGraphingModel):
         super().__init__(assignments, rollouts, sortedMeetings, peerIdleTimeoutSec, reconnectDowntimeSec)
 
     def totalDowntimeOfRolloutForPeriod(self, allDtIncrements: dict[float, RMSDowntimeDT], rollout: RMSRollout, periodStart: float, periodEnd: float):
-        totalUserSeconds = 0
         dtIncrements: dict[float, RMSDowntimeDT] = defaultdict(lambda: RMSDowntimeDT())
-        for ts_floor, peerConnections in self.pcBuckets.items():
-            if periodStart <= ts_floor <= periodEnd:
-                totalUserSeconds += len(peerConnections) * self.peerIdleTimeoutSec
+        periodBuckets = np.arange(periodStart, periodEnd + self.peerIdleTimeoutSec, self.peerIdleTimeoutSec)
+        totalUserSeconds = int(self.pcBucketIndex.count(periodBuckets).sum()) * self.peerIdleTimeoutSec
 
         for dt in rollout.downtimes:
             deltaDT = float(len(dt.rm.peerConnections)*self.reconnectDowntimeSec)
             ts_floor = self.floorTime(dt.ts, self.peerIdleTimeoutSec)
-            num_pc = len(self.pcBuckets[ts_floor])
+            num_pc = self.pcBucketIndex.count(ts_floor)
             self.addDTDelta(dtIncrements, dt.ts, deltaDT, 1, num_pc)
 
         # normalize by the total number of user*seconds there were in the rollout
@@ -235,7 +306,7 @@ class DTOverTimePeriod(TotalRMandPCGraphingModel):
 
 class DTOverRolloutPeriod(DTOverTimePeriod):
     def __init__(self,
-                 assignments: RoomMeetingAssignments,
+                 assignments: LiveRoomMeetingAssignments,
                  rollouts: list[RMSRollout],
                  sortedMeetings: RMSSortedMeetings,
                  peerIdleTimeoutSec: int,
@@ -256,7 +327,7 @@ class DTOverRolloutPeriod(DTOverTimePeriod):
 
 class DTOverTheWholeWeek(DTOverTimePeriod):
     def __init__(self,
-                 assignments: RoomMeetingAssignments,
+                 assignments: LiveRoomMeetingAssignments,
                  rollouts: list[RMSRollout],
                  sortedMeetings: RMSSortedMeetings,
                  peerIdleTimeoutSec: int,
@@ -282,7 +353,7 @@ class DTOverTheWholeWeek(DTOverTimePeriod):
 
 class TotalDTCalcModel(DTOverTimePeriod):
     def __init__(self,
-                 assignments: RoomMeetingAssignments,
+                 assignments: LiveRoomMeetingAssignments,
                  rollouts: list[RMSRollout],
                  sortedMeetings: RMSSortedMeetings,
                  peerIdleTimeoutSec: int,
@@ -295,8 +366,27 @@ class TotalDTCalcModel(DTOverTimePeriod):
             for dt in rollout.downtimes:
                 deltaDT = float(len(dt.rm.peerConnections) * self.reconnectDowntimeSec)
                 ts_floor = self.floorTime(dt.ts, self.peerIdleTimeoutSec)
-                num_pc = len(self.pcBuckets[ts_floor])
+                num_pc = self.pcBucketIndex.count(ts_floor)
                 self.addDTDelta(allDtIncrements, dt.ts, deltaDT, 1, num_pc)
 
         _logger.info("Finished calculation of total downtime via TotalDTCalcModel")
-        return RMSDowntimeChart(unorderedData=allDtIncrements, restartResult=self.rollouts)
\ No newline at end of file
+        return RMSDowntimeChart(unorderedData=allDtIncrements, restartResult=self.rollouts)
+
+
+DT_CALC_MODELS: dict[str, type[DTCalcModel]] = {
+    'IntegratingDTClacModel': IntegratingDTClacModel,
+    'DTOverRolloutPeriod': DTOverRolloutPeriod,
+    'DTOverTheWholeWeek': DTOverTheWholeWeek,
+    'TotalDTCalcModel': TotalDTCalcModel,
+}
+
+
+def dtCalcModelClass(dtModelStr: str) -> type[DTCalcModel]:
+    if dtModelStr not in DT_CALC_MODELS:
+        raise Exception(f"unknown dt calculation model {dtModelStr}")
+    return DT_CALC_MODELS[dtModelStr]
+
+
+def createDTCalcModel(dtModelStr: str, assignments: LiveRoomMeetingAssignments, rollouts: list[RMSRollout],
+                      sortedMeetings: RMSSortedMeetings, peerIdleTimeoutSec: int, reconnectDowntimeSec: int) -> DTCalcModel:
+    return dtCalcModelClass(dtModelStr)(assignments, rollouts, sortedMeetings, peerIdleTimeoutSec, reconnectDowntimeSec)
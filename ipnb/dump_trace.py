@@ -0,0 +1,31 @@
+import argparse
+import sys
+from collections import defaultdict
+
+from RMSTracer import *
+
+# prints a trace written by calc_downtime.py --trace
+parser = argparse.ArgumentParser()
+parser.add_argument("trace")
+parser.add_argument("--node", type=int, help="only the records of the node")
+parser.add_argument("--meeting", type=int, help="only the records of the room meeting")
+parser.add_argument("--at", help="print the nodes of the meetings and the nodes in maintenance at the date instead")
+args = parser.parse_args()
+
+records = RMSTracer.read(args.trace)
+if args.at is not None:
+    state = RMSTraceState.at(records, parseIsoDate(args.at))
+    nodeMeetings = defaultdict(list)
+    for meeting, node in state.meetingNodes.items():
+        nodeMeetings[node].append(meeting)
+    for node in sorted(set(nodeMeetings) | state.nodesInMaintenance):
+        maintenance = " (maintenance)" if node in state.nodesInMaintenance else ""
+        print(f"node {node}{maintenance}: {sorted(nodeMeetings[node])}")
+    sys.exit(0)
+
+if args.node is not None:
+    records = records[records['node'] == args.node]
+if args.meeting is not None:
+    records = records[records['meeting'] == args.meeting]
+for record in records:
+    print(formatTraceRecord(record))
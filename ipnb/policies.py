@@ -6,51 +6,54 @@ from typing import Callable
 from sortedcontainers import SortedDict
 
 from RoomMeetingAssignments import *
+from RMSTracer import *
 
 _logger = logging.getLogger("policies")
 
 class NewNodePolicy(ABC):
     @abc.abstractmethod
-    def pickNodeForRoom(self, ts: float, rmass: RoomMeetingAssignments) -> int:
+    def pickNodeForRoom(self, ts: float, rmass: LiveRoomMeetingAssignments) -> int:
         raise 'not implemented'
 
-    def gracePeriod(self, ts: float, rmass: RoomMeetingAssignments) -> int:
+    def gracePeriod(self, ts: float, rmass: LiveRoomMeetingAssignments) -> int:
         raise 'not implemented'
 
-    def peerConnectionAssigned(self, ts: float, node: int, rmId: str):
+    def peerConnectionAssigned(self, ts: float, node: int, rmId: int):
         pass
 
-    def peerConnectionReleased(self, ts: float, node: int, rmId: str):
+    def peerConnectionReleased(self, ts: float, node: int, rmId: int):
         pass
 
-    def nodeOfRoomMeetingChanged(self, ts: float, oldNode: int, newNode: int, rmId: str):
+    def nodeOfRoomMeetingChanged(self, ts: float, oldNode: int, newNode: int, rmId: int):
         pass
 
 
 class ConstantGracePeriodShardedCluster(NewNodePolicy):
     gracePeriodSec: int
     shardsConfig: ShardsConfig
+    # every policy has its own generator, so simulations running side by side do not affect each other's picks
+    rnd: random.Random
 
-    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig):
+    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig, rnd: random.Random = None):
         self.gracePeriodSec = gracePeriodSec
         self.shardsConfig = shardsConfig
+        self.rnd = random.Random() if rnd is None else rnd
 
-    def gracePeriod(self, ts: float, rmass: RoomMeetingAssignments) -> int:
+    def gracePeriod(self, ts: float, rmass: LiveRoomMeetingAssignments) -> int:
         return self.gracePeriodSec
 
 
 # pick a new media server at random
 class RandomNewNodePolicy(ConstantGracePeriodShardedCluster):
-    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig):
-        super().__init__(gracePeriodSec, shardsConfig)
+    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig, rnd: random.Random = None):
+        super().__init__(gracePeriodSec, shardsConfig, rnd)
 
-    def pickNodeForRoom(self, ts: float, rmass: RoomMeetingAssignments) -> int:
+    def pickNodeForRoom(self, ts: float, rmass: LiveRoomMeetingAssignments) -> int:
         nodesInMaintenance = sorted(list(rmass.getNodesInMaintenance(ts)))
-        idxToPick = random.randrange(0, self.shardsConfig.numNodesGlobal() - len(nodesInMaintenance))
+        idxToPick = self.rnd.randrange(0, self.shardsConfig.numNodesGlobal() - len(nodesInMaintenance))
         for inMaintenance in nodesInMaintenance:
             if idxToPick >= inMaintenance:
                 idxToPick += 1
-        _logger.debug(f"picked node {idxToPick}. Nodes in maintenance are {nodesInMaintenance}")
         return idxToPick
 
 
@@ -59,11 +62,11 @@ class RoundRobinNewNodePolicy(ConstantGracePeriodShardedCluster):
     numNodes: int
     lastSelectedRoundRobinNode: int
 
-    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig):
-        super().__init__(gracePeriodSec, shardsConfig)
+    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig, rnd: random.Random = None):
+        super().__init__(gracePeriodSec, shardsConfig, rnd)
         self.lastSelectedRoundRobinNode = -1
 
-    def pickNodeForRoom(self, ts: float, rmass: RoomMeetingAssignments) -> int:
+    def pickNodeForRoom(self, ts: float, rmass: LiveRoomMeetingAssignments) -> int:
         self.lastSelectedRoundRobinNode = (self.lastSelectedRoundRobinNode + 1) % self.shardsConfig.numNodesGlobal()
         return self.lastSelectedRoundRobinNode
 
@@ -72,14 +75,15 @@ class ShardToPeerConnectionAssignmentsCounter(ABC):
     # sorted one. used to find the least loaded node
     pcNumToNodes: dict[int, set[int]]
     nodeToPcNum: dict[int, int]
-    roomToPCNum: dict[str, int]
+    # number of peer connections by room meeting id
+    roomToPCNum: list[int]
     lastTs: float
 
     def __init__(self, nodesInCluster: Iterable[int]):
         self.lastTs = 0.0
         self.pcNumToNodes = SortedDict()
         self.nodeToPCNum = {}
-        self.roomToPCNum = defaultdict(lambda: 0)
+        self.roomToPCNum = []
 
         allNodes = set()
         for node in nodesInCluster:
@@ -100,8 +104,9 @@ class ShardToPeerConnectionAssignmentsCounter(ABC):
         return self.pcNumToNodes[pcNum]
 
     # assigns peer connection to the node that rm is assigned to
-    def assignPeerConnection(self, ts: float, node: int, rmId: str):
+    def assignPeerConnection(self, ts: float, node: int, rmId: int):
         self.assertTS(ts)
+        ensureListIndex(self.roomToPCNum, rmId, 0)
 
         currentNum = self.nodeToPCNum[node]
         self.nodeToPCNum[node] += 1
@@ -110,7 +115,7 @@ class ShardToPeerConnectionAssignmentsCounter(ABC):
         self.pcNumToNode(currentNum+1).add(node)
 
     # releases peer connection from the node that rm is assigned to
-    def releasePeerConnection(self, ts: float, node: int, rmId: str):
+    def releasePeerConnection(self, ts: float, node: int, rmId: int):
         self.assertTS(ts)
         currentNum = self.nodeToPCNum[node]
         self.nodeToPCNum[node] -= 1
@@ -118,12 +123,9 @@ class ShardToPeerConnectionAssignmentsCounter(ABC):
         self.pcNumToNode(currentNum).remove(node)
         self.pcNumToNode(currentNum - 1).add(node)
 
-        if self.roomToPCNum[rmId] == 0:
-            del self.roomToPCNum[rmId]
-
-    def reassignRoomMeeting(self, ts: float, oldNode: int, newNode: int, rmId: str):
+    def reassignRoomMeeting(self, ts: float, oldNode: int, newNode: int, rmId: int):
         self.assertTS(ts)
-        numToReassign = self.roomToPCNum[rmId]
+        numToReassign = self.getNumPCInRoom(rmId)
         oldNodeOldNum = self.nodeToPCNum[oldNode]
         oldNodeNewNum = oldNodeOldNum - numToReassign
         assert oldNodeNewNum >= 0, f"Can not reassign {numToReassign} pcs from node {oldNode} to node {newNode}. {oldNode} only has {oldNodeOldNum} pcs"
@@ -136,8 +138,8 @@ class ShardToPeerConnectionAssignmentsCounter(ABC):
         self.pcNumToNode(newNodeOldNum).remove(newNode)
         self.pcNumToNode(newNodeNewNum).add(newNode)
 
-    def getNumPCInRoom(self, rmId: str):
-        return self.roomToPCNum[rmId] or 0
+    def getNumPCInRoom(self, rmId: int):
+        return self.roomToPCNum[rmId] if rmId < len(self.roomToPCNum) else 0
 
     def getLeastLoadedNodes(self, nodeFilter: Callable[[int], bool]) -> list[int]:
         for _, nodes in self.pcNumToNodes.items():
@@ -156,28 +158,28 @@ class LeastLoadedNewNodePolicy(ConstantGracePeriodShardedCluster):
 
     globalAssignmentCounter: ShardToPeerConnectionAssignmentsCounter
 
-    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig):
-        super().__init__(gracePeriodSec, shardsConfig)
+    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig, rnd: random.Random = None):
+        super().__init__(gracePeriodSec, shardsConfig, rnd)
         allNodesRange = range(0, self.shardsConfig.numNodesGlobal())
         self.globalAssignmentCounter = ShardToPeerConnectionAssignmentsCounter(allNodesRange)
 
-    def pickNodeFromListOfNodes(self, ts: float, rmass: RoomMeetingAssignments, leastLoadedFinder: ShardToPeerConnectionAssignmentsCounter) -> int:
+    def pickNodeFromListOfNodes(self, ts: float, rmass: LiveRoomMeetingAssignments, leastLoadedFinder: ShardToPeerConnectionAssignmentsCounter) -> int:
         leastLoadedNodes = leastLoadedFinder.getLeastLoadedNodes(lambda theNode: not rmass.isNodeInMaintenance(theNode, ts))
 
         assert len(leastLoadedNodes) > 0, "Failed to find any node to pick. Must be a bug"
-        randomLeastLoadedIndex = random.randrange(0, len(leastLoadedNodes))
+        randomLeastLoadedIndex = self.rnd.randrange(0, len(leastLoadedNodes))
         return leastLoadedNodes[randomLeastLoadedIndex]
 
-    def pickNodeForRoom(self, ts: float, rmass: RoomMeetingAssignments) -> int:
+    def pickNodeForRoom(self, ts: float, rmass: LiveRoomMeetingAssignments) -> int:
         return self.pickNodeFromListOfNodes(ts, rmass, self.globalAssignmentCounter)
 
-    def peerConnectionAssigned(self, ts: float, node: int, rmId: str):
+    def peerConnectionAssigned(self, ts: float, node: int, rmId: int):
         self.globalAssignmentCounter.assignPeerConnection(ts, node, rmId)
 
-    def peerConnectionReleased(self, ts: float, node: int, rmId: str):
+    def peerConnectionReleased(self, ts: float, node: int, rmId: int):
         self.globalAssignmentCounter.releasePeerConnection(ts, node, rmId)
 
-    def nodeOfRoomMeetingChanged(self, ts: float, oldNode: int, newNode: int, rmId: str):
+    def nodeOfRoomMeetingChanged(self, ts: float, oldNode: int, newNode: int, rmId: int):
         self.globalAssignmentCounter.reassignRoomMeeting(ts, oldNode, newNode, rmId)
 
 
@@ -185,14 +187,52 @@ class LeastLoadedNewNodePolicy(ConstantGracePeriodShardedCluster):
 class RandomIslandLeastLoadedNewNodePolicy(LeastLoadedNewNodePolicy):
     leastLoadedCounters: dict[int, ShardToPeerConnectionAssignmentsCounter]
 
-    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig):
-        super().__init__(gracePeriodSec, shardsConfig)
+    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig, rnd: random.Random = None):
+        super().__init__(gracePeriodSec, shardsConfig, rnd)
         self.leastLoadedCounters = {}
         for numCluster in range(0, len(self.shardsConfig.shards)):
             self.leastLoadedCounters[numCluster] = ShardToPeerConnectionAssignmentsCounter(
                 self.shardsConfig.nodesInCluster(numCluster)
             )
 
-    def pickNodeForRoom(self, ts: float, rmass: RoomMeetingAssignments) -> int:
-        clusterToPick = random.randrange(0, self.shardsConfig.numClusters())
+    def pickNodeForRoom(self, ts: float, rmass: LiveRoomMeetingAssignments) -> int:
+        clusterToPick = self.rnd.randrange(0, self.shardsConfig.numClusters())
         return self.pickNodeFromListOfNodes(ts, rmass, self.leastLoadedCounters[clusterToPick])
+
+
+# picks the nodes recorded in the trace of another run instead of deciding. the rest of the simulation does not depend
+# on the policy, so the run is repeated exactly without the state of the policy that recorded it.
+# the trace has to be recorded with the same meetings, restart dates and rollout parameters
+class ReplayNewNodePolicy(ConstantGracePeriodShardedCluster):
+    pickTs: list[float]
+    pickNodes: list[int]
+    nextPick: int
+
+    def __init__(self, gracePeriodSec: int, shardsConfig: ShardsConfig, trace: np.ndarray):
+        super().__init__(gracePeriodSec, shardsConfig)
+        picks = trace[np.isin(trace['kind'], [RMSTraceKind.MEETING_ASSIGNED, RMSTraceKind.MEETING_REASSIGNED])]
+        self.pickTs = picks['ts'].tolist()
+        self.pickNodes = picks['node'].tolist()
+        self.nextPick = 0
+
+    def pickNodeForRoom(self, ts: float, rmass: LiveRoomMeetingAssignments) -> int:
+        assert self.nextPick < len(self.pickNodes), "no more picks in the trace. it was recorded for another run"
+        assert self.pickTs[self.nextPick] == ts, \
+            f"pick {self.nextPick} of the trace was at {formatIsoDate(self.pickTs[self.nextPick])}, not at {formatIsoDate(ts)}. it was recorded for another run"
+        node = self.pickNodes[self.nextPick]
+        self.nextPick += 1
+        return node
+
+
+def createNewNodePolicy(policyStr: str, gracePeriodSec: int, shardsConfig: ShardsConfig, rnd: random.Random = None) -> NewNodePolicy:
+    match policyStr:
+        case 'RandomNewNodePolicy':
+            return RandomNewNodePolicy(gracePeriodSec, shardsConfig, rnd)
+        case 'RoundRobinNewNodePolicy':
+            return RoundRobinNewNodePolicy(gracePeriodSec, shardsConfig, rnd)
+        case 'LeastLoadedNewNodePolicy':
+            return LeastLoadedNewNodePolicy(gracePeriodSec, shardsConfig, rnd)
+        case 'RandomIslandLeastLoadedNewNodePolicy':
+            return RandomIslandLeastLoadedNewNodePolicy(gracePeriodSec, shardsConfig, rnd)
+        case _:
+            raise Exception(f"unknown policy {policyStr}")
@@ -1,6 +1,14 @@
 from rmsops import *
 from RoomMeetingAssignments import *
 from RMSRestarter import *
+from dt_calc_models import *
+from RMSAssignmentHistory import *
+import math
+import os
+import pickle
+import tempfile
+
+import pandas as pd
 
 def run_tests(meetingOnTheSameBridgeIdleTimeout) :
     # RMSConnection tests
@@ -92,39 +100,33 @@ def run_tests(meetingOnTheSameBridgeIdleTimeout) :
 
     db = RoomMeetingAssignments()
     rm1 = RoomMeeting([RMSConnection('room_id', 'peer_id2', 'msid', 'rsid', '2023-10-04 12:54:00,000',
-                                     '2023-10-04 12:54:05,000', '2023-10-04 13:55:00,000')], meetingOnTheSameBridgeIdleTimeout)
-    rm1.id = 'rm1'
+                                     '2023-10-04 12:54:05,000', '2023-10-04 13:55:00,000')], meetingOnTheSameBridgeIdleTimeout, 0)
     db.assignRoomMeeting(rm1, 0, rm1.ts_start)
     rm2 = RoomMeeting([RMSConnection('room_id', 'peer_id2', 'msid', 'rsid', '2023-10-04 13:54:00,000',
-                                     '2023-10-04 13:54:05,000', '2023-10-04 13:55:01,000')], meetingOnTheSameBridgeIdleTimeout)
-    rm2.id = "rm2"
+                                     '2023-10-04 13:54:05,000', '2023-10-04 13:55:01,000')], meetingOnTheSameBridgeIdleTimeout, 1)
     db.assignRoomMeeting(rm2, 0, rm2.ts_start)
     db.releaseRoomMeeting(rm1, rm1.ts_finish)
     db.releaseRoomMeeting(rm2, rm2.ts_finish)
 
     rm3 = RoomMeeting([RMSConnection('room_id', 'peer_id2', 'msid', 'rsid', '2023-10-04 14:54:00,000',
-                                     '2023-10-04 14:54:05,000', '2023-10-04 14:55:00,000')], meetingOnTheSameBridgeIdleTimeout)
-    rm3.id = "rm3"
+                                     '2023-10-04 14:54:05,000', '2023-10-04 14:55:00,000')], meetingOnTheSameBridgeIdleTimeout, 2)
     db.assignRoomMeeting(rm3, 0, rm3.ts_start)
     db.releaseRoomMeeting(rm3, rm3.ts_finish)
 
     rm4 = RoomMeeting([RMSConnection('room_id', 'peer_id2', 'msid', 'rsid', '2023-10-04 15:54:00,000',
-                                     '2023-10-04 15:54:05,000', '2023-10-04 15:55:00,000')], meetingOnTheSameBridgeIdleTimeout)
-    rm4.id = "rm4"
+                                     '2023-10-04 15:54:05,000', '2023-10-04 15:55:00,000')], meetingOnTheSameBridgeIdleTimeout, 3)
     db.assignRoomMeeting(rm4, 0, rm4.ts_start)
     db.releaseRoomMeeting(rm4, rm4.ts_finish)
 
-    assert db.nodeToRoomMeeting == {
-        0: {
-            rm1.ts_start: [rm1.id],
-            rm2.ts_start: [rm1.id, rm2.id],
-            rm1.ts_finish: [rm2.id],
-            rm2.ts_finish: [],
-            rm3.ts_start: [rm3.id],
-            rm3.ts_finish: [],
-            rm4.ts_start: [rm4.id],
-            rm4.ts_finish: [],
-        }
+    assert db.nodeHistory[0].states() == {
+        rm1.ts_start: [rm1.id],
+        rm2.ts_start: [rm1.id, rm2.id],
+        rm1.ts_finish: [rm2.id],
+        rm2.ts_finish: [],
+        rm3.ts_start: [rm3.id],
+        rm3.ts_finish: [],
+        rm4.ts_start: [rm4.id],
+        rm4.ts_finish: [],
     }
 
 
@@ -176,4 +178,750 @@ def testTraverser():
     assert checker == 11, f"checker has not reached {11}. It is at {checker}"
     print("MultiListTimestampTraverser check - success")
 
-testTraverser()
\ No newline at end of file
+testTraverser()
+
+
+def testTraverserMovedEvents():
+    order = []
+    moved = [
+        RMSRestarterEvent(10.0, lambda: order.append('a')),
+        RMSRestarterEvent(50.0, lambda: order.append('moved'))
+    ]
+
+    # moves the second event of the other list before the events of this one with the same ts
+    def moveEarlier():
+        order.append('mover')
+        moved[1] = RMSRestarterEvent(30.0, lambda: order.append('moved earlier'))
+
+    lists = [
+        [RMSRestarterEvent(20.0, moveEarlier), RMSRestarterEvent(30.0, lambda: order.append('b')), RMSRestarterEvent(40.0, lambda: order.append('c'))],
+        moved,
+        [RMSRestarterEvent(30.0, lambda: order.append('d'))]
+    ]
+    MultiListTimestampTraverser(lists, staticLists=[0, 2]).traverse()
+    assert order == ['a', 'mover', 'b', 'moved earlier', 'd', 'c'], order
+    print("MultiListTimestampTraverser moved events check - success")
+
+testTraverserMovedEvents()
+
+
+def testTraverserStaticLists():
+    # static lists are merged with the heap, the appended list is checked on every event. ties go to the smaller index
+    def traverse(staticLists: list[int]) -> list[str]:
+        order = []
+        appended = []
+
+        def append(name: str, ts: float):
+            order.append(name)
+            appended.append(RMSRestarterEvent(ts, lambda: order.append(f"appended at {ts}")))
+
+        lists = [
+            [RMSRestarterEvent(10.0, lambda: order.append('a1')), RMSRestarterEvent(30.0, lambda: order.append('a2')),
+             RMSRestarterEvent(30.0, lambda: order.append('a3'))],
+            [],
+            [RMSRestarterEvent(20.0, lambda: append('b1', 30.0)), RMSRestarterEvent(30.0, lambda: order.append('b2')),
+             RMSRestarterEvent(45.0, lambda: append('b3', 50.0))],
+            appended,
+            [RMSRestarterEvent(10.0, lambda: order.append('c1')), RMSRestarterEvent(50.0, lambda: order.append('c2'))]
+        ]
+        MultiListTimestampTraverser(lists, staticLists=staticLists).traverse()
+        return order
+
+    expected = ['a1', 'c1', 'b1', 'a2', 'a3', 'b2', 'appended at 30.0', 'b3', 'appended at 50.0', 'c2']
+    assert traverse([]) == expected, traverse([])
+    assert traverse([0, 1, 2, 4]) == expected, traverse([0, 1, 2, 4])
+    print("MultiListTimestampTraverser static lists check - success")
+
+testTraverserStaticLists()
+
+
+def testTypedEvents():
+    order = []
+    starts = RMSEventList(RMSEventKind.MEETING_START, [10.0, 20.0])
+    startups = RMSEventList(RMSEventKind.NODE_STARTUP)
+    finishes = RMSEventList(RMSEventKind.MEETING_FINISH, np.array([20.0, 30.0]))
+
+    def meetingStarted(i: int):
+        order.append(('start', i))
+        startups.append(starts.ts[i] + 5, 7 + i)
+
+    handlers = {
+        RMSEventKind.MEETING_START: meetingStarted,
+        RMSEventKind.NODE_STARTUP: lambda i: order.append(('startup', startups.nodes[i])),
+        RMSEventKind.MEETING_FINISH: lambda i: order.append(('finish', i)),
+    }
+    actions = [RMSRestarterEvent(25.0, lambda: order.append('action'))]
+    MultiListTimestampTraverser([starts, startups, actions, finishes], staticLists=[0, 3], handlers=handlers).traverse()
+    assert order == [('start', 0), ('startup', 7), ('start', 1), ('finish', 0), ('startup', 8), 'action', ('finish', 1)], order
+
+    restored = pickle.loads(pickle.dumps(startups))
+    assert (restored.kind, list(restored.ts), list(restored.nodes)) == (RMSEventKind.NODE_STARTUP, [15.0, 25.0], [7, 8])
+
+    # events appended to a list built from ts keep their nodes
+    prebuilt = RMSEventList(RMSEventKind.NODE_STARTUP, [1.0, 2.0])
+    prebuilt.append(3.0, 5)
+    assert list(prebuilt.nodes) == [-1, -1, 5] and prebuilt.nodes[2] == 5
+    print("Typed events check - success")
+
+testTypedEvents()
+
+
+def testGraceScheduler():
+    scheduler = RMSGraceScheduler()
+    scheduler.schedule(1, 100.0, 0)
+    scheduler.schedule(2, 300.0, 0)
+    scheduler.schedule(3, 200.0, 1)
+    # drained nodes go after the events already scheduled for the same ts
+    assert scheduler.reschedule(2, 100.0)
+    assert scheduler.reschedule(3, 150.0) and scheduler.reschedule(3, 120.0)
+    assert len(scheduler) == 3 and scheduler.headTs() == 100.0
+
+    assert scheduler.pop() == (100.0, 1, 0)
+    assert not scheduler.isScheduled(1) and not scheduler.reschedule(1, 110.0)
+    assert scheduler.pop() == (100.0, 2, 0)
+    assert scheduler.pop() == (120.0, 3, 1)
+    assert scheduler.headTs() is None and len(scheduler) == 0
+
+    order = []
+    scheduler.schedule(4, 50.0, 0)
+    lists = [
+        [RMSRestarterEvent(50.0, lambda: order.append('before')), RMSRestarterEvent(60.0, lambda: scheduler.reschedule(5, 60.0))],
+        scheduler,
+        [RMSRestarterEvent(50.0, lambda: (order.append('after'), scheduler.schedule(5, 70.0, 2)))],
+    ]
+    handlers = {RMSEventKind.GRACE_FINISH: lambda event: order.append(event)}
+    MultiListTimestampTraverser(lists, staticLists=[0, 2], handlers=handlers).traverse()
+    assert order == ['before', (50.0, 4, 0), 'after', (60.0, 5, 2)], order
+    print("RMSGraceScheduler check - success")
+
+testGraceScheduler()
+
+def testVectorizedTimestampParsing():
+    nan = float('nan')
+    calls = pd.DataFrame({
+        'room_id': ['r1', 'r1', 'r2', 'r2', 'r3'],
+        'peer_id': ['p1', 'p2', 'p3', 'p4', 'p5'],
+        'msid': ['m'] * 5,
+        'rsid': ['r'] * 5,
+        'ts_connected': ['2023-10-04 12:54:13,550', nan, '2023-10-04 12:54:13,000', nan, '2023-10-29 02:30:00,123456'],
+        'ts_joined': ['2023-10-04 12:53:13,550', nan, nan, '2023-10-04 12:53:13,000', '2023-10-29 02:29:00,1'],
+        'ts_leave': ['2023-10-04 12:55:13,550', nan, '2023-10-04 12:55:13,000', nan, nan],
+    })
+    timestamps = parseRMSConnectionTimestamps(calls)
+
+    assert timestamps.ts_joined[0] == parseIsoDate('2023-10-04 12:53:13,550')
+    assert timestamps.ts_connected[4] == parseIsoDate('2023-10-29 02:30:00,123456')
+    assert timestamps.ts_joined[4] == parseIsoDate('2023-10-29 02:29:00,1')
+    assert np.isnan(timestamps.ts_leave[1])
+
+    # same counts as RMSConnectionCreationException reasons would give
+    reasons = []
+    for index in range(0, calls.shape[0]):
+        try:
+            RMSConnection(*[calls[col][index] for col in ['room_id', 'peer_id', 'msid', 'rsid', 'ts_joined', 'ts_connected', 'ts_leave']])
+        except RMSConnectionCreationException as e:
+            reasons.append(e.reason)
+    assert timestamps.errorsConnected().sum() == reasons.count('connected') == 2
+    assert timestamps.errorsJoined().sum() == reasons.count('joined') == 1
+    assert timestamps.errorsLeave().sum() == reasons.count('leave') == 1
+    assert list(timestamps.valid()) == [True, False, False, False, False]
+    print("parseRMSConnectionTimestamps check - success")
+
+testVectorizedTimestampParsing()
+
+
+def testRoomMeetingStore():
+    meetings = splitRoomMeetings({
+        'room1': [
+            RMSConnection('room1', 'peer1', 'msid1', 'rsid1', '2023-10-04 12:54:13,550', '2023-10-04 12:55:13,550', '2023-10-04 12:56:00,000'),
+            RMSConnection('room1', 'peer2', 'msid2', 'rsid1', '2023-10-04 12:54:00,000', '2023-10-04 12:55:00,000', '2023-10-04 12:57:00,000'),
+            RMSConnection('room1', 'peer1', 'msid1', 'rsid1', '2023-10-04 12:56:30,000', '2023-10-04 12:56:35,000', '2023-10-04 12:58:00,000'),
+            RMSConnection('room1', 'peer1', 'msid3', 'rsid2', '2023-10-04 13:30:00,000', '2023-10-04 13:30:01,000', '2023-10-04 13:31:00,000'),
+        ],
+        'room2': [
+            RMSConnection('room2', 'peer3', 'msid4', 'rsid3', '2023-10-04 12:55:00,000', '2023-10-04 12:55:01,000', '2023-10-04 12:59:00,000'),
+        ]
+    }, 60)
+    store = RoomMeetingStore.fromRoomMeetings(meetings, 60)
+    assert store.numRoomMeetings() == 3
+    assert store.numPeerConnections() == 4
+    assert store.numConnections() == 5
+
+    for rm, stored in zip(meetings, store.meetings()):
+        assert store.ids.roomId(stored.room_id) == rm.room_id
+        assert stored.ts_start == rm.ts_start
+        assert stored.ts_finish == rm.ts_finish
+        assert len(stored.peerConnections) == len(rm.peerConnections)
+        for pc, storedPc in zip(rm.peerConnections, stored.peerConnections):
+            assert storedPc.rmId == stored.id
+            assert (store.ids.roomId(storedPc.room_id), store.ids.peerId(storedPc.peer_id)) == (pc.room_id, pc.peer_id)
+            assert (storedPc.ts_joined, storedPc.ts_connected, storedPc.ts_leave) == (pc.ts_joined, pc.ts_connected, pc.ts_leave)
+            assert [(store.ids.msid(c.msid), store.ids.rsid(c.rsid), c.ts_joined, c.ts_leave) for c in storedPc.rmsConnections] == \
+                   [(c.msid, c.rsid, c.ts_joined, c.ts_leave) for c in pc.rmsConnections]
+
+    fromObjects = RMSSortedMeetings(meetings)
+    fromStore = RMSSortedMeetings(store)
+    objectIds = {rm.id: i for i, rm in enumerate(meetings)}
+    assert [objectIds[rm.id] for rm in fromObjects.meetingByStartTs] == [rm.id for rm in fromStore.meetingByStartTs]
+    assert [objectIds[rm.id] for rm in fromObjects.meetingByFinishTs] == [rm.id for rm in fromStore.meetingByFinishTs]
+    assert [(pc.peer_id, pc.ts_joined) for pc in fromObjects.pcByConnectTs] == \
+           [(store.ids.peerId(pc.peer_id), pc.ts_joined) for pc in fromStore.pcByConnectTs]
+    assert [(pc.peer_id, pc.ts_leave) for pc in fromObjects.pcByLeaveTs] == \
+           [(store.ids.peerId(pc.peer_id), pc.ts_leave) for pc in fromStore.pcByLeaveTs]
+    assert str(store.meeting(0)).startswith("room_id: room1;")
+    print("RoomMeetingStore check - success")
+
+    expectedTs = {
+        RMSEventKind.MEETING_START: [rm.ts_start for rm in fromObjects.meetingByStartTs],
+        RMSEventKind.PC_CONNECT: [pc.ts_joined for pc in fromObjects.pcByConnectTs],
+        RMSEventKind.PC_LEAVE: [pc.ts_leave for pc in fromObjects.pcByLeaveTs],
+        RMSEventKind.MEETING_FINISH: [rm.ts_finish for rm in fromObjects.meetingByFinishTs],
+    }
+    for kind, expected in expectedTs.items():
+        for sortedMeetings in [fromObjects, fromStore]:
+            # chunks smaller than the number of events
+            cursor = RMSSortedMeetingsCursor(kind, sortedMeetings, chunkSize=3)
+            ts = []
+            headTs = cursor.headTs()
+            while headTs is not None:
+                ts.append(headTs)
+                headTs = cursor.advance()
+            assert ts == expected, f"{kind.name}: {ts}"
+            assert (len(cursor), cursor.position) == (len(expected), len(expected))
+    print("RMSSortedMeetingsCursor check - success")
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fname = os.path.join(tmpDir, 'store.npz')
+        store.save(fname)
+        loaded = RoomMeetingStore.load(fname)
+    assert loaded.meetingOnTheSameBridgeIdleTimeoutSec == 60
+    assert [table.values for table in loaded.ids.tables()] == [table.values for table in store.ids.tables()]
+    for name, value in vars(store).items():
+        if isinstance(value, np.ndarray):
+            assert np.array_equal(value, getattr(loaded, name)), f"{name} differs after loading"
+    print("RoomMeetingStore save/load check - success")
+
+
+# compares the arrays of stores. the ids dictionaries are up to the caller
+def assertSameStores(expected: RoomMeetingStore, actual: RoomMeetingStore):
+    for name, value in vars(expected).items():
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            assert np.array_equal(value, getattr(actual, name)), f"{name} differs"
+
+
+def testChunkedLoading():
+    rows = [
+        ['msid1', 'peer1', 'room1', 'rsid1', '2023-10-04 12:54:13,550', '2023-10-04 12:54:10,550', '2023-10-04 12:56:00,000', ''],
+        ['msid2', 'peer2', 'room2', 'rsid1', '2023-10-04 12:55:00,000', '2023-10-04 12:54:00,000', '2023-10-04 12:57:00,000', ''],
+        ['msid3', 'peer3', 'room1', 'rsid2', '', '2023-10-04 12:55:00,000', '2023-10-04 12:57:00,000', ''],
+        ['msid1', 'peer1', 'room1', 'rsid1', '2023-10-04 12:56:35,000', '2023-10-04 12:56:30,000', '2023-10-04 12:58:00,000', ''],
+        ['msid4', 'peer4', 'room3', 'rsid3', '2023-10-04 13:00:01,000', '2023-10-04 13:00:00,000', '2023-10-04 13:01:00,000', ''],
+        ['msid1', 'peer1', 'room1', 'rsid1', '2023-10-04 13:30:01,000', '2023-10-04 13:30:00,000', '2023-10-04 13:31:00,000', ''],
+        ['msid2', 'peer2', 'room2', 'rsid1', '2023-10-04 12:57:30,000', '2023-10-04 12:57:20,000', '', ''],
+    ]
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fname = os.path.join(tmpDir, 'calls.tsv')
+        with open(fname, 'w') as f:
+            f.write('\t'.join(CALLS_COLUMNS) + '\n')
+            for row in rows:
+                f.write('\t'.join(row) + '\n')
+        whole = loadRoomMeetingStore(readCalls(fname), 60)
+        chunked = loadRoomMeetingStoreChunked(fname, 60, chunkRows=2)
+        limited = loadRoomMeetingStoreChunked(fname, 60, nrows=4, chunkRows=3)
+        objectIds = RMSIdDictionary()
+        objects = loadRoomMeetings(readCalls(fname), 60, ids=objectIds)
+
+    assert whole.numRoomMeetings() == 4
+    assertSameStores(whole, chunked)
+    assert whole.ids.rooms.values == chunked.ids.rooms.values == ['room1', 'room2', 'room3']
+    assert whole.ids.peers.values == chunked.ids.peers.values
+    assert [whole.ids.roomId(rm.room_id) for rm in whole.meetings()] == ['room1', 'room1', 'room2', 'room3']
+    assert limited.numConnections() == 3
+    assert [(rm.room_id, rm.ts_start) for rm in objects] == [(rm.room_id, rm.ts_start) for rm in whole.meetings()]
+    assert objectIds.rooms.values == whole.ids.rooms.values
+    print("Chunked loading check - success")
+
+testRoomMeetingStore()
+testChunkedLoading()
+
+
+def testVectorizedSplitting():
+    rnd = random.Random(17)
+    for meetingOnTheSameBridgeIdleTimeout in [0, 30, 60]:
+        conns = []
+        for i in range(0, 400):
+            ts_joined = float(rnd.randrange(0, 4000))
+            # some connections leave before they join, some are exactly on the idle timeout boundary
+            ts_leave = ts_joined + rnd.choice([rnd.randrange(0, 300), -rnd.randrange(0, 200), meetingOnTheSameBridgeIdleTimeout])
+            conns.append(RMSConnection.fromEpochs(rnd.randrange(0, 7), rnd.randrange(0, 5), i, 0, ts_joined, ts_joined + 1, ts_leave))
+
+        sameRoom = defaultdict(list)
+        for conn in conns:
+            registerRMSConnection(sameRoom, conn)
+        expected = splitRoomMeetings(sameRoom, meetingOnTheSameBridgeIdleTimeout)
+
+        ids = RMSIdDictionary(*[IdCodeTable(values) for values in [sameRoom.keys(), range(5), range(400), range(1)]])
+        codes = ids.rooms.codesDict()
+        columns = [np.array([getattr(c, field) for c in conns]) for field in ['peer_id', 'msid', 'rsid', 'ts_joined', 'ts_connected', 'ts_leave']]
+        store = RoomMeetingStore.fromConnections(meetingOnTheSameBridgeIdleTimeout, ids,
+                                                 np.array([codes[c.room_id] for c in conns]), *columns)
+
+        assert store.numRoomMeetings() == len(expected)
+        for rm, stored in zip(expected, store.meetings()):
+            assert (ids.roomId(stored.room_id), stored.ts_start, stored.ts_finish) == (rm.room_id, rm.ts_start, rm.ts_finish)
+            assert [[c.msid for c in pc.rmsConnections] for pc in stored.peerConnections] == \
+                   [[c.msid for c in pc.rmsConnections] for pc in rm.peerConnections]
+
+        parallelStore = RMSConnectionColumns()
+        parallelStore.ids = ids
+        parallelStore.room.extend(codes[c.room_id] for c in conns)
+        for name, column in zip(['peer', 'msid', 'rsid', 'ts_joined', 'ts_connected', 'ts_leave'], columns):
+            getattr(parallelStore, name).extend(column.tolist())
+        assertSameStores(store, parallelStore.buildStore(meetingOnTheSameBridgeIdleTimeout, numWorkers=3))
+
+        parallel = splitRoomMeetings(sameRoom, meetingOnTheSameBridgeIdleTimeout, numWorkers=3)
+        assert [(rm.room_id, rm.ts_start, len(rm.peerConnections)) for rm in parallel] == \
+               [(rm.room_id, rm.ts_start, len(rm.peerConnections)) for rm in expected]
+    print("Vectorized splitting check - success")
+
+testVectorizedSplitting()
+
+
+def testWindowCheckpoint():
+    rnd = random.Random(5)
+    sameRoom = defaultdict(list)
+    for i in range(0, 300):
+        ts_joined = 1696240000.0 + rnd.randrange(0, 20000)
+        registerRMSConnection(sameRoom, RMSConnection.fromEpochs(rnd.randrange(0, 40), rnd.randrange(0, 6), i, 0,
+                                                                 ts_joined, ts_joined + 1, ts_joined + rnd.randrange(10, 3000)))
+    store = RoomMeetingStore.fromRoomMeetings(splitRoomMeetings(sameRoom, 60), 60)
+    shardsConfig = ShardsConfig([2, 2])
+    restartDate = 1696250000.0
+
+    def restarter(meetings: RoomMeetingStore, gracePeriodSec: int, disruptionBudget: int):
+        return RMSRestarter(meetings, [restartDate], disruptionBudget, 20, shardsConfig,
+                            RandomIslandLeastLoadedNewNodePolicy(gracePeriodSec, shardsConfig, random.Random(3)))
+
+    def rolloutResult(restarter: RMSRestarter):
+        return [(r.startTs, r.finishTs, [(d.ts, d.rm.id) for d in r.downtimes]) for r in restarter.rollouts]
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fname = os.path.join(tmpDir, 'store.npz')
+        store.save(fname)
+        loaded = RoomMeetingStore.load(fname)
+        key = checkpointCacheKey(loaded, 'RandomIslandLeastLoadedNewNodePolicy', 3, [restartDate], 20, shardsConfig, False)
+        assert key == checkpointCacheKey(store, 'RandomIslandLeastLoadedNewNodePolicy', 3, [restartDate], 20, shardsConfig, False)
+        assert key != checkpointCacheKey(store, 'RandomIslandLeastLoadedNewNodePolicy', 4, [restartDate], 20, shardsConfig, False)
+
+        # the first run simulates up to the restart date and saves it, the next ones load it
+        loadCachedCheckpoint(fname, key, restarter(loaded, 100, 1))
+        assert os.path.exists(checkpointFileName(fname, key))
+        for gracePeriodSec, disruptionBudget in [(100, 1), (400, 2)]:
+            expected = restarter(store, gracePeriodSec, disruptionBudget)
+            expected.calculateRestarts()
+            windowed = restarter(RoomMeetingStore.load(fname), 100, 1)
+            forked = loadCachedCheckpoint(fname, key, windowed).fork(gracePeriodSec, disruptionBudget)
+            assert forked.meetings is windowed.meetings and forked.sortedMeetings is windowed.sortedMeetings
+            forked.calculateRestarts()
+            assert len(expected.rollouts[0].downtimes) > 0
+            assert rolloutResult(forked) == rolloutResult(expected), (gracePeriodSec, disruptionBudget)
+    print("Window checkpoint check - success")
+
+testWindowCheckpoint()
+
+
+def testIncrementalAppend():
+    rnd = random.Random(23)
+    for withSuspicious in [False, True]:
+        rows = []
+        for i in range(0, 600):
+            ts_joined = float(rnd.randrange(0, 20000))
+            ts_leave = ts_joined + rnd.randrange(0, 400)
+            if withSuspicious and rnd.random() < 0.01:
+                ts_leave = ts_joined - 200
+            rows.append((rnd.randrange(0, 9), rnd.randrange(0, 5), i, 0, ts_joined, ts_joined + 1, ts_leave))
+        # the second day starts at 10000, some connections of it are reported late by the first one
+        cut = [row[4] < 10000 or rnd.random() < 0.05 for row in rows]
+        firstDay = [row for row, first in zip(rows, cut) if first]
+        secondDay = [row for row, first in zip(rows, cut) if not first]
+
+        def columns(part):
+            return [np.array(column) for column in zip(*part)]
+
+        def ids():
+            return RMSIdDictionary(*[IdCodeTable(values) for values in [range(9), range(5), range(600), range(1)]])
+
+        whole = RoomMeetingStore.fromConnections(60, ids(), *columns(firstDay + secondDay))
+        appended = RoomMeetingStore.fromConnections(60, ids(), *columns(firstDay)).appendConnections(*columns(secondDay))
+        assertSameStores(whole, appended)
+
+    callRows = [
+        ['msid1', 'peer1', 'room1', 'rsid1', '2023-10-04 23:59:13,550', '2023-10-04 23:59:10,550', '2023-10-04 23:59:50,000', ''],
+        ['msid2', 'peer2', 'room2', 'rsid1', '2023-10-04 12:55:00,000', '2023-10-04 12:54:00,000', '2023-10-04 12:57:00,000', ''],
+        ['msid3', 'peer3', 'room2', 'rsid2', '2023-10-04 22:00:00,000', '2023-10-04 21:55:00,000', '2023-10-04 22:30:00,000', ''],
+        ['msid1', 'peer1', 'room1', 'rsid1', '2023-10-05 00:00:20,000', '2023-10-05 00:00:10,000', '2023-10-05 00:10:00,000', ''],
+        ['msid4', 'peer4', 'room3', 'rsid3', '2023-10-05 13:00:01,000', '2023-10-05 13:00:00,000', '2023-10-05 13:01:00,000', ''],
+        ['msid2', 'peer2', 'room2', 'rsid1', '2023-10-05 12:57:30,000', '2023-10-05 12:57:20,000', '2023-10-05 12:58:00,000', ''],
+    ]
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fnames = [os.path.join(tmpDir, name) for name in ['week.tsv', 'day1.tsv', 'day2.tsv']]
+        for fname, part in zip(fnames, [callRows, callRows[0:3], callRows[3:]]):
+            with open(fname, 'w') as f:
+                f.write('\t'.join(CALLS_COLUMNS) + '\n')
+                for row in part:
+                    f.write('\t'.join(row) + '\n')
+        whole = loadRoomMeetingStoreChunked(fnames[0], 60)
+        appended = appendCallsToStore(loadRoomMeetingStoreChunked(fnames[1], 60), fnames[2])
+        storeFileName = os.path.join(tmpDir, 'store.npz')
+        saveRoomMeetingStore(appended, storeFileName)
+        appended = appendCallsToStore(RoomMeetingStore.load(storeFileName), fnames[2], nrows=0)
+
+    assertSameStores(whole, appended)
+    assert appended.ids.rooms.values == whole.ids.rooms.values
+    # the meeting in room1 crosses midnight
+    assert [(appended.ids.roomId(rm.room_id), len(rm.peerConnections[0].rmsConnections)) for rm in appended.meetings()][0] == ('room1', 2)
+    print("Incremental append check - success")
+
+testIncrementalAppend()
+
+
+def testCheckpointFork():
+    rnd = random.Random(7)
+    sameRoom = defaultdict(list)
+    for i in range(0, 400):
+        ts_joined = 1696240000.0 + rnd.randrange(0, 20000)
+        registerRMSConnection(sameRoom, RMSConnection.fromEpochs(rnd.randrange(0, 40), rnd.randrange(0, 6), i, 0,
+                                                                 ts_joined, ts_joined + 1, ts_joined + rnd.randrange(10, 3000)))
+    meetings = splitRoomMeetings(sameRoom, 60)
+    store = RoomMeetingStore.fromRoomMeetings(meetings, 60)
+    shardsConfig = ShardsConfig([3, 3])
+    restartDate = 1696250000.0
+
+    def rolloutResult(restarter: RMSRestarter):
+        return [(r.startTs, r.finishTs, [(d.ts, d.rm.id) for d in r.downtimes]) for r in restarter.rollouts], \
+               restarter.assignments.roomMeetingToNode
+
+    for roomMeetings in [meetings, store]:
+        checkpoint = RMSRestarter(roomMeetings, [restartDate], 1, 20, shardsConfig,
+                                  RandomIslandLeastLoadedNewNodePolicy(100, shardsConfig, random.Random(11)),
+                                  keepHistory=True).checkpoint()
+        for gracePeriodSec, disruptionBudget in [(100, 1), (400, 2), (30, 2)]:
+            expected = RMSRestarter(roomMeetings, [restartDate], disruptionBudget, 20, shardsConfig,
+                                    RandomIslandLeastLoadedNewNodePolicy(gracePeriodSec, shardsConfig, random.Random(11)),
+                                    keepHistory=True)
+            expected.calculateRestarts()
+            forked = checkpoint.fork(gracePeriodSec=gracePeriodSec, disruptionBudget=disruptionBudget)
+            forked.calculateRestarts()
+            assert len(expected.rollouts[0].downtimes) > 0
+            assert rolloutResult(forked) == rolloutResult(expected), (gracePeriodSec, disruptionBudget)
+        # forks do not change the checkpoint and share the meetings with it
+        assert checkpoint.restarter.rollouts == [] and checkpoint.restarter.sortedMeetings is forked.sortedMeetings
+    print("Checkpoint fork check - success")
+
+testCheckpointFork()
+
+
+def testReplicationBands():
+    # generators of the policies do not depend on each other or on the global one
+    shardsConfig = ShardsConfig([4, 4])
+    first = RandomNewNodePolicy(60, shardsConfig, random.Random(3))
+    second = RandomNewNodePolicy(60, shardsConfig, random.Random(3))
+    assignments = RoomMeetingAssignments()
+    firstPicks = [first.pickNodeForRoom(0, assignments) for _ in range(0, 20)]
+    random.seed(1)
+    secondPicks = [second.pickNodeForRoom(0, assignments) for _ in range(0, 20)]
+    assert firstPicks == secondPicks
+
+    charts = []
+    for dts in [{60.0: 1.0, 120.0: 3.0}, {120.0: 5.0}, {60.0: 2.0, 180.0: 6.0}]:
+        unorderedData = {}
+        for ts, dt in dts.items():
+            unorderedData[ts] = RMSDowntimeDT()
+            unorderedData[ts].dt = dt
+        chart = RMSDowntimeChart(unorderedData, [])
+        chart.populateRolloutParameters('RandomNewNodePolicy', 'TotalDTCalcModel', 60, 2, '2023-10-02 10:00:00,000')
+        charts.append(chart)
+    bands = RMSDowntimeBands(charts, [1, 2, 3])
+    assert bands.dates == [60.0, 120.0, 180.0]
+    assert bands.dtsMean == [1.0, 8.0 / 3, 2.0]
+    assert bands.dtsP50 == [1.0, 3.0, 0.0]
+    assert bands.totalDTs == [4.0, 5.0, 8.0] and bands.totalDTMean == 17.0 / 3 and bands.totalDTP50 == 5.0
+    assert abs(bands.totalDTStd - np.std([4.0, 5.0, 8.0])) < 1e-12
+    assert bands.totalDTP5 < bands.totalDTP50 < bands.totalDTP95 < 8.0
+    print("Replication bands check - success")
+
+testReplicationBands()
+
+
+def testTracer():
+    rnd = random.Random(29)
+    sameRoom = defaultdict(list)
+    for i in range(0, 200):
+        ts_joined = 1696240000.0 + rnd.randrange(0, 20000)
+        registerRMSConnection(sameRoom, RMSConnection.fromEpochs(rnd.randrange(0, 30), rnd.randrange(0, 6), i, 0,
+                                                                 ts_joined, ts_joined + 1, ts_joined + rnd.randrange(10, 3000)))
+    store = RoomMeetingStore.fromRoomMeetings(splitRoomMeetings(sameRoom, 60), 60)
+    shardsConfig = ShardsConfig([2, 2])
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fname = os.path.join(tmpDir, 'trace.bin')
+        tracer = RMSTracer(fname)
+        restarter = RMSRestarter(store, [1696250000.0], 1, 20, shardsConfig, RoundRobinNewNodePolicy(300, shardsConfig), tracer=tracer,
+                                 fullSimulation=True)
+        rollouts = restarter.calculateRestarts()
+        tracer.close()
+        records = RMSTracer.read(fname)
+
+    assert len(records) == tracer.numRecords
+    assert np.all(np.diff(records['ts']) >= 0)
+    kinds = records['kind']
+    assert np.count_nonzero(kinds == RMSTraceKind.MEETING_ASSIGNED) == store.numRoomMeetings()
+    assert np.count_nonzero(kinds == RMSTraceKind.MEETING_RELEASED) == store.numRoomMeetings()
+    reassigned = records[kinds == RMSTraceKind.MEETING_REASSIGNED]
+    assert len(reassigned) > 0
+    assert [(d.ts, d.rm.id) for d in rollouts[0].downtimes] == list(zip(reassigned['ts'].tolist(), reassigned['meeting'].tolist()))
+    assert np.count_nonzero(kinds == RMSTraceKind.GRACE_STARTED) + np.count_nonzero(kinds == RMSTraceKind.GRACE_SKIPPED) == 4
+    assert np.count_nonzero(kinds == RMSTraceKind.NODE_RETURNED) == 4
+    finished = records[kinds == RMSTraceKind.ROLLOUT_FINISHED]
+    assert finished['ts'].tolist() == [rollouts[0].finishTs] and finished['rollout'].tolist() == [0]
+    assert formatTraceRecord(finished[0]) == f"{formatIsoDate(rollouts[0].finishTs)} ROLLOUT_FINISHED rollout 0"
+    print("RMSTracer check - success")
+
+testTracer()
+
+
+def testTraceReplay():
+    rnd = random.Random(31)
+    sameRoom = defaultdict(list)
+    for i in range(0, 300):
+        ts_joined = 1696240000.0 + rnd.randrange(0, 20000)
+        registerRMSConnection(sameRoom, RMSConnection.fromEpochs(rnd.randrange(0, 30), rnd.randrange(0, 6), i, 0,
+                                                                 ts_joined, ts_joined + 1, ts_joined + rnd.randrange(10, 3000)))
+    store = RoomMeetingStore.fromRoomMeetings(splitRoomMeetings(sameRoom, 60), 60)
+    shardsConfig = ShardsConfig([3, 3])
+    restartDate = 1696250000.0
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        fname = os.path.join(tmpDir, 'trace.bin')
+        tracer = RMSTracer(fname)
+        recorded = RMSRestarter(store, [restartDate], 2, 20, shardsConfig,
+                                RandomIslandLeastLoadedNewNodePolicy(300, shardsConfig, random.Random(3)), tracer=tracer,
+                                keepHistory=True)
+        recorded.calculateRestarts()
+        tracer.close()
+        records = RMSTracer.read(fname)
+
+    replayed = RMSRestarter(store, [restartDate], 2, 20, shardsConfig, ReplayNewNodePolicy(300, shardsConfig, records),
+                            keepHistory=True)
+    replayed.calculateRestarts()
+    assert replayed.newNodePolicy.nextPick == len(replayed.newNodePolicy.pickNodes)
+    assert [(d.ts, d.rm.id) for d in replayed.rollouts[0].downtimes] == [(d.ts, d.rm.id) for d in recorded.rollouts[0].downtimes]
+    assert replayed.rollouts[0].finishTs == recorded.rollouts[0].finishTs
+    assert replayed.assignments.roomMeetingToNode == recorded.assignments.roomMeetingToNode
+
+    # the state read from the trace is the state of a simulation stopped right after ts
+    for ts in [restartDate - 1000, restartDate + 200, recorded.rollouts[0].downtimes[-1].ts]:
+        partial = RMSRestarter(store, [restartDate], 2, 20, shardsConfig, ReplayNewNodePolicy(300, shardsConfig, records))
+        partial.simulateUntil(np.nextafter(ts, np.inf))
+        state = RMSTraceState.at(records, ts)
+        rmCurrentNode = partial.assignments.rmCurrentNode
+        assert state.meetingNodes == {rmId: node for rmId, node in enumerate(rmCurrentNode) if node >= 0}
+        assert state.nodesInMaintenance == partial.assignments.nodesMaintenance
+    assert len(RMSTraceState.at(records, restartDate + 200).nodesInMaintenance) > 0
+    print("Trace replay check - success")
+
+testTraceReplay()
+
+
+def testEarlyTermination():
+    rnd = random.Random(5)
+    sameRoom = defaultdict(list)
+    for i in range(0, 300):
+        ts_joined = 1696240000.0 + rnd.randrange(0, 40000)
+        registerRMSConnection(sameRoom, RMSConnection.fromEpochs(rnd.randrange(0, 30), rnd.randrange(0, 6), i, 0,
+                                                                 ts_joined, ts_joined + 1, ts_joined + rnd.randrange(10, 3000)))
+    store = RoomMeetingStore.fromRoomMeetings(splitRoomMeetings(sameRoom, 60), 60)
+    shardsConfig = ShardsConfig([3, 3])
+    results = []
+    for fullSimulation in [False, True]:
+        restarter = RMSRestarter(store, [1696245000.0, 1696250000.0], 1, 20, shardsConfig,
+                                 RoundRobinNewNodePolicy(100, shardsConfig), fullSimulation=fullSimulation)
+        rollouts = restarter.calculateRestarts()
+        results.append(([(r.startTs, r.finishTs, [(d.ts, d.rm.id) for d in r.downtimes]) for r in rollouts],
+                        restarter.traverser.eventsProcessed))
+    (earlyRollouts, earlyEvents), (fullRollouts, fullEvents) = results
+    # the rollouts are the same, the events after the last one are skipped
+    assert earlyRollouts == fullRollouts and len(earlyRollouts) == 2
+    assert earlyEvents < fullEvents
+    print("Early termination check - success")
+
+testEarlyTermination()
+
+
+def testNodeMeetingsHistory():
+    rnd = random.Random(9)
+    meetings = [RoomMeeting([RMSConnection.fromEpochs(i, 0, 0, 0, 1696240000.0, 1696240001.0, 1696250000.0)], 60, i)
+                for i in range(0, 40)]
+    assignments = RoomMeetingAssignments(len(meetings))
+    # meetings of every node after each ts, kept the way the assignments kept them before the delta log
+    expected = defaultdict(dict)
+    ts = 1696240000.0
+    for _ in range(0, 1000):
+        ts += rnd.choice([0, 0, 1, 5])
+        rm = rnd.choice(meetings)
+        node = rnd.randrange(-1, 3)
+        historyLengths = [len(assignments.nodeHistory[n]) for n in range(0, 3)]
+        if node < 0:
+            assignments.releaseRoomMeeting(rm, ts)
+        else:
+            assignments.assignRoomMeeting(rm, node, ts)
+        for changedNode in range(0, 3):
+            if len(assignments.nodeHistory[changedNode]) != historyLengths[changedNode]:
+                expected[changedNode][ts] = [x.id for x in assignments.getNodeMeetings(changedNode, ts)]
+    for node in range(0, 3):
+        assert len(assignments.nodeHistory[node].snapshots) > 1
+        states = expected[node]
+        assert assignments.nodeHistory[node].states() == states
+        stateTs = list(states)
+        for i, stateStart in enumerate(stateTs):
+            queryTs = [stateStart, (stateStart + stateTs[i + 1]) / 2] if i + 1 < len(stateTs) else [stateStart, ts + 10]
+            for t in queryTs:
+                assert [rm.id for rm in assignments.getNodeMeetingsAt(node, t)] == states[stateStart]
+        assert assignments.getNodeMeetingsAt(node, stateTs[0] - 1) == []
+        assert assignments.getNodeMeetingsAt(node, ts) == list(assignments.getNodeMeetings(node, ts))
+    # copies do not share the history
+    copied = copy.deepcopy(assignments)
+    copied.assignRoomMeeting(meetings[0], 3, ts + 1)
+    assert 3 not in assignments.nodeHistory and len(copied.nodeHistory[3]) == 1
+    print("Node meetings history check - success")
+
+testNodeMeetingsHistory()
+
+
+def testLiveAssignments():
+    rnd = random.Random(13)
+    sameRoom = defaultdict(list)
+    for i in range(0, 300):
+        ts_joined = 1696240000.0 + rnd.randrange(0, 20000)
+        registerRMSConnection(sameRoom, RMSConnection.fromEpochs(rnd.randrange(0, 30), rnd.randrange(0, 6), i, 0,
+                                                                 ts_joined, ts_joined + 1, ts_joined + rnd.randrange(10, 3000)))
+    store = RoomMeetingStore.fromRoomMeetings(splitRoomMeetings(sameRoom, 60), 60)
+    shardsConfig = ShardsConfig([3, 3])
+    restarters = []
+    for keepHistory in [False, True]:
+        restarter = RMSRestarter(store, [1696250000.0], 2, 20, shardsConfig,
+                                 RandomIslandLeastLoadedNewNodePolicy(200, shardsConfig, random.Random(17)), keepHistory=keepHistory)
+        restarter.calculateRestarts()
+        restarters.append(restarter)
+    live, historic = restarters
+    assert type(live.assignments) is LiveRoomMeetingAssignments and not hasattr(live.assignments, 'nodeHistory')
+    # live assignments keep only the meetings that are on the nodes
+    assert not hasattr(live.assignments, 'roomMeetingDict')
+    assert [(d.ts, d.rm.id) for d in live.rollouts[0].downtimes] == [(d.ts, d.rm.id) for d in historic.rollouts[0].downtimes]
+    assert live.assignments.rmCurrentNode == historic.assignments.rmCurrentNode
+    assert {node: list(rms) for node, rms in live.assignments.nodeMeetings.items()} == \
+           {node: list(rms) for node, rms in historic.assignments.nodeMeetings.items()}
+
+    # meetings of a node keep the order of assignment, releasing a meeting that is not on the node changes nothing
+    assignments = LiveRoomMeetingAssignments()
+    meetings = [RoomMeeting([RMSConnection.fromEpochs(i, 0, 0, 0, 1696240000.0, 1696240001.0, 1696250000.0)], 60, i)
+                for i in range(0, 3)]
+    for rm in meetings:
+        assignments.assignRoomMeeting(rm, 0, 1696240000.0)
+    assignments.releaseRoomMeeting(meetings[1], 1696240010.0)
+    assignments.releaseRoomMeeting(meetings[1], 1696240020.0)
+    assignments.assignRoomMeeting(meetings[1], 0, 1696240030.0)
+    assert [rm.id for rm in assignments.getNodeMeetings(0, 1696240030.0)] == [0, 2, 1]
+    assert assignments.nodeHasMeetings(0, 1696240030.0) and not assignments.nodeHasMeetings(1, 1696240030.0)
+    print("Live assignments check - success")
+
+testLiveAssignments()
+
+
+def testIntervalIndex():
+    rnd = random.Random(19)
+    sameRoom = defaultdict(list)
+    for i in range(0, 500):
+        ts_joined = 1696240000.0 + rnd.randrange(0, 20000) + rnd.random()
+        registerRMSConnection(sameRoom, RMSConnection.fromEpochs(rnd.randrange(0, 40), rnd.randrange(0, 6), i, 0,
+                                                                 ts_joined, ts_joined + 1, ts_joined + rnd.randrange(0, 3000)))
+    meetings = splitRoomMeetings(sameRoom, 60)
+    peerConnections = [pc for rm in meetings for pc in rm.peerConnections]
+    queryTs = [pc.ts_joined for pc in peerConnections] + [pc.ts_leave for pc in peerConnections] + \
+              [1696240000.0 + rnd.random() * 25000 for _ in range(0, 500)]
+    for roomMeetings in [meetings, RoomMeetingStore.fromRoomMeetings(meetings, 60)]:
+        sortedMeetings = RMSSortedMeetings(roomMeetings)
+        pcIndex = sortedMeetings.peerConnectionIntervals()
+        rmIndex = sortedMeetings.meetingIntervals()
+        for ts in queryTs:
+            assert pcIndex.count(ts) == sum(1 for pc in peerConnections if pc.ts_joined <= ts <= pc.ts_leave)
+            assert rmIndex.count(ts) == sum(1 for rm in meetings if rm.ts_start <= ts <= rm.ts_finish)
+        assert pcIndex.count(np.array(queryTs)).tolist() == [pcIndex.count(ts) for ts in queryTs]
+
+        # buckets of the dt models, as they were filled before the index
+        model = createDTCalcModel('TotalDTCalcModel', LiveRoomMeetingAssignments(), [], sortedMeetings, 60, 15)
+        pcBuckets = defaultdict(int)
+        for pc in peerConnections:
+            bucket = model.floorTime(pc.ts_joined, 60)
+            while bucket < model.floorTime(pc.ts_leave, 60):
+                pcBuckets[bucket] += 1
+                bucket += 60
+        firstBucket = model.floorTime(1696240000.0, 60)
+        for bucket in np.arange(firstBucket - 120, firstBucket + 25000, 60).tolist():
+            assert model.pcBucketIndex.count(bucket) == pcBuckets[bucket], bucket
+    print("Interval index check - success")
+
+testIntervalIndex()
+
+
+def testAssignmentHistory():
+    rnd = random.Random(23)
+    sameRoom = defaultdict(list)
+    for i in range(0, 400):
+        ts_joined = 1696240000.0 + rnd.randrange(0, 20000)
+        registerRMSConnection(sameRoom, RMSConnection.fromEpochs(rnd.randrange(0, 40), rnd.randrange(0, 6), i, 0,
+                                                                 ts_joined, ts_joined + 1, ts_joined + rnd.randrange(10, 3000)))
+    store = RoomMeetingStore.fromRoomMeetings(splitRoomMeetings(sameRoom, 60), 60)
+    shardsConfig = ShardsConfig([3, 3])
+    restartDate = 1696250000.0
+
+    def createRestarter(fullSimulation: bool):
+        return RMSRestarter(store, [restartDate], 2, 20, shardsConfig,
+                            RandomIslandLeastLoadedNewNodePolicy(300, shardsConfig, random.Random(29)),
+                            fullSimulation=fullSimulation, keepHistory=True)
+
+    restarter = createRestarter(True)
+    restarter.calculateRestarts()
+    history = RMSAssignmentHistory.ofRestarter(restarter)
+    downtimes = restarter.rollouts[0].downtimes
+    queryTs = [restartDate - 1000, restartDate, downtimes[0].ts, downtimes[len(downtimes) // 2].ts,
+               downtimes[-1].ts + 0.5, restarter.rollouts[0].finishTs + 3000]
+    for ts in queryTs:
+        # the same restarter simulated up to the events at ts
+        partial = createRestarter(True)
+        partial.simulateUntil(math.nextafter(ts, math.inf))
+        assignments = partial.assignments
+        for rmId in range(0, store.numRoomMeetings()):
+            assert history.meetingNodeAt(rmId, ts) == assignments.rmCurrentNode[rmId], (rmId, ts)
+        load = history.loadAt(ts, shardsConfig.numNodesGlobal())
+        for node in range(0, shardsConfig.numNodesGlobal()):
+            meetings = list(assignments.getNodeMeetings(node, ts)) if node in assignments.nodeMeetings else []
+            assert [rm.id for rm in history.nodeMeetingsAt(node, ts)] == [rm.id for rm in meetings]
+            assert history.nodeMeetingsCountAt(node, ts) == len(meetings)
+            activePeers = sum(1 for rm in meetings for pc in rm.peerConnections if pc.ts_joined <= ts <= pc.ts_leave)
+            assert history.nodePeerConnectionsAt(node, ts) == activePeers == load[node], (node, ts)
+
+    # the history of a simulation that stopped after the rollout ends there
+    stopped = createRestarter(False)
+    stopped.calculateRestarts()
+    assert stopped.simulatedUntilTs == stopped.rollouts[0].finishTs
+    stoppedHistory = RMSAssignmentHistory.ofRestarter(stopped)
+    assert stoppedHistory.loadAt(queryTs[3], 6).tolist() == history.loadAt(queryTs[3], 6).tolist()
+    try:
+        stoppedHistory.loadAt(queryTs[-1])
+        assert False, "the history after the stop is not known"
+    except AssertionError as e:
+        assert "not simulated" in str(e)
+    print("Assignment history check - success")
+
+testAssignmentHistory()
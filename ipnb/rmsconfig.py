@@ -0,0 +1,30 @@
+import logging
+import sys
+
+from RoomMeetingAssignments import *
+
+# dataset and cluster parameters shared by calc_downtime.py, sweep.py and append_calls.py
+
+# MAX_NUM_ROWS_FOR_DRYRUN = 50000
+MAX_NUM_ROWS_FOR_DRYRUN = 5000000000000
+CALLS_FILE = 'calls_data_week.tsv'
+shardsConfig = ShardsConfig([10]*3)
+
+MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT = 60
+ROLLOUT_DT_DURATION = 15
+PEER_IDLE_TIMEOUT_SEC = 60
+NODE_RESTARTS_IN_SEC = 120
+
+
+# sends the logs of a script to stdout. logProcess adds the pid to tell the workers of a pool apart
+def setupRootLogger(logProcess: bool = False) -> logging.Logger:
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setLevel(logging.DEBUG)
+    processFormat = ' - %(process)d' if logProcess else ''
+    formatter = logging.Formatter(f'%(asctime)s{processFormat} - %(name)s - %(levelname)s - %(message)s')
+    handler.setFormatter(formatter)
+    root.addHandler(handler)
+    return root
@@ -1,54 +1,274 @@
+import hashlib
 import logging
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
 
 from RoomMeeting import *
+from RoomMeetingStore import *
 
 _logger = logging.getLogger("rmsops")
-def splitRoomMeetings(sameRoomRMSConnectionsLocal, meetingOnTheSameBridgeIdleTimeoutSec) -> list[RoomMeeting]:
+
+CALLS_COLUMNS = ['msid', 'peer_id', 'room_id', 'rsid', 'ts_connected', 'ts_joined', 'ts_leave', 'ts_offer']
+# bump when the way meetings are built changes, so that stale caches are not picked up
+DATASET_CACHE_VERSION = 1
+CALLS_CHUNK_ROWS = 1000000
+
+
+# timestamps of the whole calls frame parsed at once. missing* masks mark rows with NaN in the corresponding column
+@dataclass
+class RMSConnectionTimestamps:
+    ts_joined: np.ndarray
+    ts_connected: np.ndarray
+    ts_leave: np.ndarray
+    missingJoined: np.ndarray
+    missingConnected: np.ndarray
+    missingLeave: np.ndarray
+
+    # RMSConnection checks connected first, then joined, then leave. error masks follow the same precedence
+    def errorsConnected(self) -> np.ndarray:
+        return self.missingConnected
+
+    def errorsJoined(self) -> np.ndarray:
+        return self.missingJoined & ~self.missingConnected
+
+    def errorsLeave(self) -> np.ndarray:
+        return self.missingLeave & ~self.missingJoined & ~self.missingConnected
+
+    def valid(self) -> np.ndarray:
+        return ~(self.missingJoined | self.missingConnected | self.missingLeave)
+
+
+def parseRMSConnectionTimestamps(calls) -> RMSConnectionTimestamps:
+    return RMSConnectionTimestamps(
+        ts_joined=parseIsoDates(calls['ts_joined']),
+        ts_connected=parseIsoDates(calls['ts_connected']),
+        ts_leave=parseIsoDates(calls['ts_leave']),
+        missingJoined=calls['ts_joined'].isna().to_numpy(),
+        missingConnected=calls['ts_connected'].isna().to_numpy(),
+        missingLeave=calls['ts_leave'].isna().to_numpy()
+    )
+
+
+# contiguous [begin, end) ranges of items with roughly the same total weight
+def shardRanges(weights: np.ndarray, numShards: int) -> list[tuple[int, int]]:
+    bounds = np.searchsorted(np.cumsum(weights), np.linspace(0, weights.sum(), numShards + 1)[1:-1], side='right')
+    bounds = np.unique(np.concatenate([[0], bounds, [len(weights)]]))
+    return [(int(bounds[i]), int(bounds[i + 1])) for i in range(len(bounds) - 1)]
+
+
+def _splitRoomMeetingsShard(args) -> list[RoomMeeting]:
+    roomsShard, meetingOnTheSameBridgeIdleTimeoutSec = args
+    return splitRoomMeetings(dict(roomsShard), meetingOnTheSameBridgeIdleTimeoutSec)
+
+
+# rooms are independent, so with numWorkers > 1 they are split by a process pool.
+# shards are contiguous runs of rooms and are merged back in order, so the result does not depend on numWorkers
+def splitRoomMeetings(sameRoomRMSConnectionsLocal, meetingOnTheSameBridgeIdleTimeoutSec, numWorkers: int = 1) -> list[RoomMeeting]:
     resultRoomMeetings = []
 
+    if numWorkers > 1 and len(sameRoomRMSConnectionsLocal) > 0:
+        rooms = list(sameRoomRMSConnectionsLocal.items())
+        ranges = shardRanges(np.array([len(conns) for _, conns in rooms]), numWorkers)
+        with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+            shards = [(rooms[begin:end], meetingOnTheSameBridgeIdleTimeoutSec) for begin, end in ranges]
+            for shardMeetings in executor.map(_splitRoomMeetingsShard, shards):
+                resultRoomMeetings.extend(shardMeetings)
+        # every shard numbers its meetings from 0
+        for id, rm in enumerate(resultRoomMeetings):
+            rm.renumber(id)
+        return resultRoomMeetings
+
     for room_id, rmscInOneRoom in sameRoomRMSConnectionsLocal.items():
         resultBuckets = splitRMSCByOverlaps(rmscInOneRoom, meetingOnTheSameBridgeIdleTimeoutSec)
         for bucket in resultBuckets:
-            resultRoomMeetings.append(RoomMeeting(bucket, meetingOnTheSameBridgeIdleTimeoutSec))
+            resultRoomMeetings.append(RoomMeeting(bucket, meetingOnTheSameBridgeIdleTimeoutSec, len(resultRoomMeetings)))
 
     return resultRoomMeetings
 
 
-def registerRMSConnection(sameRoomRMSConnections: dict[str, list[RMSConnection]], rmsc: RMSConnection):
+def registerRMSConnection(sameRoomRMSConnections: dict[int, list[RMSConnection]], rmsc: RMSConnection):
     sameRoomRMSConnections[rmsc.room_id].append(rmsc)
 
 
-def loadRoomMeetings(calls, meetingOnTheSameBridgeIdleTimeoutSec):
-    rmsConnections: list[RMSConnection] = [None] * calls.shape[0]
-    sameRoomRMSConnections: dict[str, list[RMSConnection]] = defaultdict(list)
-    errorsConnected = []
-    errorsJoined = []
-    errorsLeave = []
-    for index in range(0, calls.shape[0]):
-        try:
-            rmsc = RMSConnection(
-                calls['room_id'][index],
-                calls['peer_id'][index],
-                calls['msid'][index],
-                calls['rsid'][index],
-                calls['ts_joined'][index],
-                calls['ts_connected'][index],
-                calls['ts_leave'][index]
-            )
-            rmsConnections[index] = rmsc
-            sameRoomRMSConnections[rmsc.room_id].append(rmsc)
-        except RMSConnectionCreationException as e:
-            match e.reason:
-                case "joined":
-                    errorsJoined.append(index)
-                case "connected":
-                    errorsConnected.append(index)
-                case "leave":
-                    errorsLeave.append(index)
-                case _:
-                    raise f"unknown reason {e.reason}"
-
-    roomMeetings = splitRoomMeetings(sameRoomRMSConnections, meetingOnTheSameBridgeIdleTimeoutSec)
+# valid rms connections collected chunk by chunk into compact columns. ids are kept as codes of the ids dictionary
+class RMSConnectionColumns(ABC):
+    ids: RMSIdDictionary
+    numRows: int
+    numErrorsJoined: int
+    numErrorsConnected: int
+    numErrorsLeave: int
+
+    # pass the ids of an existing store to append connections to it
+    def __init__(self, ids: RMSIdDictionary = None):
+        self.ids = RMSIdDictionary() if ids is None else ids
+        self.room = array('i')
+        self.peer = array('i')
+        self.msid = array('i')
+        self.rsid = array('i')
+        self.ts_joined = array('d')
+        self.ts_connected = array('d')
+        self.ts_leave = array('d')
+        self.numRows = 0
+        self.numErrorsJoined = 0
+        self.numErrorsConnected = 0
+        self.numErrorsLeave = 0
+
+    def append(self, calls):
+        timestamps = parseRMSConnectionTimestamps(calls)
+        valid = timestamps.valid()
+        rooms, peers, msids, rsids = self.ids.encodeCalls(calls, valid)
+
+        self.room.frombytes(rooms.tobytes())
+        self.peer.frombytes(peers.tobytes())
+        self.msid.frombytes(msids.tobytes())
+        self.rsid.frombytes(rsids.tobytes())
+        self.ts_joined.frombytes(timestamps.ts_joined[valid].tobytes())
+        self.ts_connected.frombytes(timestamps.ts_connected[valid].tobytes())
+        self.ts_leave.frombytes(timestamps.ts_leave[valid].tobytes())
+
+        self.numRows += calls.shape[0]
+        self.numErrorsJoined += int(timestamps.errorsJoined().sum())
+        self.numErrorsConnected += int(timestamps.errorsConnected().sum())
+        self.numErrorsLeave += int(timestamps.errorsLeave().sum())
+
+    def numConnections(self) -> int:
+        return len(self.ts_joined)
+
+    def columns(self) -> list[np.ndarray]:
+        return [np.frombuffer(self.room, dtype=np.int32), np.frombuffer(self.peer, dtype=np.int32),
+                np.frombuffer(self.msid, dtype=np.int32), np.frombuffer(self.rsid, dtype=np.int32),
+                np.frombuffer(self.ts_joined, dtype=np.float64), np.frombuffer(self.ts_connected, dtype=np.float64),
+                np.frombuffer(self.ts_leave, dtype=np.float64)]
+
+    # with numWorkers > 1 ranges of rooms are split by a process pool and concatenated in the order of room codes
+    def buildStore(self, meetingOnTheSameBridgeIdleTimeoutSec, numWorkers: int = 1) -> RoomMeetingStore:
+        columns = self.columns()
+        if numWorkers > 1 and self.numConnections() > 0:
+            room = columns[0]
+            ranges = shardRanges(np.bincount(room, minlength=len(self.ids.rooms)), numWorkers)
+            shards = [(meetingOnTheSameBridgeIdleTimeoutSec, [column[(room >= begin) & (room < end)] for column in columns])
+                      for begin, end in ranges]
+            with ProcessPoolExecutor(max_workers=numWorkers) as executor:
+                stores = list(executor.map(_buildStoreShard, shards))
+            store = RoomMeetingStore.concatenate(stores, meetingOnTheSameBridgeIdleTimeoutSec, self.ids)
+        else:
+            store = RoomMeetingStore.fromConnections(meetingOnTheSameBridgeIdleTimeoutSec, self.ids, *columns)
+        _logger.info(f"Loaded {self.numRows} rms. "
+                     f"Total errors joined: {self.numErrorsJoined}, connected: {self.numErrorsConnected}, leave: {self.numErrorsLeave}")
+        _logger.info(f"Stored {store.numRoomMeetings()} room meetings, {store.numPeerConnections()} peer connections "
+                     f"and {store.numConnections()} rms in {store.nbytes()} bytes")
+        return store
+
+
+# the ids dictionary is not needed to split, it is attached to the concatenated store
+def _buildStoreShard(args) -> RoomMeetingStore:
+    meetingOnTheSameBridgeIdleTimeoutSec, columns = args
+    return RoomMeetingStore.fromConnections(meetingOnTheSameBridgeIdleTimeoutSec, RMSIdDictionary(), *columns)
+
+
+def readRMSConnectionColumns(fname: str, nrows: int | None = None, chunkRows: int = CALLS_CHUNK_ROWS,
+                             ids: RMSIdDictionary = None) -> RMSConnectionColumns:
+    columns = RMSConnectionColumns(ids)
+    for chunk in readCalls(fname, nrows, chunkRows):
+        columns.append(chunk)
+        _logger.info(f"Read {columns.numRows} rows of {fname}")
+    return columns
+
+
+def loadRoomMeetingStore(calls, meetingOnTheSameBridgeIdleTimeoutSec, numWorkers: int = 1) -> RoomMeetingStore:
+    columns = RMSConnectionColumns()
+    columns.append(calls)
+    return columns.buildStore(meetingOnTheSameBridgeIdleTimeoutSec, numWorkers)
+
+
+# reads the calls file chunk by chunk. peak memory is one chunk plus the compact columns of valid connections
+def loadRoomMeetingStoreChunked(fname: str, meetingOnTheSameBridgeIdleTimeoutSec: int, nrows: int | None = None,
+                                chunkRows: int = CALLS_CHUNK_ROWS, numWorkers: int = 1) -> RoomMeetingStore:
+    columns = readRMSConnectionColumns(fname, nrows, chunkRows)
+    return columns.buildStore(meetingOnTheSameBridgeIdleTimeoutSec, numWorkers)
+
+
+# adds the calls of another file, e.g. of the next day, to a store. ids of the store are extended with the new ones.
+# the result is the same as if both files were loaded at once, but only rooms of the new file are split again
+def appendCallsToStore(store: RoomMeetingStore, fname: str, nrows: int | None = None,
+                       chunkRows: int = CALLS_CHUNK_ROWS) -> RoomMeetingStore:
+    columns = readRMSConnectionColumns(fname, nrows, chunkRows, store.ids)
+    result = store.appendConnections(*columns.columns())
+    _logger.info(f"Appended {columns.numConnections()} rms of {fname}. "
+                 f"Total errors joined: {columns.numErrorsJoined}, connected: {columns.numErrorsConnected}, leave: {columns.numErrorsLeave}")
+    _logger.info(f"Stored {result.numRoomMeetings()} room meetings, {result.numPeerConnections()} peer connections "
+                 f"and {result.numConnections()} rms in {result.nbytes()} bytes")
+    return result
+
+
+# parallel runs may write the same file. write to a private file and publish it atomically
+def saveRoomMeetingStore(store: RoomMeetingStore, fname: str):
+    tmpFileName = f"{fname}.{os.getpid()}.tmp"
+    store.save(tmpFileName)
+    os.replace(tmpFileName, fname)
+
+
+# room meetings carry codes of ids. pass a dictionary to decode them later or to share it between loads
+def loadRoomMeetings(calls, meetingOnTheSameBridgeIdleTimeoutSec, numWorkers: int = 1, ids: RMSIdDictionary = None):
+    sameRoomRMSConnections: dict[int, list[RMSConnection]] = defaultdict(list)
+    timestamps = parseRMSConnectionTimestamps(calls)
+    valid = timestamps.valid()
+    if ids is None:
+        ids = RMSIdDictionary()
+
+    rows = zip(
+        *[codes.tolist() for codes in ids.encodeCalls(calls, valid)],
+        timestamps.ts_joined[valid].tolist(),
+        timestamps.ts_connected[valid].tolist(),
+        timestamps.ts_leave[valid].tolist()
+    )
+    for room_id, peer_id, msid, rsid, ts_joined, ts_connected, ts_leave in rows:
+        registerRMSConnection(
+            sameRoomRMSConnections,
+            RMSConnection.fromEpochs(room_id, peer_id, msid, rsid, ts_joined, ts_connected, ts_leave)
+        )
+
+    roomMeetings = splitRoomMeetings(sameRoomRMSConnections, meetingOnTheSameBridgeIdleTimeoutSec, numWorkers)
     _logger.info(f"Loaded {calls.shape[0]} rms into {len(roomMeetings)} room meetings. "
-          f"Total errors joined: {len(errorsJoined)}, connected: {len(errorsConnected)}, leave: {len(errorsLeave)}")
+          f"Total errors joined: {timestamps.errorsJoined().sum()}, connected: {timestamps.errorsConnected().sum()}, "
+          f"leave: {timestamps.errorsLeave().sum()}")
     return roomMeetings
+
+
+# returns a DataFrame, or an iterator of DataFrames when chunkRows is given
+def readCalls(fname: str, nrows: int | None = None, chunkRows: int | None = None):
+    return pd.read_csv(fname, header=0, names=CALLS_COLUMNS, delimiter='\t', nrows=nrows, chunksize=chunkRows)
+
+
+def datasetCacheKey(fname: str, meetingOnTheSameBridgeIdleTimeoutSec: int, nrows: int | None = None) -> str:
+    digest = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        while chunk := f.read(1 << 23):
+            digest.update(chunk)
+    digest.update(f"|idle:{meetingOnTheSameBridgeIdleTimeoutSec}|nrows:{nrows}|v:{DATASET_CACHE_VERSION}".encode())
+    return digest.hexdigest()
+
+
+def datasetCacheFileName(fname: str, cacheKey: str) -> str:
+    return f"{fname}.{cacheKey[0:16]}.rmstore.npz"
+
+
+# loads room meetings of the calls file from the binary cache next to it, building the cache on a miss
+def loadCachedRoomMeetingStore(fname: str, meetingOnTheSameBridgeIdleTimeoutSec: int, nrows: int | None = None,
+                               numWorkers: int = 1) -> RoomMeetingStore:
+    cacheFileName = datasetCacheFileName(fname, datasetCacheKey(fname, meetingOnTheSameBridgeIdleTimeoutSec, nrows))
+    if os.path.exists(cacheFileName):
+        _logger.info(f"Loading room meetings from cache {cacheFileName}")
+        return RoomMeetingStore.load(cacheFileName)
+
+    _logger.info(f"No cache {cacheFileName} found. Parsing {fname}")
+    store = loadRoomMeetingStoreChunked(fname, meetingOnTheSameBridgeIdleTimeoutSec, nrows, numWorkers=numWorkers)
+
+    saveRoomMeetingStore(store, cacheFileName)
+    _logger.info(f"Saved room meetings to cache {cacheFileName}")
+    return store
@@ -1,8 +1,13 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
 
 ISO_DATE_MASK = '%Y-%m-%d %H:%M:%S,%f'
 ISO_DATE_MASK_NO_MS = '%Y-%m-%d %H:%M:%S'
 
+_EPOCH_NAIVE = datetime(1970, 1, 1)
+
 
 def parseIsoDate(dateStr: str):
     if len(dateStr) == 19:
@@ -10,8 +15,45 @@ def parseIsoDate(dateStr: str):
     return datetime.strptime(dateStr, ISO_DATE_MASK).timestamp()
 
 
+# vectorized parseIsoDate over a whole column. missing values become NaN.
+# result is bit for bit equal to datetime.strptime(...).timestamp(), i.e. dates are interpreted in local time
+def parseIsoDates(dateStrs: pd.Series) -> np.ndarray:
+    missing = dateStrs.isna().to_numpy()
+    result = np.full(len(dateStrs), np.nan, dtype=np.float64)
+    present = dateStrs[~missing].astype(str)
+    if len(present) == 0:
+        return result
+
+    parsed = pd.to_datetime(present.str.replace(',', '.', regex=False), format='ISO8601', errors='coerce')
+    unparsed = parsed.isna().to_numpy()
+    if unparsed.any():
+        raise ValueError(f"failed to parse dates {present[unparsed].head(5).tolist()}")
+
+    # wall clock time as if it was UTC, split into whole seconds and microseconds like datetime.timestamp() does
+    wallNs = parsed.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    wallSec = wallNs // 1_000_000_000
+    wallMicro = (wallNs % 1_000_000_000) // 1000
+
+    # local time offset only changes on hour boundaries, so it is enough to resolve it once per distinct hour
+    wallHours = wallSec // 3600
+    uniqueHours, hourIndex = np.unique(wallHours, return_inverse=True)
+    offsets = np.array(
+        [int((_EPOCH_NAIVE + timedelta(hours=int(h))).timestamp()) - int(h) * 3600 for h in uniqueHours],
+        dtype=np.int64
+    )
+
+    result[~missing] = (wallSec + offsets[hourIndex]).astype(np.float64) + wallMicro / 1e6
+    return result
+
+
+# lists indexed by dense ids (e.g. room meeting ids) are grown on demand. grows geometrically to keep it amortized O(1)
+def ensureListIndex(values: list, index: int, filler):
+    if index >= len(values):
+        values.extend([filler] * max(index + 1 - len(values), len(values)))
+
+
 def formatIsoDate(ts: datetime | float):
     toFormat = ts
-    if type(ts) == float:
+    if isinstance(ts, float):
         toFormat = datetime.fromtimestamp(ts)
     return toFormat.strftime(ISO_DATE_MASK)
@@ -0,0 +1,165 @@
+import argparse
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+from dt_calc_models import *
+import pandas as pd
+
+from rmsops import *
+from rmsconfig import *
+
+root = setupRootLogger(logProcess=True)
+
+
+# runs every combination of the parameters in one process. the meetings are loaded once and shared with the workers
+# of the pool: they are forked after the meetings and their indexes are built, so the memory is copied on write only
+@dataclass
+class SweepGroup:
+    policyStr: str
+    restartDateStr: str
+    seed: int
+
+
+@dataclass
+class SweepGrid:
+    dtModels: list[str]
+    gracePeriods: list[int]
+    disruptionBudgets: list[int]
+    charts: bool
+    seedInChartNames: bool
+
+
+# set before the pool is started, so the workers inherit them
+_sweepMeetings: RoomMeetingStore | None = None
+_sweepSortedMeetings: RMSSortedMeetings | None = None
+_sweepGrid: SweepGrid | None = None
+
+
+# all the grace periods and disruption budgets of a group are forked from the same checkpoint at the restart date.
+# returns a row of the results table and the chart of every combination
+def runSweepGroup(group: SweepGroup) -> list[tuple[dict, RMSDowntimeChart]]:
+    grid = _sweepGrid
+    restartDate = parseIsoDate(group.restartDateStr)
+    policy = createNewNodePolicy(group.policyStr, grid.gracePeriods[0], shardsConfig, random.Random(group.seed))
+    fullSimulation = any(dtCalcModelClass(dtModelStr).requiresFullSimulation for dtModelStr in grid.dtModels)
+    checkpoint = RMSRestarter(_sweepMeetings, [restartDate], grid.disruptionBudgets[0], NODE_RESTARTS_IN_SEC, shardsConfig,
+                              policy, sortedMeetings=_sweepSortedMeetings, fullSimulation=fullSimulation).checkpoint()
+    rows = []
+    for gracePeriodSec, disruptionBudget in product(grid.gracePeriods, grid.disruptionBudgets):
+        restarter = checkpoint.fork(gracePeriodSec=gracePeriodSec, disruptionBudget=disruptionBudget)
+        restartResult = restarter.calculateRestarts()
+        for dtModelStr in grid.dtModels:
+            dtmodel = createDTCalcModel(dtModelStr, restarter.assignments, restartResult, restarter.sortedMeetings,
+                                        PEER_IDLE_TIMEOUT_SEC, ROLLOUT_DT_DURATION)
+            chart = dtmodel.totalDowntime()
+            chart.populateRolloutParameters(
+                policyStr=group.policyStr,
+                dtModelStr=dtModelStr,
+                gracePeriodSec=gracePeriodSec,
+                disruptionBudget=disruptionBudget,
+                restartDateStr=group.restartDateStr
+            )
+            if grid.charts:
+                fname = None
+                if grid.seedInChartNames:
+                    fname = f"result_{group.policyStr}.dtmodel_{dtModelStr}.grace_{gracePeriodSec}.disr_{disruptionBudget}" \
+                            f".at_{group.restartDateStr[0:19].replace(' ', 'T')}.seed_{group.seed}.json"
+                chart.serialize(fname)
+            rows.append(({
+                'policy': group.policyStr,
+                'dtModel': dtModelStr,
+                'gracePeriodSec': gracePeriodSec,
+                'disruptionBudget': disruptionBudget,
+                'restartDate': group.restartDateStr,
+                'seed': group.seed,
+                'totalDT': chart.totalDT,
+                'rmInterrupted': sum(chart.rmInterrupted),
+                'pcInterrupted': sum(chart.pcInterrupted),
+                'rolloutStart': formatIsoDate(restartResult[0].startTs),
+                'rolloutFinish': formatIsoDate(restartResult[0].finishTs),
+            }, chart))
+        root.info(f"Finished {group.policyStr} at {group.restartDateStr} with seed {group.seed}, "
+                  f"grace {gracePeriodSec}, budget {disruptionBudget}")
+    return rows
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("-r", "--restart-dates", nargs="+", required=True)
+parser.add_argument("-p", "--policies", nargs="+", default=['RandomIslandLeastLoadedNewNodePolicy'])
+parser.add_argument("--dt-calc-models", nargs="+", default=['IntegratingDTClacModel'])
+parser.add_argument("-d", "--disruption-budgets", type=int, nargs="+", required=True)
+parser.add_argument("-g", "--grace-periods-sec", type=int, nargs="+", required=True)
+parser.add_argument("--seeds", type=int, nargs="+", help="random seeds. one random seed by default")
+parser.add_argument("--replications", type=int, default=1, help="number of random seeds to run when --seeds is not set")
+parser.add_argument("--store", help="read room meetings from a store built by append_calls.py instead of the calls file")
+parser.add_argument("--no-cache", action="store_true", help="always parse the calls file, do not use or write the meetings cache")
+parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of processes running the simulations")
+parser.add_argument("--charts", action="store_true", help="also write the result_*.json chart of every combination")
+parser.add_argument("-o", "--output", default="sweep_results.tsv", help="table with the results of all combinations")
+parser.add_argument("--summary-output", default="sweep_summary.tsv",
+                    help="table with the spread of totalDT over the seeds. written when there is more than one seed")
+args = parser.parse_args()
+
+seeds = args.seeds
+if seeds is None:
+    seeds = [random.randrange(0, 10000000) for _ in range(0, args.replications)]
+root.info(f"Using random seeds {seeds}")
+
+if args.store is not None:
+    _sweepMeetings = RoomMeetingStore.load(args.store)
+elif args.no_cache:
+    _sweepMeetings = loadRoomMeetingStoreChunked(CALLS_FILE, MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT, MAX_NUM_ROWS_FOR_DRYRUN)
+else:
+    _sweepMeetings = loadCachedRoomMeetingStore(CALLS_FILE, MEETING_ON_SAME_BRIDGE_IDLE_TIMEOUT, MAX_NUM_ROWS_FOR_DRYRUN)
+_sweepSortedMeetings = RMSSortedMeetings(_sweepMeetings)
+_sweepGrid = SweepGrid(args.dt_calc_models, args.grace_periods_sec, args.disruption_budgets, args.charts, len(seeds) > 1)
+
+# build the indexes of the dt models before forking, so that the workers share them
+createDTCalcModel(args.dt_calc_models[0], LiveRoomMeetingAssignments(), [], _sweepSortedMeetings, PEER_IDLE_TIMEOUT_SEC,
+                  ROLLOUT_DT_DURATION)
+
+groups = [SweepGroup(policyStr, restartDateStr, seed)
+          for policyStr, restartDateStr, seed in product(args.policies, args.restart_dates, seeds)]
+root.info(f"Running {len(groups) * len(args.grace_periods_sec) * len(args.disruption_budgets)} simulations "
+          f"in {len(groups)} groups on {args.workers} workers")
+
+results: list[tuple[dict, RMSDowntimeChart]] = []
+if args.workers > 1:
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context('fork')) as executor:
+        for groupResults in executor.map(runSweepGroup, groups):
+            results.extend(groupResults)
+else:
+    for group in groups:
+        results.extend(runSweepGroup(group))
+
+pd.DataFrame([row for row, _ in results]).to_csv(args.output, sep='\t', index=False)
+root.info(f"Saved {len(results)} results to {args.output}")
+
+if len(seeds) > 1:
+    # the same scenario with different seeds
+    scenarioResults = defaultdict(list)
+    for row, chart in results:
+        scenario = (row['policy'], row['dtModel'], row['gracePeriodSec'], row['disruptionBudget'], row['restartDate'])
+        scenarioResults[scenario].append((row['seed'], chart))
+    summaryRows = []
+    for (policyStr, dtModelStr, gracePeriodSec, disruptionBudget, restartDateStr), seedCharts in scenarioResults.items():
+        bands = RMSDowntimeBands([chart for _, chart in seedCharts], [seed for seed, _ in seedCharts])
+        bands.serialize()
+        summaryRows.append({
+            'policy': policyStr,
+            'dtModel': dtModelStr,
+            'gracePeriodSec': gracePeriodSec,
+            'disruptionBudget': disruptionBudget,
+            'restartDate': restartDateStr,
+            'seeds': len(seedCharts),
+            'totalDTMean': bands.totalDTMean,
+            'totalDTStd': bands.totalDTStd,
+            'totalDTP5': bands.totalDTP5,
+            'totalDTP50': bands.totalDTP50,
+            'totalDTP95': bands.totalDTP95,
+        })
+    pd.DataFrame(summaryRows).to_csv(args.summary_output, sep='\t', index=False)
+    root.info(f"Saved the spread over {len(seeds)} seeds of {len(summaryRows)} scenarios to {args.summary_output} "
+              f"and the bands of the charts to bands_*.json")